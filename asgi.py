@@ -0,0 +1,244 @@
+"""ASGI entry point for serving the API in production, e.g.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4 --timeout-graceful-shutdown 5
+
+Request bodies are received on the event loop (spooled to a temporary file
+past BODY_SPOOL_SIZE), and only then does the Flask app run, on a pool of
+PAC_ASGI_THREADS threads. Slow clients and large uploads therefore don't
+hold a thread while they send, and blocking directory, file and image I/O
+never stalls the event loop. The /events stream is served on the event loop
+itself, so idle subscribers don't hold a thread either.
+
+Resumable upload chunks (PATCH /uploads/<id>) are the exception to the
+spooling: the handler already writes them straight to their part file, so
+their body is handed to it as it arrives instead of being copied to a
+temporary file first. The handler thread is then held while the chunk is
+sent, as it would be under a WSGI server."""
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from urllib.parse import parse_qs
+
+from server import (
+    EVENTS_HEADERS, EVENTS_KEEPALIVE, EVENTS_MAX_AGE, EVENTS_RETRY_MS,
+    app as flask_app, event_backlog, event_broker,
+)
+
+ASGI_THREADS = int(os.environ.get('PAC_ASGI_THREADS', 32))
+BODY_SPOOL_SIZE = 1024 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi')
+
+
+def _environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': scope['server'][0] if scope.get('server') else 'localhost',
+        'SERVER_PORT': str(scope['server'][1]) if scope.get('server') else '80',
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+def _run_wsgi(environ, send):
+    # Runs on the thread pool; send() blocks until the event loop sent the message
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response.get('started'):
+            raise exc_info[1].with_traceback(exc_info[2])
+        response['start'] = {
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        }
+
+    iterable = flask_app(environ, start_response)
+    try:
+        for chunk in iterable:
+            if not chunk:
+                continue
+            if not response.get('started'):
+                response['started'] = True
+                send(response['start'])
+            send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        if not response.get('started'):
+            send(response['start'])
+        send({'type': 'http.response.body'})
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+
+class _ReceiveStream:
+    # wsgi.input reading the request body from the event loop as the handler
+    # asks for it. Reads return what has arrived, up to size bytes.
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.buffer = b''
+        self.done = False
+
+    def read(self, size=-1):
+        while not self.done and (size < 0 or not self.buffer):
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                raise OSError('Client disconnected')
+            self.buffer += message.get('body', b'')
+            self.done = not message.get('more_body')
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def _streams_body(scope):
+    return scope['method'] == 'PATCH' and scope['path'].startswith('/uploads/')
+
+
+async def _too_large(send):
+    await send({'type': 'http.response.start', 'status': 413, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': b'Request Entity Too Large'})
+
+
+def _open_events(deliver, last_event_id):
+    # Runs on the thread pool, reading the change logs may hit the disk
+    event_broker.subscribe(deliver)
+    try:
+        return event_backlog(last_event_id)
+    except BaseException:
+        event_broker.unsubscribe(deliver)
+        raise
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _events(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue()
+
+    def deliver(frame):
+        # Called on the broker's watcher thread
+        loop.call_soon_threadsafe(messages.put_nowait, frame)
+
+    headers = dict(scope['headers'])
+    last_event_id = headers.get(b'last-event-id', b'').decode('latin-1')
+    if not last_event_id:
+        last_event_id = parse_qs(scope['query_string'].decode('latin-1')).get('last_event_id', [''])[0]
+    backlog = await loop.run_in_executor(_executor, _open_events, deliver, last_event_id)
+
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    message = None
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                # What Flask-CORS adds to every other response
+                (b'access-control-allow-origin', b'*'),
+                *[(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in EVENTS_HEADERS.items()],
+            ],
+        })
+        body = f'retry: {EVENTS_RETRY_MS}\n\n'.encode('utf-8') + b''.join(backlog)
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+        closes_at = time.monotonic() + EVENTS_MAX_AGE
+        while time.monotonic() < closes_at:
+            if message is None:
+                message = asyncio.ensure_future(messages.get())
+            done, _ = await asyncio.wait(
+                {disconnect, message}, timeout=EVENTS_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                return
+            if message in done:
+                body = message.result()
+                message = None
+            else:
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        await send({'type': 'http.response.body'})
+    finally:
+        event_broker.unsubscribe(deliver)
+        disconnect.cancel()
+        if message is not None:
+            message.cancel()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    if scope['path'] == '/events' and scope['method'] == 'GET':
+        return await _events(scope, receive, send)
+
+    loop = asyncio.get_running_loop()
+
+    def send_from_thread(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    if _streams_body(scope):
+        environ = _environ(scope, _ReceiveStream(receive, loop))
+        if 'CONTENT_LENGTH' not in environ:
+            # Chunked: the stream ends with the body, Flask still applies
+            # MAX_CONTENT_LENGTH
+            environ['wsgi.input_terminated'] = True
+        return await loop.run_in_executor(_executor, _run_wsgi, environ, send_from_thread)
+
+    limit = flask_app.config['MAX_CONTENT_LENGTH']
+    with SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE) as body:
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if limit and size > limit:
+                return await _too_large(send)
+            body.write(chunk)
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+
+        # The body is complete, whether or not it came chunked
+        environ = _environ(scope, body)
+        environ.pop('HTTP_TRANSFER_ENCODING', None)
+        environ['CONTENT_LENGTH'] = str(size)
+        await loop.run_in_executor(_executor, _run_wsgi, environ, send_from_thread)
@@ -0,0 +1,420 @@
+"""Benchmarks for the read and write endpoints of server.py.
+
+    python benchmarks/bench.py                          # realistic archive
+    python benchmarks/bench.py --profile extreme        # 10k issues, 5000-photo albums
+    python benchmarks/bench.py --http --concurrency 32  # also under concurrent HTTP load
+    python benchmarks/bench.py --output before.json     # save the results
+    python benchmarks/bench.py --baseline before.json   # compare, exit 1 on regressions
+
+Each run generates a synthetic archive from a fixed seed in a temporary
+folder, so numbers are comparable between runs and nothing touches the real
+static/ folder. Scenarios are timed one request at a time through the Flask
+test client, and with --http by concurrent clients against the server
+running in a subprocess."""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'small': {
+        'issues': 50, 'events': 30, 'reading_circle': 20, 'albums': 10, 'photos': 50,
+        'big_album_photos': 200, 'sections': 3, 'section_words': 150,
+    },
+    'realistic': {
+        'issues': 400, 'events': 200, 'reading_circle': 100, 'albums': 60, 'photos': 150,
+        'big_album_photos': 1000, 'sections': 5, 'section_words': 400,
+    },
+    'extreme': {
+        'issues': 10000, 'events': 2000, 'reading_circle': 1000, 'albums': 20, 'photos': 5000,
+        'big_album_photos': 5000, 'sections': 4, 'section_words': 250,
+    },
+}
+
+# Item numbers used by the write scenarios, above anything generated
+WRITE_NUMBER_BASE = 1000000
+# A scenario is a regression when p50 grows, or throughput drops, by more than this
+DEFAULT_THRESHOLD = 0.10
+
+
+def generate_archive(workdir, profile, seed):
+    # Writes a directory.json per collection, the same layout the server uses
+    rng = random.Random(seed)
+    vocabulary = [
+        ''.join(rng.choice('bcdfghklmnprstvz') + rng.choice('aeiou') for _ in range(rng.randint(2, 4)))
+        for _ in range(5000)
+    ]
+
+    def text(words):
+        return ' '.join(rng.choices(vocabulary, k=words))
+
+    def date(n):
+        return f'{2015 + n % 10}-{1 + n % 12:02d}-{1 + n % 28:02d}'
+
+    def sectioned(folder, prefix, number_key, date_key, count, extra):
+        items = []
+        for n in range(1, count + 1):
+            items.append({
+                number_key: str(n),
+                'title': text(6),
+                date_key: date(n),
+                'upload_date': f'{date(n)} 12:00:00',
+                'cover_image': f'/static/{folder}/{prefix}_{n}_cover.jpg',
+                **extra,
+                'sections': [
+                    {
+                        'heading': text(5),
+                        'body': text(profile['section_words']),
+                        'image': f'/static/{folder}/{prefix}_{n}_section_{i}.jpg' if rng.random() < 0.5 else None,
+                    }
+                    for i in range(profile['sections'])
+                ],
+            })
+        return items
+
+    albums = []
+    for n in range(1, profile['albums'] + 1):
+        photos = profile['big_album_photos'] if n == 1 else profile['photos']
+        albums.append({
+            'album_number': str(n),
+            'title': text(4),
+            'album_date': date(n),
+            'description': text(30),
+            'upload_date': f'{date(n)} 12:00:00',
+            'cover_image': f'/static/photo_gallery/album_{n}_cover.jpg',
+            'photos': [f'/static/photo_gallery/album_{n}_photo_{i}.jpg' for i in range(photos)],
+        })
+
+    directories = {
+        'pac_times': {'issues': sectioned('pac_times', 'issue', 'issue_number', 'issue_date', profile['issues'], {})},
+        'pac_events': {'events': sectioned(
+            'pac_events', 'event', 'event_number', 'event_date', profile['events'], {'image_gallery_album_id': ''})},
+        'reading_circle': {'events': sectioned(
+            'reading_circle', 'event', 'event_number', 'event_date', profile['reading_circle'],
+            {'image_gallery_album_id': ''})},
+        'photo_gallery': {'albums': albums},
+    }
+    for folder, directory in directories.items():
+        os.makedirs(os.path.join(workdir, 'static', folder), exist_ok=True)
+        with open(os.path.join(workdir, 'static', folder, 'directory.json'), 'w') as f:
+            json.dump(directory, f, indent=2)
+    return vocabulary
+
+
+def load_server(workdir, engine):
+    # server.py keeps its data relative to the working directory
+    os.chdir(workdir)
+    os.environ['PAC_STORAGE_ENGINE'] = engine
+    os.environ['PAC_GC_INTERVAL'] = '0'
+    sys.path.insert(0, REPO_DIR)
+    import server
+    server.app.root_path = workdir
+    if engine == 'sqlite':
+        for dir_file in server.DIRECTORY_FILES:
+            with open(dir_file, 'r') as f:
+                directory = json.load(f)
+            server.sqlite_store.import_directory(server.get_db(), server.collection_name(dir_file), directory)
+    return server
+
+
+def fake_image(n):
+    # Unique bytes per upload, so the media store has to write every one
+    return b'\xff\xd8\xff\xe0' + n.to_bytes(8, 'big') + os.urandom(32 * 1024)
+
+
+def read_scenarios(profile, vocabulary):
+    middle = str(max(1, profile['issues'] // 2))
+    return [
+        ('get_pac_times', '/get_pac_times'),
+        ('get_pac_times limit=10', '/get_pac_times?limit=10'),
+        ('get_pac_times summary', '/get_pac_times?view=summary'),
+        ('get_pac_times limit=10 summary', '/get_pac_times?limit=10&view=summary'),
+        ('get_pac_times/<n>', f'/get_pac_times/{middle}'),
+        ('get_pac_events limit=3', '/get_pac_events?limit=3'),
+        ('get_pac_events limit=3 summary', '/get_pac_events?limit=3&view=summary'),
+        ('get_reading_circle', '/get_reading_circle'),
+        ('get_photo_albums', '/get_photo_albums'),
+        ('get_photo_albums summary', '/get_photo_albums?view=summary'),
+        ('get_photo_album/<big>', '/get_photo_album/1'),
+        ('search', f'/search?q={vocabulary[0]}'),
+    ]
+
+
+def write_requests(kind, count):
+    # (method, path, form fields) for each request of a write scenario
+    requests = []
+    for i in range(count):
+        number = str(WRITE_NUMBER_BASE + i)
+        if kind == 'upload_pac_times':
+            requests.append(('POST', '/upload_pac_times', {
+                'issue_number': number, 'title': f'Benchmark issue {i}',
+                'section_0_heading': 'Heading', 'section_0_body': 'Body ' * 200,
+                'section_1_heading': 'Heading', 'section_1_body': 'Body ' * 200,
+                'cover_image': ('cover.jpg', fake_image(3 * i)),
+                'section_0_image': ('s0.jpg', fake_image(3 * i + 1)),
+            }))
+        elif kind == 'edit_pac_times':
+            requests.append(('POST', '/upload_pac_times', {
+                'issue_number': number, 'title': f'Edited issue {i}', 'is_edit': 'true',
+                'section_0_heading': 'Heading', 'section_0_body': 'Edited ' * 200,
+            }))
+        elif kind == 'upload_photo_album':
+            fields = {'album_number': number, 'title': f'Benchmark album {i}'}
+            fields['cover_image'] = ('cover.jpg', fake_image(100 * i))
+            for p in range(20):
+                fields[f'photo_{p}'] = (f'p{p}.jpg', fake_image(100 * i + p + 1))
+            requests.append(('POST', '/upload_photo_album', fields))
+        elif kind == 'delete_pac_times':
+            requests.append(('DELETE', f'/delete_pac_times/{number}', None))
+        elif kind == 'delete_photo_album':
+            requests.append(('DELETE', f'/delete_photo_album/{number}', None))
+    return requests
+
+
+WRITE_SCENARIOS = ['upload_pac_times', 'edit_pac_times', 'delete_pac_times', 'upload_photo_album', 'delete_photo_album']
+
+
+def summarize(name, mode, latencies, elapsed, errors=0):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    return {
+        'scenario': name,
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def run_test_client(server, profile, vocabulary, reads, writes):
+    client = server.app.test_client()
+    results = []
+    for name, path in read_scenarios(profile, vocabulary):
+        client.get(path)  # warm the caches, the first parse is measured separately
+        latencies = []
+        errors = 0
+        start = time.perf_counter()
+        for _ in range(reads):
+            t = time.perf_counter()
+            response = client.get(path)
+            latencies.append(time.perf_counter() - t)
+            errors += response.status_code >= 400
+        results.append(summarize(name, 'client', latencies, time.perf_counter() - start, errors))
+
+    for kind in WRITE_SCENARIOS:
+        latencies = []
+        errors = 0
+        start = time.perf_counter()
+        for method, path, fields in write_requests(kind, writes):
+            data = None
+            if fields:
+                data = {k: (io.BytesIO(v[1]), v[0]) if isinstance(v, tuple) else v for k, v in fields.items()}
+            t = time.perf_counter()
+            response = client.open(path, method=method, data=data, content_type='multipart/form-data')
+            latencies.append(time.perf_counter() - t)
+            errors += response.status_code >= 400
+        results.append(summarize(kind, 'client', latencies, time.perf_counter() - start, errors))
+
+    # The first read after a write parses the directory again
+    latencies = []
+    start = time.perf_counter()
+    for method, path, fields in write_requests('edit_pac_times', min(writes, 20)):
+        client.post(path, data=fields, content_type='multipart/form-data')
+        t = time.perf_counter()
+        client.get('/get_pac_times?limit=10&view=summary')
+        latencies.append(time.perf_counter() - t)
+    results.append(summarize('get_pac_times after write', 'client', latencies, time.perf_counter() - start))
+    for method, path, fields in write_requests('delete_pac_times', min(writes, 20)):
+        client.delete(path)
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(workdir, engine, port, use_asgi):
+    # Runs in the --serve subprocess
+    server = load_server(workdir, engine)
+    if use_asgi:
+        import uvicorn
+        import asgi
+        uvicorn.run(asgi.app, host='127.0.0.1', port=port, log_level='warning')
+    else:
+        import logging
+        from werkzeug.serving import run_simple
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        run_simple('127.0.0.1', port, server.app, threaded=True)
+
+
+def _multipart(fields):
+    boundary = 'benchmarkboundary'
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\n'.encode())
+        if isinstance(value, tuple):
+            body.write(f'Content-Disposition: form-data; name="{name}"; filename="{value[0]}"\r\n'.encode())
+            body.write(b'Content-Type: image/jpeg\r\n\r\n' + value[1] + b'\r\n')
+        else:
+            body.write(f'Content-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+def _timed_request(base_url, method, path, fields):
+    data = None
+    headers = {}
+    if fields:
+        data, headers['Content-Type'] = _multipart(fields)
+    request = urllib.request.Request(base_url + path, data=data, method=method, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+        ok = True
+    except urllib.error.URLError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def _load(base_url, name, requests, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda r: _timed_request(base_url, *r), requests))
+    elapsed = time.perf_counter() - start
+    return summarize(name, f'http x{concurrency}', [t for t, _ in outcomes], elapsed,
+                     sum(not ok for _, ok in outcomes))
+
+
+def run_http(workdir, engine, profile, vocabulary, reads, writes, concurrency, use_asgi):
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), '--serve', '--workdir', workdir,
+        '--engine', engine, '--port', str(port), *(['--asgi'] if use_asgi else []),
+    ])
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base_url + '/get_pac_events?limit=1', timeout=1).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.1)
+
+        results = []
+        for name, path in read_scenarios(profile, vocabulary):
+            urllib.request.urlopen(base_url + path).read()
+            results.append(_load(base_url, name, [('GET', path, None)] * reads, concurrency))
+        for kind in WRITE_SCENARIOS:
+            results.append(_load(base_url, kind, write_requests(kind, writes), concurrency))
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def compare(results, baseline, threshold):
+    # Adds the change against the baseline to each result, returns the regressions
+    previous = {(r['scenario'], r['mode']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['scenario'], result['mode']))
+        if not before or not before['p50_ms'] or not before['throughput']:
+            continue
+        result['p50_change'] = result['p50_ms'] / before['p50_ms'] - 1
+        result['throughput_change'] = result['throughput'] / before['throughput'] - 1
+        if result['p50_change'] > threshold or result['throughput_change'] < -threshold:
+            regressions.append(result)
+    return regressions
+
+
+def print_table(results):
+    print(f"{'scenario':34} {'mode':10} {'reqs':>6} {'err':>4} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'Δp50':>8}")
+    for r in results:
+        change = f"{r['p50_change'] * 100:+.1f}%" if 'p50_change' in r else ''
+        print(f"{r['scenario']:34} {r['mode']:10} {r['requests']:>6} {r['errors']:>4} "
+              f"{r['throughput']:>9.1f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='realistic')
+    parser.add_argument('--engine', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--seed', type=int, default=2024)
+    parser.add_argument('--reads', type=int, default=200, help='requests per read scenario')
+    parser.add_argument('--writes', type=int, default=30, help='requests per write scenario')
+    parser.add_argument('--http', action='store_true', help='also run concurrent HTTP load')
+    parser.add_argument('--asgi', action='store_true', help='serve HTTP load through asgi.py (needs uvicorn)')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.workdir, args.engine, args.port, args.asgi)
+
+    profile = PROFILES[args.profile]
+    workdir = tempfile.mkdtemp(prefix='pac-bench-')
+    cwd = os.getcwd()
+    try:
+        start = time.perf_counter()
+        vocabulary = generate_archive(workdir, profile, args.seed)
+        print(f'Generated the {args.profile} archive in {time.perf_counter() - start:.1f}s')
+        http_dir = None
+        if args.http:
+            # The HTTP server gets a pristine copy, the client scenarios change the archive
+            http_dir = workdir + '-http'
+            shutil.copytree(workdir, http_dir)
+
+        server = load_server(workdir, args.engine)
+        results = run_test_client(server, profile, vocabulary, args.reads, args.writes)
+        if args.http:
+            results += run_http(http_dir, args.engine, profile, vocabulary, args.reads, args.writes,
+                                args.concurrency, args.asgi)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        if args.http:
+            shutil.rmtree(workdir + '-http', ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'profile': args.profile, 'engine': args.engine, 'seed': args.seed, 'results': results}, f, indent=2)
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {args.threshold:.0%}: "
+              f"{', '.join(r['scenario'] + ' (' + r['mode'] + ')' for r in regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
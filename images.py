@@ -0,0 +1,147 @@
+"""Resized and WebP derivatives of uploaded images, plus their placeholders
+and dominant colors. Needs Pillow; without it uploads are stored as they are."""
+import base64
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Widths of the generated derivatives, images narrower than a width skip it
+DERIVATIVE_WIDTHS = [320, 640, 1280]
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+# Placeholders are a grid of at most PLACEHOLDER_SIZE pixels a side, base64
+# encoded as its width, height and RGB bytes row by row: about a hundred
+# characters, against a kilobyte for the tiny JPEG data URIs used before. The
+# client draws the grid on a canvas and the browser scales it up, smoothed,
+# until the image itself has loaded.
+PLACEHOLDER_SIZE = 5
+
+
+def available():
+    return Image is not None
+
+
+def derivative_path(path, width=None, ext='webp'):
+    # Works on file system paths and URLs alike:
+    # photo.jpg -> photo.w320.jpg / photo.w320.webp, or photo.webp at full size
+    root = os.path.splitext(path)[0]
+    return f'{root}.w{width}.{ext}' if width else f'{root}.{ext}'
+
+
+def derivative_paths(path):
+    # Every derivative an image may have, whether or not it was generated
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    paths = [derivative_path(path)]
+    for width in DERIVATIVE_WIDTHS:
+        paths.append(derivative_path(path, width, ext))
+        paths.append(derivative_path(path, width))
+    return paths
+
+
+def _save(image, path, ext):
+    if ext == 'webp':
+        image.save(path, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif ext in ('jpg', 'jpeg'):
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(path, optimize=True)
+
+
+def current_placeholder(info):
+    # Whether a media entry has a placeholder in the encoding above, rather
+    # than none or a data URI from before
+    placeholder = (info or {}).get('placeholder')
+    return bool(placeholder) and not placeholder.startswith('data:')
+
+
+def describe(image):
+    # Placeholder and dominant color (the most common of a few quantized
+    # colors of a thumbnail)
+    thumbnail = image.convert('RGB')
+    thumbnail.thumbnail((64, 64))
+    quantized = thumbnail.quantize(colors=5)
+    _, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+
+    thumbnail.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    grid = bytes(thumbnail.size) + thumbnail.tobytes()
+    return {
+        'placeholder': base64.b64encode(grid).decode('ascii'),
+        'color': f'#{red:02x}{green:02x}{blue:02x}',
+    }
+
+
+def image_metadata(path):
+    # Runs in a worker process. Size, placeholder and color of an image
+    # whose derivatives already exist, or None if it could not be read.
+    try:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+            return {'width': width, 'height': height, **describe(image)}
+    except Exception:
+        return None
+
+
+def make_derivatives(path):
+    # Runs in a worker process. Writes the derivatives next to the original
+    # and returns the original's size, placeholder and color plus the widths
+    # that were generated, or None if the file could not be read as an image.
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    try:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+            widths = []
+            for target in DERIVATIVE_WIDTHS:
+                if target >= width:
+                    break
+                resized = image.resize((target, round(height * target / width)), Image.LANCZOS)
+                _save(resized, derivative_path(path, target, ext), ext)
+                _save(resized, derivative_path(path, target), 'webp')
+                widths.append(target)
+            _save(image, derivative_path(path), 'webp')
+            described = describe(image)
+    except Exception:
+        return None
+    return {'width': width, 'height': height, 'widths': widths, **described}
+
+
+def make_thumbnails(path, dest, widths):
+    # Runs in a worker process. Writes the image scaled down to each width
+    # (never up) as dest.w<width>.jpg and dest.w<width>.webp, and returns the
+    # size of the largest copy, the widths written, placeholder and color,
+    # or None if the file could not be read as an image.
+    try:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+            written = []
+            for target in widths:
+                target = min(target, width)
+                if target in written:
+                    continue
+                resized = image.resize((target, round(height * target / width)), Image.LANCZOS)
+                _save(resized, derivative_path(dest, target, 'jpg'), 'jpg')
+                _save(resized, derivative_path(dest, target), 'webp')
+                written.append(target)
+            described = describe(image)
+    except Exception:
+        return None
+    return {'width': written[-1], 'height': round(height * written[-1] / width), 'widths': written, **described}
+
+
+def srcsets(url, info):
+    # srcset strings for the original format and for WebP
+    ext = os.path.splitext(url)[1].lstrip('.').lower()
+    widths = info['widths']
+    original = [f'{derivative_path(url, w, ext)} {w}w' for w in widths]
+    original.append(f"{url} {info['width']}w")
+    webp = [f'{derivative_path(url, w)} {w}w' for w in widths]
+    webp.append(f"{derivative_path(url)} {info['width']}w")
+    return ', '.join(original), ', '.join(webp)
@@ -0,0 +1,107 @@
+"""In-memory inverted index over the text of every collection, used by
+/search. Documents are added, replaced and removed one at a time, so the
+index follows directory writes without being rebuilt."""
+import math
+import re
+import threading
+from collections import Counter
+
+TOKEN_RE = re.compile(r'\w+')
+# A term found in a title counts for more than one in a section body
+FIELD_WEIGHTS = {'title': 3.0, 'heading': 2.0, 'description': 1.5, 'body': 1.0}
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+SNIPPET_LENGTH = 160
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    # Documents are keyed by (collection, item number) and made of
+    # (field, text) pairs. Callers hold `lock` around every call.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.docs = {}
+        self.total_length = 0
+
+    def numbers(self, collection):
+        return {number for name, number in self.docs if name == collection}
+
+    def add(self, key, fields):
+        # Replaces the document, unless its text is unchanged
+        signature = hash(tuple(fields))
+        doc = self.docs.get(key)
+        if doc and doc['signature'] == signature:
+            return
+        if doc:
+            self.remove(key)
+
+        weights = Counter()
+        length = 0
+        for field, text in fields:
+            tokens = tokenize(text)
+            length += len(tokens)
+            for token in tokens:
+                weights[token] += FIELD_WEIGHTS.get(field, 1.0)
+        for term, weight in weights.items():
+            self.postings.setdefault(term, {})[key] = weight
+        self.docs[key] = {'signature': signature, 'length': length, 'terms': list(weights)}
+        self.total_length += length
+
+    def remove(self, key):
+        doc = self.docs.pop(key, None)
+        if not doc:
+            return
+        for term in doc['terms']:
+            posting = self.postings[term]
+            del posting[key]
+            if not posting:
+                del self.postings[term]
+        self.total_length -= doc['length']
+
+    def search(self, query, collections=None):
+        # Documents holding every term of the query, best BM25 score first,
+        # as (score, key) pairs
+        terms = list(dict.fromkeys(tokenize(query)))
+        postings = [self.postings.get(term) for term in terms]
+        if not terms or not all(postings):
+            return []
+        postings.sort(key=len)
+
+        candidates = [
+            key for key in postings[0]
+            if all(key in posting for posting in postings[1:])
+            and (collections is None or key[0] in collections)
+        ]
+        count = len(self.docs)
+        average_length = self.total_length / count or 1
+        idfs = [math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5)) for posting in postings]
+
+        results = []
+        for key in candidates:
+            norm = K1 * (1 - B + B * self.docs[key]['length'] / average_length)
+            score = 0.0
+            for idf, posting in zip(idfs, postings):
+                weight = posting[key]
+                score += idf * weight * (K1 + 1) / (weight + norm)
+            results.append((score, key))
+        results.sort(key=lambda result: (-result[0], result[1]))
+        return results
+
+
+def snippet(fields, query):
+    # The text around the first match of a query term, preferring bodies
+    terms = set(tokenize(query))
+    fields = sorted(fields, key=lambda field: field[0] != 'body')
+    for _, text in fields:
+        for match in TOKEN_RE.finditer(text):
+            if match.group().lower() in terms:
+                start = max(0, match.start() - SNIPPET_LENGTH // 3)
+                end = start + SNIPPET_LENGTH
+                text_part = ' '.join(text[start:end].split())
+                return f"{'…' if start else ''}{text_part}{'…' if end < len(text) else ''}"
+    return ''
@@ -1,12 +1,48 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 from flask_cors import CORS
 import os
 import json
+import mimetypes
+import bisect
+import gzip
+import hashlib
+import heapq
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+import click
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from datetime import datetime
 
+import images
+import metrics
+import search
+import sqlite_store
+
+# fcntl is POSIX only; elsewhere writes are only serialized within a process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Brotli is optional, responses fall back to gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = Flask(__name__)
-CORS(app)
+# The upload client reads Upload-Offset to resume chunked uploads
+CORS(app, expose_headers=['Upload-Offset', 'Upload-Length'])
 
 # PAC Times Upload Configuration
 PAC_TIMES_UPLOAD_FOLDER = 'static/pac_times'
@@ -19,16 +55,127 @@ PAC_EVENTS_DIR_FILE = os.path.join(PAC_EVENTS_UPLOAD_FOLDER, 'directory.json')
 # Increase maximum content length to 50MB
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max-content-length
 app.config['MAX_FILE_SIZE'] = 10 * 1024 * 1024      # 10MB max-file-size
+app.config['MAX_ARCHIVE_SIZE'] = 2 * 1024 * 1024 * 1024  # 2GB max bulk import archive (via /uploads)
+
+# Where collections are stored: 'json' (a directory.json per upload folder)
+# or 'sqlite' (one database, see sqlite_store.py)
+app.config['STORAGE_ENGINE'] = os.environ.get('PAC_STORAGE_ENGINE', 'json')
+app.config['DATABASE'] = os.environ.get('PAC_DATABASE', 'pac.sqlite3')
+
+# Let the front server send files instead of Python: PAC_X_SENDFILE=1 for an
+# X-Sendfile header (Apache mod_xsendfile, lighttpd), or an internal location
+# in PAC_MEDIA_ACCEL_REDIRECT (e.g. /internal-media/) for nginx's X-Accel-Redirect
+app.config['USE_X_SENDFILE'] = os.environ.get('PAC_X_SENDFILE') == '1'
+app.config['MEDIA_ACCEL_REDIRECT'] = os.environ.get('PAC_MEDIA_ACCEL_REDIRECT', '')
+
+# Clients may cache directory listings but must revalidate them (via ETag)
+DIRECTORY_CACHE_CONTROL = 'public, no-cache'
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+# Serialized views kept per directory version (one per page, item etc.)
+MAX_CACHED_RESPONSES = 128
+# Fields left out of listings requested with view=summary
+SUMMARY_OMITTED_FIELDS = {'sections', 'photos'}
+# Change log kept with each collection for /changes, and the number of
+# deletions it remembers
+CHANGE_LOG_KEY = 'change_log'
+CHANGE_LOG_TOMBSTONES = 1000
+# Processes resizing uploaded images (only used when Pillow is installed)
+IMAGE_WORKERS = int(os.environ.get('PAC_IMAGE_WORKERS', os.cpu_count() or 1))
+# Background upload jobs: their records and staged files live in JOBS_FOLDER
+JOBS_FOLDER = 'jobs'
+UPLOAD_JOB_WORKERS = int(os.environ.get('PAC_UPLOAD_JOB_WORKERS', 2))
+# Resumable uploads: chunks are appended to UPLOADS_FOLDER/<id>.part
+UPLOADS_FOLDER = 'uploads'
+UPLOAD_READ_SIZE = 64 * 1024
+# Content-addressed image store: MEDIA_FOLDER/<hh>/<sha256>.<ext>, with the
+# number of directory items referring to each blob kept in MEDIA_REFS_FILE
+MEDIA_FOLDER = 'static/media'
+MEDIA_REFS_FILE = 'media_refs.json'
+# Stored images never change under their URL, so clients may keep them for a year
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+# Garbage collection of unreferenced files: seconds between background sweeps
+# (0 turns the sweeper off), files younger than the grace period are kept as
+# they may belong to an upload that is still being processed
+GC_INTERVAL = int(os.environ.get('PAC_GC_INTERVAL', 60 * 60))
+GC_GRACE_PERIOD = 60 * 60
+GC_BATCH_SIZE = 100
+GC_BATCH_PAUSE = 0.1
+GC_LOCK_FILE = 'gc.lock'
+# Finished job records and abandoned resumable uploads are kept this long
+JOB_RETENTION = 7 * 24 * 60 * 60
+UPLOAD_RETENTION = 24 * 60 * 60
 
 # Create upload folders if they don't exist
 os.makedirs(PAC_TIMES_UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PAC_EVENTS_UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(JOBS_FOLDER, exist_ok=True)
+os.makedirs(UPLOADS_FOLDER, exist_ok=True)
+os.makedirs(MEDIA_FOLDER, exist_ok=True)
+
+# Metrics, served by /metrics
+REQUESTS = metrics.Counter(
+    'pac_http_requests_total', 'HTTP requests by route and status', ['method', 'route', 'status'])
+REQUEST_DURATION = metrics.Histogram(
+    'pac_http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route'])
+DIRECTORY_READ_DURATION = metrics.Histogram(
+    'pac_directory_read_seconds', 'Time spent loading a directory (json.load or SQLite)', ['collection'])
+DIRECTORY_WRITE_DURATION = metrics.Histogram(
+    'pac_directory_write_seconds', 'Time spent writing a directory (json.dump or SQLite)', ['collection'])
+DIRECTORY_CACHE = metrics.Counter(
+    'pac_directory_cache_lookups_total', 'Parsed directory cache lookups', ['collection', 'result'])
+RESPONSE_CACHE = metrics.Counter(
+    'pac_response_cache_lookups_total', 'Serialized response cache lookups', ['collection', 'result'])
+UPLOAD_BYTES = metrics.Counter(
+    'pac_upload_bytes_written_total', 'Bytes of uploaded files written to disk', ['stage'])
+MEDIA_REUSED = metrics.Counter(
+    'pac_media_reused_total', 'Uploaded files that were already in the media store')
+
+def write_json_atomic(path, data):
+    # Readers see either the old or the new file, never a partial write
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.tmp-', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # Make the rename itself durable
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+_directory_write_locks = {}
+_directory_write_locks_guard = threading.Lock()
+
+@contextmanager
+def directory_lock(dir_file):
+    # Serializes read-modify-write cycles on a directory across threads and
+    # worker processes. Readers never take it.
+    with _directory_write_locks_guard:
+        thread_lock = _directory_write_locks.setdefault(dir_file, threading.Lock())
+    with thread_lock:
+        with open(dir_file + '.lock', 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
 
 # Create directory.json files if they don't exist
 def create_directory_file_if_not_exists(dir_file, key):
     if not os.path.exists(dir_file):
-        with open(dir_file, 'w') as f:
-            json.dump({key: []}, f)
+        with directory_lock(dir_file):
+            if not os.path.exists(dir_file):
+                write_json_atomic(dir_file, {key: []})
 
 create_directory_file_if_not_exists(PAC_TIMES_DIR_FILE, 'issues')
 create_directory_file_if_not_exists(PAC_EVENTS_DIR_FILE, 'events')
@@ -37,58 +184,828 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def update_directory(dir_file, key, item_data, item_number_key):
+def static_file_path(url):
+    return os.path.join(app.root_path, url.lstrip('/'))
+
+def safe_static_path(url):
+    # The file a /static/ URL sent by a client or found in an archive refers
+    # to, or None when it isn't one or resolves outside the static folder
+    if not isinstance(url, str) or not url.startswith('/static/') or '\0' in url:
+        return None
+    return safe_join(app.static_folder, url[len('/static/'):])
+
+def image_urls(item):
+    # Every uploaded image an item refers to
+    urls = []
+    if item.get('cover_image'):
+        urls.append(item['cover_image'])
+    for section in item.get('sections') or []:
+        if section.get('image'):
+            urls.append(section['image'])
+    urls.extend(item.get('photos') or [])
+    return urls
+
+# Uploaded images are stored once per content. Items refer to blobs by URL
+# and MEDIA_REFS_FILE counts the items referring to each blob. Files nothing
+# refers to any more are left to collect_garbage.
+def is_media_url(url):
+    return url.startswith(f'/{MEDIA_FOLDER}/')
+
+def media_url(digest, filename):
+    ext = filename.rsplit('.', 1)[1].lower()
+    if ext == 'jpeg':
+        ext = 'jpg'
+    return f'/{MEDIA_FOLDER}/{digest[:2]}/{digest}.{ext}'
+
+def _sha256(stream):
+    digest = hashlib.sha256()
+    while True:
+        chunk = stream.read(UPLOAD_READ_SIZE)
+        if not chunk:
+            return digest.hexdigest()
+        digest.update(chunk)
+
+def _reuse_media(path):
+    # Touching a blob that is reused keeps collect_garbage from deleting it
+    # before the item referring to it is written (see GC_GRACE_PERIOD)
+    with directory_lock(MEDIA_REFS_FILE):
+        if not os.path.exists(path):
+            return False
+        os.utime(path)
+    MEDIA_REUSED.inc()
+    return True
+
+def _put_media(src_path, url):
+    # Moves a file into the store, or drops it if the blob is there already
+    path = static_file_path(url)
+    if _reuse_media(path):
+        os.remove(src_path)
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.chmod(src_path, 0o644)
+    shutil.move(src_path, path)
+
+def store_media_stream(stream, filename):
+    # Copies the stream to a temporary file while hashing it, then moves it
+    # into the store. Works with streams that can't seek (zip members).
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=MEDIA_FOLDER, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = stream.read(UPLOAD_READ_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+                UPLOAD_BYTES.inc('store', amount=len(chunk))
+        url = media_url(digest.hexdigest(), filename)
+        _put_media(tmp_path, url)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return url
+
+def store_media(upload):
+    # Stores an uploaded file (FileStorage or StagedFile) and returns its URL
+    if isinstance(upload, StagedFile):
+        if not upload.sha256:
+            with open(upload.path, 'rb') as f:
+                upload.sha256 = _sha256(f)
+        url = media_url(upload.sha256, upload.filename)
+        _put_media(upload.path, url)
+        if upload.on_save:
+            upload.on_save()
+        return url
+
+    stream = upload.stream
+    if stream.seekable():
+        # Hash first, a file that is already stored is not written at all
+        url = media_url(_sha256(stream), upload.filename)
+        stream.seek(0)
+        if _reuse_media(static_file_path(url)):
+            return url
+    return store_media_stream(stream, upload.filename)
+
+def load_media_refs():
+    if not os.path.exists(MEDIA_REFS_FILE):
+        return {}
+    with open(MEDIA_REFS_FILE, 'r') as f:
+        return json.load(f)
+
+def media_ref_counts(items):
+    # An item counts once per blob, however often it shows the image
+    return Counter(url for item in items for url in set(image_urls(item)) if is_media_url(url))
+
+def update_media_refs(old_items, new_items):
+    # Moves references from the stored versions of some items to their new
+    # versions (none when the items are deleted). Callers hold the lock of
+    # the items' directory.
+    old_counts = media_ref_counts(old_items)
+    new_counts = media_ref_counts(new_items)
+    changes = {url: new_counts[url] - old_counts[url] for url in old_counts | new_counts}
+    changes = {url: change for url, change in changes.items() if change}
+    if not changes:
+        return
+
+    with directory_lock(MEDIA_REFS_FILE):
+        refs = load_media_refs()
+        for url, change in changes.items():
+            count = refs.get(url, 0) + change
+            if count > 0:
+                refs[url] = count
+            else:
+                refs.pop(url, None)
+        write_json_atomic(MEDIA_REFS_FILE, refs)
+
+@app.route(f"/{MEDIA_FOLDER}/<path:filename>", methods=["GET"])
+def get_media(filename):
+    # Takes precedence over the default static route for the store. Blobs
+    # are named by their hash and derivatives after their blob, so responses
+    # are immutable. Range and conditional requests are handled by send_file.
+    media_root = os.path.join(app.root_path, MEDIA_FOLDER)
+    accel_redirect = app.config['MEDIA_ACCEL_REDIRECT']
+    if accel_redirect:
+        path = safe_join(media_root, filename)
+        if not path or not os.path.isfile(path):
+            return jsonify({'error': 'File not found'}), 404
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{accel_redirect.rstrip('/')}/{filename}"
+    else:
+        response = send_from_directory(media_root, filename, max_age=MEDIA_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.max_age = MEDIA_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+_image_pool = None
+_image_pool_lock = threading.Lock()
+
+def _get_image_pool():
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is None:
+            # spawn, since forking a threaded server process is not safe
+            _image_pool = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _image_pool
+
+def image_source_path(url):
+    # The file of an image whose derivatives may be written next to it: one
+    # under an upload folder or the media store, or None for anything else
+    path = safe_static_path(url)
+    if not path:
+        return None
+    folders = [MEDIA_FOLDER, *(spec['folder'] for spec in COLLECTIONS.values())]
+    for folder in folders:
+        root = os.path.join(app.root_path, folder)
+        if os.path.commonpath([root, path]) == root:
+            return path
+    return None
+
+def add_image_media(dir_file, key, item_number_key, items_data):
+    # Sets item['media'][url] = {width, height, srcset, webp_srcset,
+    # placeholder, color} for each image of the items. Images already known
+    # to the stored item or to the item data (see backfill-media) are
+    # reused, new ones get their derivatives generated
+    # in the process pool. Known images from before placeholders existed, or
+    # with a placeholder in the old data URI encoding, only get their
+    # placeholder and color (re)computed.
+    if not images.available():
+        return
+
+    pending = []
+    incomplete = []
+    known = {}
+    for item_data in items_data:
+        existing = find_in_directory(dir_file, key, item_number_key, item_data[item_number_key])
+        known.update((existing or {}).get('media', {}))
+        known.update(item_data.get('media') or {})
+        item_data['media'] = {}
+        for url in image_urls(item_data):
+            info = known.get(url)
+            if info and images.current_placeholder(info):
+                item_data['media'][url] = info
+            elif not image_source_path(url):
+                # No derivatives outside the upload folders and the media store
+                continue
+            elif info:
+                if url not in incomplete:
+                    incomplete.append(url)
+            elif url not in pending:
+                pending.append(url)
+
+    if not pending and not incomplete:
+        return
+    pool = _get_image_pool()
+    results = dict(zip(pending, pool.map(
+        images.make_derivatives, [image_source_path(url) for url in pending]
+    )))
+    described = dict(zip(incomplete, pool.map(
+        images.image_metadata, [image_source_path(url) for url in incomplete]
+    )))
+    for item_data in items_data:
+        for url in image_urls(item_data):
+            if url in item_data['media']:
+                continue
+            info = results.get(url)
+            if info:
+                srcset, webp_srcset = images.srcsets(url, info)
+                item_data['media'][url] = {
+                    'width': info['width'],
+                    'height': info['height'],
+                    'srcset': srcset,
+                    'webp_srcset': webp_srcset,
+                    'placeholder': info['placeholder'],
+                    'color': info['color'],
+                }
+            elif url in known:
+                item_data['media'][url] = {**known[url], **(described.get(url) or {})}
+
+# Parsed directories are cached in-process, keyed by directory file. An entry
+# is reused until the collection's version changes: the file's mtime/inode/size
+# for the JSON engine, the collection version row for SQLite. Writes made by
+# other processes (or by hand) are therefore still picked up on the next read.
+_directory_cache = {}
+_directory_cache_lock = threading.Lock()
+_db_local = threading.local()
+
+def get_db():
+    # One SQLite connection per thread
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = sqlite_store.connect(app.config['DATABASE'])
+        _db_local.conn = conn
+    return conn
+
+def use_sqlite():
+    return app.config['STORAGE_ENGINE'] == 'sqlite'
+
+def collection_name(dir_file):
+    # 'static/pac_times/directory.json' -> 'pac_times'
+    return os.path.basename(os.path.dirname(dir_file))
+
+def _directory_version(dir_file):
+    if use_sqlite():
+        return sqlite_store.collection_version(get_db(), collection_name(dir_file))
+    st = os.stat(dir_file)
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+def _read_directory(dir_file):
+    if use_sqlite():
+        return sqlite_store.load_collection(get_db(), collection_name(dir_file))
+    version = _directory_version(dir_file)
     with open(dir_file, 'r') as f:
-        directory = json.load(f)
-    
-    # Check if item already exists and update it, or append new item
-    item_exists = False
-    for i, item in enumerate(directory[key]):
-        if item[item_number_key] == item_data[item_number_key]:
-            item_data['upload_date'] = item.get('upload_date', item_data['upload_date'])
-            directory[key][i] = item_data
-            item_exists = True
-            break
-    
-    if not item_exists:
-        directory[key].append(item_data)
-    
-    # Sort items by item number
-    directory[key].sort(key=lambda x: int(x[item_number_key]))
-    
-    with open(dir_file, 'w') as f:
-        json.dump(directory, f, indent=2)
+        return version, json.load(f)
+
+def _directory_entry(dir_file):
+    version = _directory_version(dir_file)
+    entry = _directory_cache.get(dir_file)
+    if entry and entry['version'] == version:
+        DIRECTORY_CACHE.inc(collection_name(dir_file), 'hit')
+        return entry
+
+    with _directory_cache_lock:
+        entry = _directory_cache.get(dir_file)
+        if entry and entry['version'] == version:
+            DIRECTORY_CACHE.inc(collection_name(dir_file), 'hit')
+            return entry
+        DIRECTORY_CACHE.inc(collection_name(dir_file), 'miss')
+        with DIRECTORY_READ_DURATION.time(collection_name(dir_file)):
+            version, directory = _read_directory(dir_file)
+        entry = {'version': version, 'directory': directory, 'responses': {}}
+        _directory_cache[dir_file] = entry
+        return entry
+
+def load_directory(dir_file):
+    # The returned directory is shared between requests, never mutate it
+    return _directory_entry(dir_file)['directory']
+
+def save_directory(dir_file, directory):
+    # Whole-file write, JSON engine only. Callers hold directory_lock(dir_file).
+    with DIRECTORY_WRITE_DURATION.time(collection_name(dir_file)):
+        write_json_atomic(dir_file, directory)
+    entry = {'version': _directory_version(dir_file), 'directory': directory, 'responses': {}}
+    with _directory_cache_lock:
+        _directory_cache[dir_file] = entry
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body)
+    return gzip.compress(body, mtime=0)
+
+def directory_response(dir_file, variant, build_payload, entry=None):
+    # Serves build_payload(directory) as JSON. The body, its compressed forms
+    # and its ETag are built once per directory version and variant, and are
+    # dropped together with the cache entry when the directory changes.
+    # Callers that looked at the directory already pass the entry they used.
+    entry = entry or _directory_entry(dir_file)
+    responses = entry['responses']
+    cached = responses.get(variant)
+    RESPONSE_CACHE.inc(collection_name(dir_file), 'miss' if cached is None else 'hit')
+    if cached is None:
+        if len(responses) >= MAX_CACHED_RESPONSES:
+            responses.clear()
+        cached = cached_body(build_payload(entry['directory']))
+        responses[variant] = cached
+    return cached_response(cached)
+
+def cached_body(payload):
+    body = app.json.dumps(payload).encode('utf-8')
+    return {'etag': hashlib.sha1(body).hexdigest(), 'identity': body}
+
+def cached_response(cached):
+    # Serves a cached_body(), compressing it at most once per encoding
+    encoding = 'identity'
+    if len(cached['identity']) >= COMPRESS_MIN_SIZE:
+        if brotli and request.accept_encodings['br']:
+            encoding = 'br'
+        elif request.accept_encodings['gzip']:
+            encoding = 'gzip'
+
+    # Each encoding is a different representation, so it gets its own strong ETag
+    etag = cached['etag'] if encoding == 'identity' else f"{cached['etag']}-{encoding}"
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': DIRECTORY_CACHE_CONTROL,
+        'Vary': 'Accept-Encoding',
+    }
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    if encoding not in cached:
+        cached[encoding] = _compress(cached['identity'], encoding)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(cached[encoding], status=200, mimetype='application/json', headers=headers)
+
+def directory_index(entry, key, item_number_key):
+    # Items of a cache entry by number, built lazily once per version
+    index = entry.get('index')
+    if index is None:
+        index = {item[item_number_key]: item for item in entry['directory'][key]}
+        entry['index'] = index
+    return index
+
+def find_in_directory(dir_file, key, item_number_key, item_number):
+    # O(1) lookup through a per-version index, rebuilt lazily after each write
+    return directory_index(_directory_entry(dir_file), key, item_number_key).get(item_number)
+
+def newest_first(dir_file, key, item_number_key):
+    # Items sorted by descending number, plus their negated numbers in
+    # ascending order for bisecting. Built once per directory version.
+    entry = _directory_entry(dir_file)
+    ordered = entry.get('newest_first')
+    if ordered is None:
+        items = sorted(entry['directory'][key], key=lambda x: int(x[item_number_key]), reverse=True)
+        ordered = (items, [-int(item[item_number_key]) for item in items])
+        entry['newest_first'] = ordered
+    return ordered
+
+def project_item(item, item_number_key, fields, summary):
+    if fields:
+        return {k: v for k, v in item.items() if k in fields or k == item_number_key}
+    if summary:
+        projected = {k: v for k, v in item.items() if k not in SUMMARY_OMITTED_FIELDS}
+        # Summaries only show the cover
+        if 'media' in item:
+            cover = item.get('cover_image')
+            projected['media'] = {cover: item['media'][cover]} if cover in item['media'] else {}
+        return projected
+    return item
+
+def list_items(dir_file, key, item_number_key, limit=None, after=None, fields=None, summary=False):
+    directory = load_directory(dir_file)
+    if not limit and after is None:
+        # Full listings keep the directory order (ascending item number)
+        items = directory[key]
+        page = {}
+    else:
+        # Pages run newest first; `after` is the last item number already seen
+        items, keys = newest_first(dir_file, key, item_number_key)
+        start = bisect.bisect_right(keys, -after) if after is not None else 0
+        end = start + limit if limit else len(items)
+        next_after = items[end - 1][item_number_key] if end < len(items) else None
+        items = items[start:end]
+        page = {'next_after': next_after}
+
+    if fields or summary:
+        items = [project_item(item, item_number_key, fields, summary) for item in items]
+    listing = {k: v for k, v in directory.items() if k != CHANGE_LOG_KEY}
+    return {**listing, key: items, **page}
+
+def listing_response(dir_file, key, item_number_key):
+    # Handle limit / after / fields / view parameters
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit < 1:
+        limit = None
+    after = request.args.get('after', type=int)
+    fields = request.args.get('fields')
+    fields = tuple(sorted(f for f in fields.split(',') if f)) if fields else None
+    summary = request.args.get('view') == 'summary'
+
+    return directory_response(dir_file, (limit, after, fields, summary), lambda directory: list_items(
+        dir_file, key, item_number_key, limit, after, fields, summary
+    ))
+
+# Listeners keeping derived data (like the search index) in step with the
+# directories. Each write made by this process calls
+# listener(dir_file, old_version, new_version, upserted_items, removed_items)
+# under the directory lock. Writes made by other processes are not reported,
+# listeners catch up with them by comparing versions.
+_directory_listeners = []
+
+def directory_listener(listener):
+    _directory_listeners.append(listener)
+    return listener
+
+def notify_directory_change(dir_file, old_version, upserted, removed):
+    new_version = _directory_version(dir_file)
+    for listener in _directory_listeners:
+        listener(dir_file, old_version, new_version, list(upserted), list(removed))
+
+# Every write bumps the collection's change log version and records it
+# against the items it upserted or removed, so /changes can send a client
+# only what changed since the version it holds. The JSON engine keeps the log
+# in directory.json under CHANGE_LOG_KEY, SQLite in its changes table; both
+# are written together with the items.
+def empty_change_log():
+    return {'version': 0, 'floor': 0, 'items': {}, 'deleted': {}}
+
+def next_change_log(change_log, upserted, removed):
+    # Returns a new log, the cached one is shared
+    log = change_log or empty_change_log()
+    version = log['version'] + 1
+    items = dict(log['items'])
+    deleted = dict(log['deleted'])
+    for number in upserted:
+        items[number] = version
+        deleted.pop(number, None)
+    for number in removed:
+        items.pop(number, None)
+        deleted[number] = version
+    # Drop the oldest tombstones; clients from before them get a snapshot
+    floor = log['floor']
+    if len(deleted) > CHANGE_LOG_TOMBSTONES:
+        for number, deleted_at in sorted(deleted.items(), key=lambda x: x[1])[:len(deleted) - CHANGE_LOG_TOMBSTONES]:
+            del deleted[number]
+            floor = max(floor, deleted_at)
+    return {'version': version, 'floor': floor, 'items': items, 'deleted': deleted}
+
+def update_directory(dir_file, key, item_data, item_number_key):
+    update_directory_many(dir_file, key, [item_data], item_number_key)
+
+def update_directory_many(dir_file, key, items_data, item_number_key):
+    # Upserts any number of items with a single directory write
+    add_image_media(dir_file, key, item_number_key, items_data)
+
+    with directory_lock(dir_file):
+        # Read under the lock, another worker may have written meanwhile. A
+        # number given twice in the batch keeps its last item.
+        new_items = {item_data[item_number_key]: item_data for item_data in items_data}
+        old_items = {}
+        for item_number, item_data in new_items.items():
+            existing = find_in_directory(dir_file, key, item_number_key, item_number)
+            if existing:
+                old_items[item_number] = existing
+                item_data['upload_date'] = existing.get('upload_date', item_data['upload_date'])
+                if 'photos' not in item_data and 'photos' in existing:
+                    # An album sent without photos keeps the stored ones,
+                    # edited meanwhile through /photo_albums/<n>/photos
+                    item_data['photos'] = existing['photos']
+                    stored = set(existing['photos'])
+                    photo_media = {url: info for url, info in existing.get('media', {}).items() if url in stored}
+                    if photo_media:
+                        item_data['media'] = {**photo_media, **item_data.get('media', {})}
+        old_version = _directory_entry(dir_file)['version']
+
+        if use_sqlite():
+            with DIRECTORY_WRITE_DURATION.time(collection_name(dir_file)):
+                sqlite_store.upsert_items(get_db(), collection_name(dir_file), list(new_items.values()))
+        else:
+            # Update items that already exist, append the others
+            directory = load_directory(dir_file)
+            items = [item for item in directory[key] if item[item_number_key] not in new_items]
+            items.extend(new_items.values())
+
+            # Sort items by item number
+            items.sort(key=lambda x: int(x[item_number_key]))
+
+            change_log = next_change_log(directory.get(CHANGE_LOG_KEY), new_items, [])
+            save_directory(dir_file, {**directory, key: items, CHANGE_LOG_KEY: change_log})
+
+        update_media_refs(old_items.values(), new_items.values())
+        notify_directory_change(dir_file, old_version, new_items.values(), [])
+
+def remove_from_directory(dir_file, key, item_number_key, item_number):
+    # Returns the removed item, or None if there was nothing to remove. Its
+    # images are released with it, the files go with the next collect_garbage.
+    with directory_lock(dir_file):
+        removed = find_in_directory(dir_file, key, item_number_key, item_number)
+        if not removed:
+            return None
+        old_version = _directory_entry(dir_file)['version']
+        if use_sqlite():
+            with DIRECTORY_WRITE_DURATION.time(collection_name(dir_file)):
+                sqlite_store.delete_item(get_db(), collection_name(dir_file), item_number, CHANGE_LOG_TOMBSTONES)
+        else:
+            directory = load_directory(dir_file)
+            items = [item for item in directory[key] if item[item_number_key] != item_number]
+            change_log = next_change_log(directory.get(CHANGE_LOG_KEY), [], [item_number])
+            save_directory(dir_file, {**directory, key: items, CHANGE_LOG_KEY: change_log})
+        update_media_refs([removed], [])
+        notify_directory_change(dir_file, old_version, [], [removed])
+    return removed
+
+def item_response(dir_file, key, item_number_key, item_number, not_found_message):
+    # The item is looked up in the same cache entry its body is cached in, so
+    # a write landing meanwhile can't get an old item cached under its version
+    entry = _directory_entry(dir_file)
+    item = directory_index(entry, key, item_number_key).get(item_number)
+    if not item:
+        return jsonify({'error': not_found_message}), 404
+    return directory_response(dir_file, ('item', item_number), lambda directory: item, entry)
+
+# Upload job queue. Uploads sent with async=true only get their files staged
+# inside the request; saving them, image processing and the directory update
+# run on a background thread. Job records are files, so any worker process
+# can answer /jobs/<id>.
+_upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_JOB_WORKERS, thread_name_prefix='upload-job')
+
+def job_file(job_id):
+    return os.path.join(JOBS_FOLDER, f'{job_id}.json')
+
+def save_job(job):
+    job['updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    write_json_atomic(job_file(job['id']), job)
+
+class StagedFile:
+    # Stands in for a werkzeug FileStorage once the upload is already on disk
+    # (staged for a job, or sent through /uploads), so store_media can move
+    # it into place instead of copying it. sha256 is set when already known.
+    def __init__(self, filename, path, on_save=None, sha256=None):
+        self.filename = filename
+        self.path = path
+        self.on_save = on_save
+        self.sha256 = sha256
+
+    def __bool__(self):
+        return bool(self.filename)
+
+def _file_size(upload):
+    stream = upload.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+def run_upload(process):
+    # Runs an upload handler within the request, or queues it and answers 202
+    # with a job id when the client sent async=true
+    for upload in request.files.values():
+        if upload.filename and _file_size(upload) > app.config['MAX_FILE_SIZE']:
+            return jsonify({'error': f'File too large: {upload.filename}'}), 413
+
+    is_async = request.form.get('async') == 'true'
+    job_id = uuid.uuid4().hex
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    job = {'id': job_id, 'status': 'queued', 'created': now, 'files_total': 0, 'files_saved': 0}
+
+    def on_save():
+        job['files_saved'] += 1
+        save_job(job)
+
+    try:
+        resumable = resumable_upload_files(request.form, on_save if is_async else None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if not is_async:
+        return process(request.form, {**request.files.to_dict(), **resumable})
+
+    staging = os.path.join(JOBS_FOLDER, job_id)
+    os.makedirs(staging)
+    files = {}
+    for index, (field, upload) in enumerate(request.files.items()):
+        path = os.path.join(staging, str(index))
+        if upload.filename:
+            upload.save(path)
+            UPLOAD_BYTES.inc('staging', amount=os.path.getsize(path))
+            job['files_total'] += 1
+        files[field] = StagedFile(upload.filename, path, on_save)
+    files.update(resumable)
+    job['files_total'] += len(resumable)
+
+    save_job(job)
+    _upload_executor.submit(_run_upload_job, job, process, request.form.copy(), files, staging)
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+def _run_upload_job(job, process, form, files, staging):
+    job['status'] = 'running'
+    save_job(job)
+    try:
+        with app.app_context():
+            response, status = process(form, files)
+            job['result'] = response.get_json()
+        job['status'] = 'done' if status < 400 else 'failed'
+    except Exception as e:
+        app.logger.error(f"Upload job error: {str(e)}")
+        job.update(status='failed', error=str(e))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        save_job(job)
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    path = job_file(secure_filename(job_id))
+    if not os.path.exists(path):
+        return jsonify({'error': 'Job not found'}), 404
+    with open(path, 'r') as f:
+        return jsonify(json.load(f)), 200
+
+# Resumable uploads. A client creates an upload with POST /uploads, sends
+# the bytes in any number of PATCH requests (Upload-Offset says where each
+# chunk starts) and can ask for the current offset with HEAD to resume after
+# a dropped connection. Upload handlers then take <field>_upload_id in place
+# of a multipart file <field>.
+_upload_hashes = {}
+
+def upload_record_file(upload_id):
+    return os.path.join(UPLOADS_FOLDER, f'{upload_id}.json')
+
+def upload_part_file(upload_id):
+    return os.path.join(UPLOADS_FOLDER, f'{upload_id}.part')
+
+def load_upload(upload_id):
+    path = upload_record_file(secure_filename(upload_id))
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def discard_upload(upload_id):
+    upload_id = secure_filename(upload_id)
+    for path in (upload_part_file(upload_id), upload_record_file(upload_id)):
+        if os.path.exists(path):
+            os.remove(path)
+    _upload_hashes.pop(upload_id, None)
+
+def _upload_hash(upload_id, offset):
+    # Running sha256 of the first `offset` bytes. Rebuilt from disk when the
+    # earlier chunks went to another worker process.
+    state = _upload_hashes.get(upload_id)
+    if state and state[0] == offset:
+        return state[1]
+    digest = hashlib.sha256()
+    with open(upload_part_file(upload_id), 'rb') as f:
+        remaining = offset
+        while remaining:
+            chunk = f.read(min(UPLOAD_READ_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+def resumable_upload_files(form, on_save=None):
+    # Completed uploads referred to by <field>_upload_id form values
+    files = {}
+    for name, upload_id in form.items():
+        if not name.endswith('_upload_id'):
+            continue
+        record = load_upload(upload_id)
+        if not record:
+            raise ValueError(f'Upload {upload_id} not found')
+        if not record.get('complete'):
+            raise ValueError(f'Upload {upload_id} is not complete')
+
+        def finish(record_file=upload_record_file(record['id'])):
+            os.remove(record_file)
+            if on_save:
+                on_save()
+
+        field = name[:-len('_upload_id')]
+        files[field] = StagedFile(
+            record['filename'], upload_part_file(record['id']), finish, record.get('sha256')
+        )
+    return files
+
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    data = request.get_json(silent=True) or request.form
+    filename = data.get('filename', '')
+    try:
+        size = int(data.get('size', ''))
+    except ValueError:
+        return jsonify({'error': 'Missing or invalid size'}), 400
+    if not allowed_file(filename) and not filename.lower().endswith('.zip'):
+        return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg, zip'}), 400
+    limit = app.config['MAX_FILE_SIZE'] if allowed_file(filename) else app.config['MAX_ARCHIVE_SIZE']
+    if size < 0 or size > limit:
+        return jsonify({'error': f'File too large: {filename}'}), 413
+
+    upload_id = uuid.uuid4().hex
+    open(upload_part_file(upload_id), 'wb').close()
+    write_json_atomic(upload_record_file(upload_id), {
+        'id': upload_id,
+        'filename': filename,
+        'size': size,
+        'expected_sha256': data.get('sha256'),
+        'complete': size == 0,
+        'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    return jsonify({'upload_id': upload_id, 'offset': 0}), 201, {'Location': f'/uploads/{upload_id}'}
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def get_upload(upload_id):
+    # Also answers HEAD, which is how clients find where to resume
+    record = load_upload(upload_id)
+    if not record:
+        return jsonify({'error': 'Upload not found'}), 404
+    offset = os.path.getsize(upload_part_file(record['id']))
+    headers = {'Upload-Offset': str(offset), 'Upload-Length': str(record['size']), 'Cache-Control': 'no-store'}
+    return jsonify({**record, 'offset': offset}), 200, headers
+
+@app.route("/uploads/<upload_id>", methods=["PATCH"])
+def append_upload_chunk(upload_id):
+    record = load_upload(upload_id)
+    if not record:
+        return jsonify({'error': 'Upload not found'}), 404
+    upload_id = record['id']
+    offset = request.headers.get('Upload-Offset', type=int)
+
+    with open(upload_part_file(upload_id), 'r+b') as f:
+        if fcntl:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return jsonify({'error': 'Another chunk is being written'}), 409
+
+        current = os.fstat(f.fileno()).st_size
+        if record['complete'] or offset != current:
+            return jsonify({'error': 'Offset mismatch', 'offset': current}), 409, {'Upload-Offset': str(current)}
+
+        # Stream the chunk straight into the part file, hashing as it goes
+        digest = _upload_hash(upload_id, current)
+        f.seek(current)
+        while True:
+            chunk = request.stream.read(UPLOAD_READ_SIZE)
+            if not chunk:
+                break
+            if current + len(chunk) > record['size']:
+                f.truncate(offset)
+                _upload_hashes.pop(upload_id, None)
+                return jsonify({'error': 'Chunk goes past the declared size', 'offset': offset}), 413
+            f.write(chunk)
+            digest.update(chunk)
+            current += len(chunk)
+            UPLOAD_BYTES.inc('resumable', amount=len(chunk))
+        f.flush()
+        os.fsync(f.fileno())
+
+        _upload_hashes[upload_id] = (current, digest)
+        if current == record['size']:
+            _upload_hashes.pop(upload_id, None)
+            sha256 = digest.hexdigest()
+            if record.get('expected_sha256') and record['expected_sha256'] != sha256:
+                # Start over, the client has to resend the file
+                f.truncate(0)
+                return jsonify({'error': 'Checksum mismatch', 'offset': 0}), 422, {'Upload-Offset': '0'}
+            record.update(complete=True, sha256=sha256)
+            write_json_atomic(upload_record_file(upload_id), record)
+
+    return Response(status=204, headers={'Upload-Offset': str(current)})
 
 @app.route("/upload_pac_times", methods=["POST"])
 def upload_pac_times():
+    return run_upload(process_upload_pac_times)
+
+def process_upload_pac_times(form, files):
     try:
-        if not all(field in request.form for field in ['issue_number', 'title']):
+        if not all(field in form for field in ['issue_number', 'title']):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        is_edit = request.form.get('is_edit') == 'true'
-        issue_number = request.form.get('issue_number')
-        title = request.form.get('title')
-        issue_date = request.form.get('issue_date', '')
+        is_edit = form.get('is_edit') == 'true'
+        issue_number = form.get('issue_number')
+        title = form.get('title')
+        issue_date = form.get('issue_date', '')
         
         # Handle cover image
         cover_image_path = None
-        if 'cover_image' in request.files and request.files['cover_image'].filename:
-            cover_image = request.files['cover_image']
+        if 'cover_image' in files and files['cover_image'].filename:
+            cover_image = files['cover_image']
             if not allowed_file(cover_image.filename):
                 return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg'}), 400
             
-            cover_filename = secure_filename(f"issue_{issue_number}_cover_{cover_image.filename}")
-            cover_path = os.path.join(PAC_TIMES_UPLOAD_FOLDER, cover_filename)
-            cover_image.save(cover_path)
-            cover_image_path = f"/static/pac_times/{cover_filename}"
+            cover_image_path = store_media(cover_image)
         elif is_edit:
             # Keep existing cover image for edit mode
-            with open(PAC_TIMES_DIR_FILE, 'r') as f:
-                directory = json.load(f)
-                for issue in directory['issues']:
-                    if issue['issue_number'] == issue_number:
-                        cover_image_path = issue.get('cover_image')
-                        break
+            issue = find_in_directory(PAC_TIMES_DIR_FILE, 'issues', 'issue_number', issue_number)
+            if issue:
+                cover_image_path = issue.get('cover_image')
         else:
             return jsonify({'error': 'No cover image provided'}), 400
 
@@ -96,27 +1013,26 @@ def upload_pac_times():
         sections = []
         section_index = 0
         
-        while f'section_{section_index}_heading' in request.form:
+        while f'section_{section_index}_heading' in form:
             section_data = {
-                'heading': request.form.get(f'section_{section_index}_heading'),
-                'body': request.form.get(f'section_{section_index}_body'),
+                'heading': form.get(f'section_{section_index}_heading'),
+                'body': form.get(f'section_{section_index}_body'),
                 'image': None
             }
 
             # Check for new section image
-            if f'section_{section_index}_image' in request.files:
-                section_image = request.files[f'section_{section_index}_image']
+            if f'section_{section_index}_image' in files:
+                section_image = files[f'section_{section_index}_image']
                 if section_image and section_image.filename:
                     if allowed_file(section_image.filename):
-                        section_filename = secure_filename(f"issue_{issue_number}_section_{section_index}_{section_image.filename}")
-                        section_image_path = os.path.join(PAC_TIMES_UPLOAD_FOLDER, section_filename)
-                        section_image.save(section_image_path)
-                        section_data['image'] = f"/static/pac_times/{section_filename}"
+                        section_data['image'] = store_media(section_image)
 
             # Handle existing section image in edit mode
-            elif is_edit and f'section_{section_index}_existing_image' in request.form:
-                existing_image = request.form.get(f'section_{section_index}_existing_image')
+            elif is_edit and f'section_{section_index}_existing_image' in form:
+                existing_image = form.get(f'section_{section_index}_existing_image')
                 if existing_image:
+                    if not safe_static_path(existing_image):
+                        return jsonify({'error': 'Invalid image path'}), 400
                     section_data['image'] = existing_image
 
             sections.append(section_data)
@@ -132,27 +1048,6 @@ def upload_pac_times():
             'sections': sections
         }
 
-        # Handle old files cleanup in edit mode
-        if is_edit:
-            old_cover_image = request.form.get('old_cover_image')
-            if old_cover_image and cover_image_path and old_cover_image != cover_image_path:
-                old_file_path = os.path.join(app.root_path, old_cover_image.lstrip('/'))
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-
-            # Get old issue data to compare section images
-            with open(PAC_TIMES_DIR_FILE, 'r') as f:
-                directory = json.load(f)
-                old_issue = next((issue for issue in directory['issues'] 
-                                if issue['issue_number'] == issue_number), None)
-                if old_issue:
-                    for old_section in old_issue.get('sections', []):
-                        old_image = old_section.get('image')
-                        if old_image and old_image not in [s.get('image') for s in sections]:
-                            old_file_path = os.path.join(app.root_path, old_image.lstrip('/'))
-                            if os.path.exists(old_file_path):
-                                os.remove(old_file_path)
-
         update_directory(PAC_TIMES_DIR_FILE, 'issues', issue_data, 'issue_number')
 
         return jsonify({
@@ -170,35 +1065,32 @@ def upload_pac_times():
 
 @app.route("/upload_pac_event", methods=["POST"])
 def upload_pac_event():
+    return run_upload(process_upload_pac_event)
+
+def process_upload_pac_event(form, files):
     try:
-        if not all(field in request.form for field in ['event_number', 'title']):
+        if not all(field in form for field in ['event_number', 'title']):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        is_edit = request.form.get('is_edit') == 'true'
-        event_number = request.form.get('event_number')
-        title = request.form.get('title')
-        event_date = request.form.get('event_date', '')
-        image_gallery_album_id = request.form.get('image_gallery_album_id', '')
+        is_edit = form.get('is_edit') == 'true'
+        event_number = form.get('event_number')
+        title = form.get('title')
+        event_date = form.get('event_date', '')
+        image_gallery_album_id = form.get('image_gallery_album_id', '')
         
         # Handle cover image
         cover_image_path = None
-        if 'cover_image' in request.files and request.files['cover_image'].filename:
-            cover_image = request.files['cover_image']
+        if 'cover_image' in files and files['cover_image'].filename:
+            cover_image = files['cover_image']
             if not allowed_file(cover_image.filename):
                 return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg'}), 400
             
-            cover_filename = secure_filename(f"event_{event_number}_cover_{cover_image.filename}")
-            cover_path = os.path.join(PAC_EVENTS_UPLOAD_FOLDER, cover_filename)
-            cover_image.save(cover_path)
-            cover_image_path = f"/static/pac_events/{cover_filename}"
+            cover_image_path = store_media(cover_image)
         elif is_edit:
             # Keep existing cover image for edit mode
-            with open(PAC_EVENTS_DIR_FILE, 'r') as f:
-                directory = json.load(f)
-                for event in directory['events']:
-                    if event['event_number'] == event_number:
-                        cover_image_path = event.get('cover_image')
-                        break
+            event = find_in_directory(PAC_EVENTS_DIR_FILE, 'events', 'event_number', event_number)
+            if event:
+                cover_image_path = event.get('cover_image')
         else:
             return jsonify({'error': 'No cover image provided'}), 400
 
@@ -206,27 +1098,26 @@ def upload_pac_event():
         sections = []
         section_index = 0
         
-        while f'section_{section_index}_heading' in request.form:
+        while f'section_{section_index}_heading' in form:
             section_data = {
-                'heading': request.form.get(f'section_{section_index}_heading'),
-                'body': request.form.get(f'section_{section_index}_body'),
+                'heading': form.get(f'section_{section_index}_heading'),
+                'body': form.get(f'section_{section_index}_body'),
                 'image': None
             }
 
             # Check for new section image
-            if f'section_{section_index}_image' in request.files:
-                section_image = request.files[f'section_{section_index}_image']
+            if f'section_{section_index}_image' in files:
+                section_image = files[f'section_{section_index}_image']
                 if section_image and section_image.filename:
                     if allowed_file(section_image.filename):
-                        section_filename = secure_filename(f"event_{event_number}_section_{section_index}_{section_image.filename}")
-                        section_image_path = os.path.join(PAC_EVENTS_UPLOAD_FOLDER, section_filename)
-                        section_image.save(section_image_path)
-                        section_data['image'] = f"/static/pac_events/{section_filename}"
+                        section_data['image'] = store_media(section_image)
 
             # Handle existing section image in edit mode
-            elif is_edit and f'section_{section_index}_existing_image' in request.form:
-                existing_image = request.form.get(f'section_{section_index}_existing_image')
+            elif is_edit and f'section_{section_index}_existing_image' in form:
+                existing_image = form.get(f'section_{section_index}_existing_image')
                 if existing_image:
+                    if not safe_static_path(existing_image):
+                        return jsonify({'error': 'Invalid image path'}), 400
                     section_data['image'] = existing_image
 
             sections.append(section_data)
@@ -243,27 +1134,6 @@ def upload_pac_event():
             'sections': sections
         }
 
-        # Handle old files cleanup in edit mode
-        if is_edit:
-            old_cover_image = request.form.get('old_cover_image')
-            if old_cover_image and cover_image_path and old_cover_image != cover_image_path:
-                old_file_path = os.path.join(app.root_path, old_cover_image.lstrip('/'))
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-
-            # Get old event data to compare section images
-            with open(PAC_EVENTS_DIR_FILE, 'r') as f:
-                directory = json.load(f)
-                old_event = next((event for event in directory['events'] 
-                                if event['event_number'] == event_number), None)
-                if old_event and 'sections' in old_event:
-                    for old_section in old_event.get('sections', []):
-                        old_image = old_section.get('image')
-                        if old_image and old_image not in [s.get('image') for s in sections]:
-                            old_file_path = os.path.join(app.root_path, old_image.lstrip('/'))
-                            if os.path.exists(old_file_path):
-                                os.remove(old_file_path)
-
         update_directory(PAC_EVENTS_DIR_FILE, 'events', event_data, 'event_number')
 
         return jsonify({
@@ -282,41 +1152,31 @@ def upload_pac_event():
 @app.route("/get_pac_times", methods=["GET"])
 def get_pac_times():
     try:
-        with open(PAC_TIMES_DIR_FILE, 'r') as f:
-            directory = json.load(f)
-        
-        # Handle limit parameter
-        limit = request.args.get('limit', type=int)
-        if limit:
-            directory['issues'] = sorted(
-                directory['issues'], 
-                key=lambda x: int(x['issue_number']), 
-                reverse=True
-            )[:limit]
-            
-        return jsonify(directory), 200
+        return listing_response(PAC_TIMES_DIR_FILE, 'issues', 'issue_number')
     except Exception as e:
         return jsonify({'error': f'Error retrieving issues: {str(e)}'}), 500
 
+@app.route("/get_pac_times/<issue_number>", methods=["GET"])
+def get_pac_times_issue(issue_number):
+    try:
+        return item_response(PAC_TIMES_DIR_FILE, 'issues', 'issue_number', issue_number, 'Issue not found')
+    except Exception as e:
+        return jsonify({'error': f'Error retrieving issue: {str(e)}'}), 500
+
 @app.route("/get_pac_events", methods=["GET"])
 def get_pac_events():
     try:
-        with open(PAC_EVENTS_DIR_FILE, 'r') as f:
-            directory = json.load(f)
-            
-        # Handle limit parameter
-        limit = request.args.get('limit', type=int)
-        if limit:
-            directory['events'] = sorted(
-                directory['events'], 
-                key=lambda x: int(x['event_number']), 
-                reverse=True
-            )[:limit]
-            
-        return jsonify(directory), 200
+        return listing_response(PAC_EVENTS_DIR_FILE, 'events', 'event_number')
     except Exception as e:
         return jsonify({'error': f'Error retrieving events: {str(e)}'}), 500
 
+@app.route("/get_pac_event/<event_number>", methods=["GET"])
+def get_pac_event(event_number):
+    try:
+        return item_response(PAC_EVENTS_DIR_FILE, 'events', 'event_number', event_number, 'Event not found')
+    except Exception as e:
+        return jsonify({'error': f'Error retrieving event: {str(e)}'}), 500
+
 @app.route("/handle_login", methods=["POST"])
 def handle_login():
     password = request.form.get('password')
@@ -328,33 +1188,7 @@ def handle_login():
 @app.route("/delete_pac_times/<issue_number>", methods=["DELETE"])
 def delete_pac_times(issue_number):
     try:
-        with open(PAC_TIMES_DIR_FILE, 'r') as f:
-            directory = json.load(f)
-        
-        # Find and remove the issue
-        for i, issue in enumerate(directory['issues']):
-            if issue['issue_number'] == issue_number:
-                # Delete cover image
-                if issue.get('cover_image'):
-                    cover_path = os.path.join(app.root_path, issue['cover_image'].lstrip('/'))
-                    if os.path.exists(cover_path):
-                        os.remove(cover_path)
-                
-                # Delete section images
-                for section in issue.get('sections', []):
-                    if section.get('image'):
-                        section_path = os.path.join(app.root_path, section['image'].lstrip('/'))
-                        if os.path.exists(section_path):
-                            os.remove(section_path)
-                
-                # Remove from directory
-                directory['issues'].pop(i)
-                break
-        
-        # Save updated directory
-        with open(PAC_TIMES_DIR_FILE, 'w') as f:
-            json.dump(directory, f, indent=2)
-        
+        remove_from_directory(PAC_TIMES_DIR_FILE, 'issues', 'issue_number', issue_number)
         return jsonify({'message': 'Issue deleted successfully'}), 200
     except Exception as e:
         app.logger.error(f"Delete error: {str(e)}")
@@ -363,33 +1197,7 @@ def delete_pac_times(issue_number):
 @app.route("/delete_pac_event/<event_number>", methods=["DELETE"])
 def delete_pac_event(event_number):
     try:
-        with open(PAC_EVENTS_DIR_FILE, 'r') as f:
-            directory = json.load(f)
-        
-        # Find and remove the event
-        for i, event in enumerate(directory['events']):
-            if event['event_number'] == event_number:
-                # Delete cover image
-                if event.get('cover_image'):
-                    cover_path = os.path.join(app.root_path, event['cover_image'].lstrip('/'))
-                    if os.path.exists(cover_path):
-                        os.remove(cover_path)
-                
-                # Delete section images
-                for section in event.get('sections', []):
-                    if section.get('image'):
-                        section_path = os.path.join(app.root_path, section['image'].lstrip('/'))
-                        if os.path.exists(section_path):
-                            os.remove(section_path)
-                
-                # Remove from directory
-                directory['events'].pop(i)
-                break
-        
-        # Save updated directory
-        with open(PAC_EVENTS_DIR_FILE, 'w') as f:
-            json.dump(directory, f, indent=2)
-        
+        remove_from_directory(PAC_EVENTS_DIR_FILE, 'events', 'event_number', event_number)
         return jsonify({'message': 'Event deleted successfully'}), 200
     except Exception as e:
         app.logger.error(f"Delete error: {str(e)}")
@@ -405,35 +1213,32 @@ create_directory_file_if_not_exists(READING_CIRCLE_DIR_FILE, 'events')
 
 @app.route("/upload_reading_circle", methods=["POST"])
 def upload_reading_circle():
+    return run_upload(process_upload_reading_circle)
+
+def process_upload_reading_circle(form, files):
     try:
-        if not all(field in request.form for field in ['event_number', 'title']):
+        if not all(field in form for field in ['event_number', 'title']):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        is_edit = request.form.get('is_edit') == 'true'
-        event_number = request.form.get('event_number')
-        title = request.form.get('title')
-        event_date = request.form.get('event_date', '')
-        image_gallery_album_id = request.form.get('image_gallery_album_id', '')
+        is_edit = form.get('is_edit') == 'true'
+        event_number = form.get('event_number')
+        title = form.get('title')
+        event_date = form.get('event_date', '')
+        image_gallery_album_id = form.get('image_gallery_album_id', '')
         
         # Handle cover image
         cover_image_path = None
-        if 'cover_image' in request.files and request.files['cover_image'].filename:
-            cover_image = request.files['cover_image']
+        if 'cover_image' in files and files['cover_image'].filename:
+            cover_image = files['cover_image']
             if not allowed_file(cover_image.filename):
                 return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg'}), 400
             
-            cover_filename = secure_filename(f"event_{event_number}_cover_{cover_image.filename}")
-            cover_path = os.path.join(READING_CIRCLE_UPLOAD_FOLDER, cover_filename)
-            cover_image.save(cover_path)
-            cover_image_path = f"/static/reading_circle/{cover_filename}"
+            cover_image_path = store_media(cover_image)
         elif is_edit:
             # Keep existing cover image for edit mode
-            with open(READING_CIRCLE_DIR_FILE, 'r') as f:
-                directory = json.load(f)
-                for event in directory['events']:
-                    if event['event_number'] == event_number:
-                        cover_image_path = event.get('cover_image')
-                        break
+            event = find_in_directory(READING_CIRCLE_DIR_FILE, 'events', 'event_number', event_number)
+            if event:
+                cover_image_path = event.get('cover_image')
         else:
             return jsonify({'error': 'No cover image provided'}), 400
 
@@ -441,27 +1246,26 @@ def upload_reading_circle():
         sections = []
         section_index = 0
         
-        while f'section_{section_index}_heading' in request.form:
+        while f'section_{section_index}_heading' in form:
             section_data = {
-                'heading': request.form.get(f'section_{section_index}_heading'),
-                'body': request.form.get(f'section_{section_index}_body'),
+                'heading': form.get(f'section_{section_index}_heading'),
+                'body': form.get(f'section_{section_index}_body'),
                 'image': None
             }
 
             # Check for new section image
-            if f'section_{section_index}_image' in request.files:
-                section_image = request.files[f'section_{section_index}_image']
+            if f'section_{section_index}_image' in files:
+                section_image = files[f'section_{section_index}_image']
                 if section_image and section_image.filename:
                     if allowed_file(section_image.filename):
-                        section_filename = secure_filename(f"event_{event_number}_section_{section_index}_{section_image.filename}")
-                        section_image_path = os.path.join(READING_CIRCLE_UPLOAD_FOLDER, section_filename)
-                        section_image.save(section_image_path)
-                        section_data['image'] = f"/static/reading_circle/{section_filename}"
+                        section_data['image'] = store_media(section_image)
 
             # Handle existing section image in edit mode
-            elif is_edit and f'section_{section_index}_existing_image' in request.form:
-                existing_image = request.form.get(f'section_{section_index}_existing_image')
+            elif is_edit and f'section_{section_index}_existing_image' in form:
+                existing_image = form.get(f'section_{section_index}_existing_image')
                 if existing_image:
+                    if not safe_static_path(existing_image):
+                        return jsonify({'error': 'Invalid image path'}), 400
                     section_data['image'] = existing_image
 
             sections.append(section_data)
@@ -478,27 +1282,6 @@ def upload_reading_circle():
             'sections': sections
         }
 
-        # Handle old files cleanup in edit mode
-        if is_edit:
-            old_cover_image = request.form.get('old_cover_image')
-            if old_cover_image and cover_image_path and old_cover_image != cover_image_path:
-                old_file_path = os.path.join(app.root_path, old_cover_image.lstrip('/'))
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-
-            # Get old event data to compare section images
-            with open(READING_CIRCLE_DIR_FILE, 'r') as f:
-                directory = json.load(f)
-                old_event = next((event for event in directory['events'] 
-                                if event['event_number'] == event_number), None)
-                if old_event and 'sections' in old_event:
-                    for old_section in old_event.get('sections', []):
-                        old_image = old_section.get('image')
-                        if old_image and old_image not in [s.get('image') for s in sections]:
-                            old_file_path = os.path.join(app.root_path, old_image.lstrip('/'))
-                            if os.path.exists(old_file_path):
-                                os.remove(old_file_path)
-
         update_directory(READING_CIRCLE_DIR_FILE, 'events', event_data, 'event_number')
 
         return jsonify({
@@ -517,52 +1300,21 @@ def upload_reading_circle():
 @app.route("/get_reading_circle", methods=["GET"])
 def get_reading_circle():
     try:
-        with open(READING_CIRCLE_DIR_FILE, 'r') as f:
-            directory = json.load(f)
-            
-        # Handle limit parameter
-        limit = request.args.get('limit', type=int)
-        if limit:
-            directory['events'] = sorted(
-                directory['events'], 
-                key=lambda x: int(x['event_number']), 
-                reverse=True
-            )[:limit]
-            
-        return jsonify(directory), 200
+        return listing_response(READING_CIRCLE_DIR_FILE, 'events', 'event_number')
     except Exception as e:
         return jsonify({'error': f'Error retrieving events: {str(e)}'}), 500
 
+@app.route("/get_reading_circle/<event_number>", methods=["GET"])
+def get_reading_circle_event(event_number):
+    try:
+        return item_response(READING_CIRCLE_DIR_FILE, 'events', 'event_number', event_number, 'Event not found')
+    except Exception as e:
+        return jsonify({'error': f'Error retrieving event: {str(e)}'}), 500
+
 @app.route("/delete_reading_circle/<event_number>", methods=["DELETE"])
 def delete_reading_circle(event_number):
     try:
-        with open(READING_CIRCLE_DIR_FILE, 'r') as f:
-            directory = json.load(f)
-        
-        # Find and remove the event
-        for i, event in enumerate(directory['events']):
-            if event['event_number'] == event_number:
-                # Delete cover image
-                if event.get('cover_image'):
-                    cover_path = os.path.join(app.root_path, event['cover_image'].lstrip('/'))
-                    if os.path.exists(cover_path):
-                        os.remove(cover_path)
-                
-                # Delete section images
-                for section in event.get('sections', []):
-                    if section.get('image'):
-                        section_path = os.path.join(app.root_path, section['image'].lstrip('/'))
-                        if os.path.exists(section_path):
-                            os.remove(section_path)
-                
-                # Remove from directory
-                directory['events'].pop(i)
-                break
-        
-        # Save updated directory
-        with open(READING_CIRCLE_DIR_FILE, 'w') as f:
-            json.dump(directory, f, indent=2)
-        
+        remove_from_directory(READING_CIRCLE_DIR_FILE, 'events', 'event_number', event_number)
         return jsonify({'message': 'Event deleted successfully'}), 200
     except Exception as e:
         app.logger.error(f"Delete error: {str(e)}")
@@ -578,51 +1330,49 @@ create_directory_file_if_not_exists(PHOTO_GALLERY_DIR_FILE, 'albums')
 
 @app.route("/upload_photo_album", methods=["POST"])
 def upload_photo_album():
+    return run_upload(process_upload_photo_album)
+
+def process_upload_photo_album(form, files):
     try:
-        if not all(field in request.form for field in ['album_number', 'title']):
+        if not all(field in form for field in ['album_number', 'title']):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        is_edit = request.form.get('is_edit') == 'true'
-        album_number = request.form.get('album_number')
-        title = request.form.get('title')
-        album_date = request.form.get('album_date', '')
-        description = request.form.get('description', '')
+        is_edit = form.get('is_edit') == 'true'
+        album_number = form.get('album_number')
+        title = form.get('title')
+        album_date = form.get('album_date', '')
+        description = form.get('description', '')
         
         # Handle cover image
         cover_image_path = None
-        if 'cover_image' in request.files and request.files['cover_image'].filename:
-            cover_image = request.files['cover_image']
+        if 'cover_image' in files and files['cover_image'].filename:
+            cover_image = files['cover_image']
             if not allowed_file(cover_image.filename):
                 return jsonify({'error': 'Invalid file type'}), 400
             
-            cover_filename = secure_filename(f"album_{album_number}_cover_{cover_image.filename}")
-            cover_path = os.path.join(PHOTO_GALLERY_UPLOAD_FOLDER, cover_filename)
-            cover_image.save(cover_path)
-            cover_image_path = f"/static/photo_gallery/{cover_filename}"
+            cover_image_path = store_media(cover_image)
         elif is_edit:
-            with open(PHOTO_GALLERY_DIR_FILE, 'r') as f:
-                directory = json.load(f)
-                for album in directory['albums']:
-                    if album['album_number'] == album_number:
-                        cover_image_path = album.get('cover_image')
-                        break
-
-        # Handle photos
+            album = find_in_directory(PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number', album_number)
+            if album:
+                cover_image_path = album.get('cover_image')
+
+        # Handle photos. With keep_photos an edit leaves them as stored, they
+        # are edited through /photo_albums/<album_number>/photos instead.
+        keep_photos = is_edit and form.get('keep_photos') == 'true'
         photos = []
         photo_index = 0
-        while f'photo_{photo_index}' in request.files:
-            photo = request.files[f'photo_{photo_index}']
+        while f'photo_{photo_index}' in files and not keep_photos:
+            photo = files[f'photo_{photo_index}']
             if photo and photo.filename:
                 if allowed_file(photo.filename):
-                    photo_filename = secure_filename(f"album_{album_number}_photo_{photo_index}_{photo.filename}")
-                    photo_path = os.path.join(PHOTO_GALLERY_UPLOAD_FOLDER, photo_filename)
-                    photo.save(photo_path)
-                    photos.append(f"/static/photo_gallery/{photo_filename}")
+                    photos.append(store_media(photo))
             photo_index += 1
 
         # Handle existing photos in edit mode
-        if is_edit:
-            existing_photos = request.form.getlist('existing_photos[]')
+        if is_edit and not keep_photos:
+            existing_photos = form.getlist('existing_photos[]')
+            if not all(safe_static_path(photo) for photo in existing_photos):
+                return jsonify({'error': 'Invalid photo path'}), 400
             photos.extend(existing_photos)
 
         album_data = {
@@ -634,6 +1384,9 @@ def upload_photo_album():
             'cover_image': cover_image_path,
             'photos': photos
         }
+        if keep_photos:
+            # Kept under the directory lock, see update_directory_many
+            del album_data['photos']
 
         update_directory(PHOTO_GALLERY_DIR_FILE, 'albums', album_data, 'album_number')
         return jsonify({'success': True, 'message': 'Upload successful'}), 200
@@ -644,49 +1397,1445 @@ def upload_photo_album():
 @app.route("/get_photo_albums", methods=["GET"])
 def get_photo_albums():
     try:
-        with open(PHOTO_GALLERY_DIR_FILE, 'r') as f:
-            directory = json.load(f)
-            
-        # Handle limit parameter
-        limit = request.args.get('limit', type=int)
-        if limit:
-            directory['albums'] = sorted(
-                directory['albums'], 
-                key=lambda x: int(x['album_number']), 
-                reverse=True
-            )[:limit]
-            
-        return jsonify(directory), 200
+        return listing_response(PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route("/get_photo_album/<album_number>", methods=["GET"])
+def get_photo_album(album_number):
+    try:
+        return item_response(PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number', album_number, 'Album not found')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route("/delete_photo_album/<album_number>", methods=["DELETE"])
 def delete_photo_album(album_number):
     try:
-        with open(PHOTO_GALLERY_DIR_FILE, 'r') as f:
-            directory = json.load(f)
-        
-        for i, album in enumerate(directory['albums']):
-            if album['album_number'] == album_number:
-                if album.get('cover_image'):
-                    cover_path = os.path.join(app.root_path, album['cover_image'].lstrip('/'))
-                    if os.path.exists(cover_path):
-                        os.remove(cover_path)
-                
-                for photo in album.get('photos', []):
-                    photo_path = os.path.join(app.root_path, photo.lstrip('/'))
-                    if os.path.exists(photo_path):
-                        os.remove(photo_path)
-                
-                directory['albums'].pop(i)
-                break
-        
-        with open(PHOTO_GALLERY_DIR_FILE, 'w') as f:
-            json.dump(directory, f, indent=2)
-        
+        remove_from_directory(PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number', album_number)
         return jsonify({'message': 'Album deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Album photos can be appended, removed and reordered without resending the
+# album. Each edit is applied to the stored photo list under the gallery's
+# lock, so edits made meanwhile are never lost. With SQLite only the photo
+# rows that change are written, each photo keeping its media entry in its row.
+def edit_album_photos(album_number, edit, write_rows, new_media=None):
+    # edit(photos) returns the album's new photo list, or None when there is
+    # nothing to change. write_rows(conn) stores the edit with SQLite and
+    # returns the images the album gained and lost. Returns the edited
+    # album, or None if there is no such album.
+    with directory_lock(PHOTO_GALLERY_DIR_FILE):
+        album = find_in_directory(PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number', album_number)
+        if not album:
+            return None
+        photos = edit(album.get('photos') or [])
+        if photos is None:
+            return album
+
+        edited = {**album, 'photos': photos}
+        old_version = _directory_entry(PHOTO_GALLERY_DIR_FILE)['version']
+        if use_sqlite():
+            with DIRECTORY_WRITE_DURATION.time(collection_name(PHOTO_GALLERY_DIR_FILE)):
+                gained, lost = write_rows(get_db())
+        else:
+            # directory.json is rewritten whole anyway
+            old_urls = set(image_urls(album))
+            new_urls = set(image_urls(edited))
+            gained, lost = new_urls - old_urls, old_urls - new_urls
+
+        if new_media or (lost and 'media' in album):
+            media = {**album.get('media', {}), **(new_media or {})}
+            for url in lost:
+                media.pop(url, None)
+            edited['media'] = media
+
+        if not use_sqlite():
+            directory = load_directory(PHOTO_GALLERY_DIR_FILE)
+            items = [edited if item['album_number'] == album_number else item for item in directory['albums']]
+            change_log = next_change_log(directory.get(CHANGE_LOG_KEY), [album_number], [])
+            save_directory(PHOTO_GALLERY_DIR_FILE, {**directory, 'albums': items, CHANGE_LOG_KEY: change_log})
+
+        # Only the images the album gained or lost move references; files
+        # nothing refers to any more go with the next collect_garbage
+        update_media_refs([{'photos': sorted(lost)}], [{'photos': sorted(gained)}])
+        notify_directory_change(PHOTO_GALLERY_DIR_FILE, old_version, [edited], [])
+    return edited
+
+def requested_photos():
+    # The photo paths of a JSON {"photos": [...]} body, or None
+    data = request.get_json(silent=True) or {}
+    photos = data.get('photos')
+    if not isinstance(photos, list) or not all(isinstance(photo, str) for photo in photos):
+        return None
+    return photos
+
+@app.route("/photo_albums/<album_number>/photos", methods=["POST"])
+def add_album_photos(album_number):
+    return run_upload(lambda form, files: process_add_album_photos(album_number, files))
+
+def process_add_album_photos(album_number, files):
+    try:
+        if not find_in_directory(PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number', album_number):
+            return jsonify({'error': 'Album not found'}), 404
+
+        uploads = []
+        photo_index = 0
+        while f'photo_{photo_index}' in files:
+            photo = files[f'photo_{photo_index}']
+            if photo and photo.filename:
+                if not allowed_file(photo.filename):
+                    return jsonify({'error': 'Invalid file type'}), 400
+                uploads.append(photo)
+            photo_index += 1
+        if not uploads:
+            return jsonify({'error': 'No photos given'}), 400
+
+        paths = [store_media(photo) for photo in uploads]
+        added = {'album_number': album_number, 'photos': paths}
+        add_image_media(PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number', [added])
+
+        album = edit_album_photos(
+            album_number,
+            lambda photos: [*photos, *paths],
+            lambda conn: sqlite_store.append_photos(conn, album_number, paths, added.get('media')),
+            added.get('media'),
+        )
+        if not album:
+            return jsonify({'error': 'Album not found'}), 404
+        return jsonify({'success': True, 'photos': paths}), 200
+    except Exception as e:
+        app.logger.error(f"Album photos error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route("/photo_albums/<album_number>/photos", methods=["DELETE"])
+def remove_album_photos(album_number):
+    try:
+        paths = requested_photos()
+        if paths is None:
+            return jsonify({'error': 'Missing photos'}), 400
+
+        def edit(photos):
+            # Every occurrence goes; paths no longer in the album are ignored,
+            # so a retried request does no harm
+            remove = set(paths)
+            kept = [photo for photo in photos if photo not in remove]
+            return kept if len(kept) < len(photos) else None
+
+        album = edit_album_photos(
+            album_number, edit, lambda conn: sqlite_store.remove_photos(conn, album_number, paths)
+        )
+        if not album:
+            return jsonify({'error': 'Album not found'}), 404
+        return jsonify({'success': True, 'photos_count': len(album['photos'])}), 200
+    except Exception as e:
+        app.logger.error(f"Album photos error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route("/photo_albums/<album_number>/photos", methods=["PATCH"])
+def reorder_album_photos(album_number):
+    try:
+        paths = requested_photos()
+        if paths is None:
+            return jsonify({'error': 'Missing photos'}), 400
+
+        def edit(photos):
+            # Only a new order of the stored photos is accepted: a list built
+            # before another edit would otherwise undo it
+            if Counter(photos) != Counter(paths):
+                raise ValueError('Album photos changed')
+            return paths if photos != paths else None
+
+        try:
+            album = edit_album_photos(
+                album_number, edit, lambda conn: sqlite_store.reorder_photos(conn, album_number, paths)
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 409
+        if not album:
+            return jsonify({'error': 'Album not found'}), 404
+        return jsonify({'success': True, 'photos_count': len(album['photos'])}), 200
+    except Exception as e:
+        app.logger.error(f"Album photos error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Album downloads are zipped while they are sent: each photo is read in
+# ALBUM_ZIP_READ_SIZE chunks and every chunk goes out as soon as it is
+# written, so memory use doesn't grow with the album
+ALBUM_ZIP_READ_SIZE = 256 * 1024
+
+class ZipStream:
+    # Unseekable file for zipfile to write into; the generator sending the
+    # archive takes what was written after every chunk. zipfile then writes
+    # sizes and CRCs in data descriptors after each entry, and switches to
+    # zip64 records where sizes or offsets need it.
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def album_zip_folder(album):
+    return secure_filename(album.get('title') or '') or f"album-{album['album_number']}"
+
+def album_zip_files(album):
+    # (name in the archive, path, stat) of each photo still on disk, in album order
+    folder = album_zip_folder(album)
+    photos = album.get('photos') or []
+    width = len(str(len(photos)))
+    files = []
+    for position, url in enumerate(photos, 1):
+        # Only files under static/ are sent, whatever the album holds
+        path = safe_static_path(url)
+        if not path:
+            app.logger.error(f"Album {album['album_number']} photo outside static: {url}")
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            app.logger.error(f"Album {album['album_number']} photo missing: {url}")
+            continue
+        ext = os.path.splitext(url)[1].lower()
+        files.append((f'{folder}/{position:0{width}d}{ext}', path, stat))
+    return files
+
+def album_zip_etag(album, files):
+    # Changes with the photo list, their order, the folder name and the
+    # files themselves (their sizes and dates go into the archive)
+    digest = hashlib.sha256()
+    for name, path, stat in files:
+        digest.update(f'{name}\0{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return f"album-{album['album_number']}-{digest.hexdigest()[:32]}"
+
+def album_zip_chunks(files):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as zf:
+        for name, path, stat in files:
+            try:
+                # JPEG and PNG are compressed already, so entries are stored as is
+                info = zipfile.ZipInfo.from_file(path, name)
+                info.compress_type = zipfile.ZIP_STORED
+                with open(path, 'rb') as src, zf.open(info, 'w') as dest:
+                    while True:
+                        chunk = src.read(ALBUM_ZIP_READ_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        yield stream.take()
+            except FileNotFoundError:
+                # Collected since the request started; the entry is left out
+                app.logger.error(f"Album zip error: {path} disappeared")
+            yield stream.take()
+    yield stream.take()
+
+@app.route("/download_photo_album/<album_number>", methods=["GET"])
+def download_photo_album(album_number):
+    try:
+        album = find_in_directory(PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number', album_number)
+        if not album:
+            return jsonify({'error': 'Album not found'}), 404
+
+        files = album_zip_files(album)
+        etag = album_zip_etag(album, files)
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': DIRECTORY_CACHE_CONTROL,
+            'Content-Disposition': f'attachment; filename="{album_zip_folder(album)}.zip"',
+        }
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        return Response(album_zip_chunks(files), status=200, mimetype='application/zip', headers=headers)
+    except Exception as e:
+        app.logger.error(f"Album download error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Every collection: its directory file and key, item number field, upload
+# folder, its plain text fields and whether items carry sections or photos
+COLLECTIONS = {
+    'pac_times': {
+        'dir_file': PAC_TIMES_DIR_FILE, 'key': 'issues', 'number': 'issue_number',
+        'folder': PAC_TIMES_UPLOAD_FOLDER,
+        'fields': ['title', 'issue_date'], 'sections': True,
+    },
+    'pac_events': {
+        'dir_file': PAC_EVENTS_DIR_FILE, 'key': 'events', 'number': 'event_number',
+        'folder': PAC_EVENTS_UPLOAD_FOLDER,
+        'fields': ['title', 'event_date', 'image_gallery_album_id'], 'sections': True,
+    },
+    'reading_circle': {
+        'dir_file': READING_CIRCLE_DIR_FILE, 'key': 'events', 'number': 'event_number',
+        'folder': READING_CIRCLE_UPLOAD_FOLDER,
+        'fields': ['title', 'event_date', 'image_gallery_album_id'], 'sections': True,
+    },
+    'photo_gallery': {
+        'dir_file': PHOTO_GALLERY_DIR_FILE, 'key': 'albums', 'number': 'album_number',
+        'folder': PHOTO_GALLERY_UPLOAD_FOLDER,
+        'fields': ['title', 'album_date', 'description'], 'sections': False,
+    },
+}
+
+DIRECTORY_FILES = [spec['dir_file'] for spec in COLLECTIONS.values()]
+
+def _store_archive_file(zf, name):
+    # Images already on the server are referred to by their normalized URL,
+    # as long as the file exists under static/
+    if not isinstance(name, str):
+        raise ValueError(f'Invalid file name: {name}')
+    if name.startswith('/static/'):
+        path = safe_static_path(name)
+        if not path or not allowed_file(name) or not os.path.isfile(path):
+            raise ValueError(f'Invalid server path: {name}')
+        return '/static/' + os.path.relpath(path, app.static_folder).replace(os.sep, '/')
+    if not allowed_file(name):
+        raise ValueError(f'Invalid file type: {name}')
+    try:
+        info = zf.getinfo(name)
+    except KeyError:
+        raise ValueError(f'File not found in archive: {name}')
+    if info.file_size > app.config['MAX_FILE_SIZE']:
+        raise ValueError(f'File too large: {name}')
+
+    with zf.open(info) as src:
+        return store_media_stream(src, name)
+
+def _build_archive_item(zf, spec, entry):
+    # The entry's shape and number are checked before any of its files is stored
+    if not isinstance(entry, dict):
+        raise ValueError('Item must be an object')
+    if not entry.get(spec['number']) or not entry.get('title'):
+        raise ValueError('Missing required fields')
+
+    item_number = str(entry[spec['number']])
+    try:
+        int(item_number)
+    except ValueError:
+        raise ValueError(f"Invalid {spec['number']}: {item_number}")
+    if spec['sections']:
+        sections = entry.get('sections', [])
+        if not isinstance(sections, list) or not all(isinstance(section, dict) for section in sections):
+            raise ValueError('sections must be a list of objects')
+    else:
+        photos = entry.get('photos', [])
+        if not isinstance(photos, list) or not all(isinstance(photo, str) for photo in photos):
+            raise ValueError('photos must be a list of file names')
+
+    item = {spec['number']: item_number}
+    for field in spec['fields']:
+        item[field] = entry.get(field, '')
+    item['upload_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    item['cover_image'] = None
+    if entry.get('cover_image'):
+        item['cover_image'] = _store_archive_file(zf, entry['cover_image'])
+
+    if spec['sections']:
+        item['sections'] = []
+        for section in entry.get('sections', []):
+            image = section.get('image')
+            if image:
+                image = _store_archive_file(zf, image)
+            item['sections'].append({
+                'heading': section.get('heading', ''),
+                'body': section.get('body', ''),
+                'image': image,
+            })
+    else:
+        item['photos'] = [_store_archive_file(zf, photo) for photo in entry.get('photos', [])]
+    return item
+
+def import_archive(zf):
+    # Imports a zip holding a manifest.json of the form
+    # {"pac_times": [item, ...], "photo_gallery": [...], ...} plus the files
+    # its items refer to. Items are validated and their files stored one by
+    # one, then each collection gets a single directory write.
+    try:
+        manifest = json.loads(zf.read('manifest.json'))
+    except KeyError:
+        raise ValueError('Archive has no manifest.json')
+
+    if not isinstance(manifest, dict):
+        raise ValueError('manifest.json must map collections to lists of items')
+    unknown = set(manifest) - set(COLLECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown collections: {', '.join(sorted(unknown))}")
+    for name, entries in manifest.items():
+        if not isinstance(entries, list):
+            raise ValueError(f'{name} must be a list of items')
+
+    results = []
+    for name, entries in manifest.items():
+        spec = COLLECTIONS[name]
+        items = []
+        for index, entry in enumerate(entries):
+            number = entry.get(spec['number']) if isinstance(entry, dict) else None
+            result = {'collection': name, 'index': index, 'item_number': number}
+            try:
+                items.append(_build_archive_item(zf, spec, entry))
+                result['success'] = True
+            except (ValueError, OSError) as e:
+                result.update(success=False, error=str(e))
+            results.append(result)
+        if items:
+            update_directory_many(spec['dir_file'], spec['key'], items, spec['number'])
+    return results
+
+@app.route("/bulk_import", methods=["POST"])
+def bulk_import():
+    try:
+        # The archive comes as a multipart file or as a finished resumable upload
+        if 'archive_upload_id' in request.form:
+            archive = resumable_upload_files(request.form)['archive']
+            with zipfile.ZipFile(archive.path) as zf:
+                results = import_archive(zf)
+            discard_upload(request.form['archive_upload_id'])
+        elif 'archive' in request.files:
+            with zipfile.ZipFile(request.files['archive']) as zf:
+                results = import_archive(zf)
+        else:
+            return jsonify({'error': 'No archive provided'}), 400
+        return jsonify({
+            'success': all(result['success'] for result in results),
+            'imported': sum(result['success'] for result in results),
+            'results': results,
+        }), 200
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Bulk import error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def changes_since(name, directory, since):
+    # Items written and numbers deleted after version `since`, or every item
+    # (snapshot) when the tombstones the client needs were dropped, or it
+    # has no version or one this log never reached
+    log = directory.get(CHANGE_LOG_KEY) or empty_change_log()
+    if since <= 0 or not change_log_reaches(log, since):
+        items = directory[COLLECTIONS[name]['key']]
+        return {'collection': name, 'version': log['version'], 'snapshot': True, 'upserts': items, 'deleted': []}
+    upserts, deleted = changes_after(name, directory, since)
+    return {'collection': name, 'version': log['version'], 'snapshot': False, 'upserts': upserts, 'deleted': deleted}
+
+def change_log_reaches(log, since):
+    # Whether the log holds every change after version `since`
+    return log['floor'] <= since <= log['version']
+
+def changes_after(name, directory, since):
+    # Items written and numbers deleted after version `since`
+    spec = COLLECTIONS[name]
+    log = directory.get(CHANGE_LOG_KEY) or empty_change_log()
+    upserts = [item for item in directory[spec['key']] if log['items'].get(item[spec['number']], 0) > since]
+    deleted = sorted((number for number, version in log['deleted'].items() if version > since), key=int)
+    return upserts, deleted
+
+@app.route("/changes", methods=["GET"])
+def get_changes():
+    try:
+        name = request.args.get('collection')
+        if name not in COLLECTIONS:
+            return jsonify({'error': 'Unknown collection'}), 400
+        since = request.args.get('since', 0, type=int)
+        dir_file = COLLECTIONS[name]['dir_file']
+        return directory_response(dir_file, ('changes', since), lambda directory: changes_since(name, directory, since))
+    except Exception as e:
+        app.logger.error(f"Changes error: {str(e)}")
+        return jsonify({'error': f'Error loading changes: {str(e)}'}), 500
+
+# Update notifications as Server-Sent Events. Each change is sent as
+#   id: pac_times:12,pac_events:4,...   (versions of every collection)
+#   event: change
+#   data: {"collection": ..., "item_number": ..., "version": ..., "deleted": ...}
+# A client reconnecting with Last-Event-ID is sent what it missed, from the
+# change logs; when those no longer reach back far enough it gets a `reset`
+# event for the collection and should refetch it. Only asgi.py serves the
+# stream, on its event loop, so idle connections cost no thread.
+EVENTS_POLL_INTERVAL = 1.0
+EVENTS_KEEPALIVE = 15
+EVENTS_RETRY_MS = 3000
+# Streams are closed after this long and the browser reconnects (resuming
+# through Last-Event-ID), so no connection outlives a worker restart for long
+EVENTS_MAX_AGE = 5 * 60
+# Proxies must not buffer the stream
+EVENTS_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+def format_event(event, data, versions):
+    event_id = ','.join(f'{name}:{version}' for name, version in versions.items())
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'.encode('utf-8')
+
+def parse_event_id(event_id):
+    versions = {}
+    for part in event_id.split(','):
+        name, _, version = part.partition(':')
+        if name in COLLECTIONS and version.isdigit():
+            versions[name] = int(version)
+    return versions
+
+def current_event_versions():
+    return {
+        name: (load_directory(spec['dir_file']).get(CHANGE_LOG_KEY) or empty_change_log())['version']
+        for name, spec in COLLECTIONS.items()
+    }
+
+def collection_events(name, since, versions):
+    # Frames for the changes of a collection after version `since`, advancing
+    # versions[name] as they go
+    spec = COLLECTIONS[name]
+    directory = load_directory(spec['dir_file'])
+    log = directory.get(CHANGE_LOG_KEY) or empty_change_log()
+    if since == log['version']:
+        return []
+    if not change_log_reaches(log, since):
+        versions[name] = log['version']
+        return [format_event('reset', {'collection': name, 'version': log['version']}, versions)]
+
+    upserts, deleted = changes_after(name, directory, since)
+    events = [(log['items'][item[spec['number']]], item[spec['number']], False) for item in upserts]
+    events.extend((log['deleted'][number], number, True) for number in deleted)
+    events.sort(key=lambda event: event[0])
+    frames = []
+    for i, (version, number, deleted) in enumerate(events):
+        # Items written together share a version; a client cut off halfway
+        # through them resumes from the version before
+        last_of_version = i + 1 == len(events) or events[i + 1][0] != version
+        versions[name] = version if last_of_version else version - 1
+        data = {'collection': name, 'item_number': number, 'version': version, 'deleted': deleted}
+        frames.append(format_event('change', data, versions))
+    versions[name] = log['version']
+    return frames
+
+def event_backlog(last_event_id):
+    # First frames of a connection: what a reconnecting client missed, or for
+    # a new one a `ready` event with the current versions
+    if not last_event_id:
+        versions = current_event_versions()
+        return [format_event('ready', {'versions': versions}, versions)]
+    since = parse_event_id(last_event_id)
+    versions = {name: since.get(name, 0) for name in COLLECTIONS}
+    frames = []
+    for name in COLLECTIONS:
+        frames.extend(collection_events(name, versions[name], versions))
+    return frames
+
+class EventBroker:
+    # Fans change frames out to the /events connections of this process. A
+    # watcher thread compares change log versions, woken at once by local
+    # writes and every EVENTS_POLL_INTERVAL seconds for other workers' writes.
+    # Subscribers are callables taking a frame, called on the watcher thread.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.versions = None
+        self.wake = threading.Event()
+        self.thread = None
+
+    def subscribe(self, deliver):
+        with self.lock:
+            if self.versions is None:
+                self.versions = current_event_versions()
+            self.subscribers.add(deliver)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._watch, name='events', daemon=True)
+                self.thread.start()
+
+    def unsubscribe(self, deliver):
+        with self.lock:
+            self.subscribers.discard(deliver)
+
+    def _watch(self):
+        while True:
+            self.wake.wait(EVENTS_POLL_INTERVAL)
+            self.wake.clear()
+            with self.lock:
+                if not self.subscribers:
+                    # Picked up again from the current versions by the next subscriber
+                    self.versions = None
+                    continue
+                subscribers = list(self.subscribers)
+                versions = self.versions
+            try:
+                frames = []
+                for name in COLLECTIONS:
+                    frames.extend(collection_events(name, versions[name], versions))
+            except Exception as e:
+                app.logger.error(f"Events error: {str(e)}")
+                continue
+            for frame in frames:
+                for deliver in subscribers:
+                    try:
+                        deliver(frame)
+                    except Exception:
+                        # The connection went away without unsubscribing
+                        self.unsubscribe(deliver)
+
+event_broker = EventBroker()
+
+@directory_listener
+def wake_event_broker(dir_file, old_version, new_version, upserted, removed):
+    event_broker.wake.set()
+
+metrics.Gauge('pac_event_subscribers', 'Open /events connections', [], lambda: {
+    (): len(event_broker.subscribers)
+})
+
+@app.route("/events", methods=["GET"])
+def stream_events():
+    # asgi.py serves /events itself. Under a WSGI server every open stream
+    # would hold a worker thread for EVENTS_MAX_AGE, so the stream is refused
+    # with 204 No Content, which tells EventSource not to reconnect; pages
+    # then show what they fetched when they loaded.
+    return Response(status=204, headers=EVENTS_HEADERS)
+
+# The landing page shows the newest items of every collection. Each process
+# keeps a materialized view of them: per collection, the summaries of its
+# HOME_FEED_DEPTH newest items and the directory version they reflect. Local
+# writes update it through a directory listener; a version that moved
+# without us (another worker wrote) gets that collection's part rebuilt.
+HOME_FEED_SIZE = 3
+HOME_FEED_MAX = 10
+# Kept deeper than served, so a delete rarely forces a rebuild
+HOME_FEED_DEPTH = 2 * HOME_FEED_MAX
+_home_feed = {}
+# Serialized feeds by limit, dropped whenever the view changes
+_home_feed_responses = {}
+_home_feed_lock = threading.Lock()
+
+def home_feed_section(name):
+    # Callers hold _home_feed_lock
+    spec = COLLECTIONS[name]
+    section = _home_feed.get(name)
+    if section and section['version'] == _directory_version(spec['dir_file']):
+        return section
+    entry = _directory_entry(spec['dir_file'])
+    items = entry['directory'][spec['key']]
+    newest = heapq.nlargest(HOME_FEED_DEPTH, items, key=lambda x: int(x[spec['number']]))
+    section = {
+        'version': entry['version'],
+        'items': [project_item(item, spec['number'], None, True) for item in newest],
+        # Whether the view holds every item of the collection
+        'complete': len(items) <= HOME_FEED_DEPTH,
+    }
+    _home_feed[name] = section
+    _home_feed_responses.clear()
+    return section
+
+@directory_listener
+def update_home_feed(dir_file, old_version, new_version, upserted, removed):
+    name = collection_name(dir_file)
+    number_key = COLLECTIONS[name]['number']
+    with _home_feed_lock:
+        section = _home_feed.get(name)
+        # A section that missed an earlier write is rebuilt on the next request
+        if not section or section['version'] != old_version:
+            return
+        changed = {item[number_key] for item in [*upserted, *removed]}
+        items = [item for item in section['items'] if item[number_key] not in changed]
+        # Unless the view holds the whole collection, an item older than the
+        # view may have newer ones outside it
+        oldest = None if section['complete'] else int(section['items'][-1][number_key])
+        items.extend(
+            project_item(item, number_key, None, True) for item in upserted
+            if oldest is None or int(item[number_key]) >= oldest
+        )
+        items.sort(key=lambda x: int(x[number_key]), reverse=True)
+        complete = section['complete'] and len(items) <= HOME_FEED_DEPTH
+        if not complete and len(items) < HOME_FEED_MAX:
+            del _home_feed[name]
+        else:
+            _home_feed[name] = {'version': new_version, 'items': items[:HOME_FEED_DEPTH], 'complete': complete}
+        _home_feed_responses.clear()
+
+def home_feed_body(limit):
+    with _home_feed_lock:
+        sections = {name: home_feed_section(name) for name in COLLECTIONS}
+        cached = _home_feed_responses.get(limit)
+        RESPONSE_CACHE.inc('home_feed', 'miss' if cached is None else 'hit')
+        if cached is None:
+            cached = cached_body({name: section['items'][:limit] for name, section in sections.items()})
+            _home_feed_responses[limit] = cached
+        return cached
+
+@app.route("/home_feed", methods=["GET"])
+def get_home_feed():
+    # The `limit` newest summaries of every collection, by collection name
+    try:
+        limit = min(max(request.args.get('limit', HOME_FEED_SIZE, type=int), 1), HOME_FEED_MAX)
+        return cached_response(home_feed_body(limit))
+    except Exception as e:
+        app.logger.error(f"Home feed error: {str(e)}")
+        return jsonify({'error': f'Error loading home feed: {str(e)}'}), 500
+
+# Team rosters, one TeamsData<year>.json per year next to this file. Roster
+# responses hold only what the Teams page shows: no entry numbers, hostels,
+# emails or phone numbers. A member's contact is fetched on its own, when
+# asked for. Photos (under public/, where the frontend serves them) get
+# thumbnails in TEAM_THUMBS_FOLDER, generated once per photo on a background
+# thread (or by the team-thumbnails command); until then a roster shows the
+# original photos.
+TEAMS_DATA_PREFIX = 'TeamsData'
+TEAM_PHOTOS_ROOT = 'public'
+TEAM_THUMBS_FOLDER = 'static/team_thumbs'
+# Team cards are 400px wide
+TEAM_THUMB_WIDTHS = [400, 800]
+# Group titles and the positions they show, in page order
+ROSTER_GROUPS = [
+    ('', ['Faculty President', 'Overall Coordinator']),
+    ('Panel Members', ['Panel Member']),
+    ('CTMs', ['CTM']),
+    ('Coordinators', ['Coordinator']),
+    ('Executives', ['Executive']),
+]
+# Positions whose phone number is given with their email
+PUBLIC_MOBILE_POSITIONS = {'Overall Coordinator', 'CTM'}
+_rosters = {}
+_rosters_lock = threading.Lock()
+_thumbnails_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='team-thumbnails')
+_thumbnails_pending = set()
+_thumbnails_lock = threading.Lock()
+
+def roster_years():
+    # Newest first
+    years = [
+        name[len(TEAMS_DATA_PREFIX):-len('.json')] for name in os.listdir(app.root_path)
+        if name.startswith(TEAMS_DATA_PREFIX) and name.endswith('.json')
+    ]
+    return sorted(years, reverse=True)
+
+def team_photo_url(img, year):
+    # Same rules as the frontend used: year folders are kept, the old shared
+    # /team-photos/ folder and bare file names map to the year's folder
+    if not img or 'team-photos-' in img:
+        return img
+    if img.startswith('/team-photos/'):
+        return img.replace('/team-photos/', f'/team-photos-{year}/', 1)
+    return f'/team-photos-{year}/{img}'
+
+def team_photo_path(url):
+    return os.path.join(app.root_path, TEAM_PHOTOS_ROOT, url.lstrip('/'))
+
+def team_thumbnails_manifest(year):
+    # Path and contents of the year's thumbnails.json, recording what was
+    # generated for each photo
+    manifest_file = static_file_path(f'{TEAM_THUMBS_FOLDER}/{year}/thumbnails.json')
+    try:
+        with open(manifest_file, 'r') as f:
+            return manifest_file, json.load(f)
+    except (OSError, ValueError):
+        return manifest_file, {}
+
+def stale_team_photos(manifest, urls):
+    # (url, mtime) of the photos whose thumbnails are missing or older than
+    # the photo. A photo that could not be read is only tried again once it
+    # changes.
+    stale = []
+    for url in urls:
+        try:
+            mtime = os.stat(team_photo_path(url)).st_mtime_ns
+        except OSError:
+            continue
+        info = manifest.get(url, {})
+        if info.get('source_mtime') != mtime or not (info.get('failed') or images.current_placeholder(info)):
+            stale.append((url, mtime))
+    return stale
+
+def make_team_thumbnails(year, urls):
+    # Generates the thumbnails the year's photos lack in the image pool.
+    # Returns the number of photos processed.
+    folder = f'{TEAM_THUMBS_FOLDER}/{year}'
+    os.makedirs(static_file_path(folder), exist_ok=True)
+    manifest_file, _ = team_thumbnails_manifest(year)
+    # Workers sharing the folder don't generate the same thumbnails twice
+    with directory_lock(manifest_file):
+        _, manifest = team_thumbnails_manifest(year)
+        stale = stale_team_photos(manifest, urls)
+        if not stale:
+            return 0
+        thumbs = [
+            f"{folder}/{secure_filename(os.path.splitext(os.path.basename(url))[0])}-"
+            f"{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}"
+            for url, _ in stale
+        ]
+        results = _get_image_pool().map(
+            images.make_thumbnails,
+            [team_photo_path(url) for url, _ in stale],
+            [static_file_path(thumb) for thumb in thumbs],
+            repeat(TEAM_THUMB_WIDTHS),
+        )
+        for (url, mtime), thumb, info in zip(stale, thumbs, results):
+            if info:
+                manifest[url] = {'source_mtime': mtime, 'thumb': thumb, **info}
+            else:
+                manifest[url] = {'source_mtime': mtime, 'failed': True}
+        write_json_atomic(manifest_file, manifest)
+    return len(stale)
+
+def _run_team_thumbnails(year, urls):
+    try:
+        if make_team_thumbnails(year, urls):
+            # The next request rebuilds the roster with the thumbnails
+            with _rosters_lock:
+                _rosters.pop(year, None)
+    except Exception as e:
+        app.logger.error(f"Team thumbnails error: {str(e)}")
+    finally:
+        with _thumbnails_lock:
+            _thumbnails_pending.discard(year)
+
+def schedule_team_thumbnails(year, urls):
+    with _thumbnails_lock:
+        if year in _thumbnails_pending:
+            return
+        _thumbnails_pending.add(year)
+    _thumbnails_executor.submit(_run_team_thumbnails, year, urls)
+
+def team_thumbnails(year, urls):
+    # {photo url: media info} of the thumbnails already generated for a
+    # year's photos. Missing ones are scheduled, never waited for.
+    if not images.available():
+        return {}
+    _, manifest = team_thumbnails_manifest(year)
+    stale = {url for url, _ in stale_team_photos(manifest, urls)}
+    if stale:
+        schedule_team_thumbnails(year, urls)
+
+    media = {}
+    for url in urls:
+        info = manifest.get(url)
+        if url in stale or not info or info.get('failed'):
+            continue
+        thumb = info['thumb']
+        media[url] = {
+            'src': '/' + images.derivative_path(thumb, info['widths'][-1], 'jpg'),
+            'width': info['width'],
+            'height': info['height'],
+            'srcset': ', '.join(f"/{images.derivative_path(thumb, w, 'jpg')} {w}w" for w in info['widths']),
+            'webp_srcset': ', '.join(f'/{images.derivative_path(thumb, w)} {w}w' for w in info['widths']),
+            'placeholder': info['placeholder'],
+            'color': info['color'],
+        }
+    return media
+
+def load_roster(year):
+    # Parsed roster of a year, rebuilt when its file changes or its
+    # thumbnails were generated. Callers check that the year is one of
+    # roster_years().
+    path = os.path.join(app.root_path, f'{TEAMS_DATA_PREFIX}{year}.json')
+    st = os.stat(path)
+    version = (st.st_mtime_ns, st.st_size)
+    roster = _rosters.get(year)
+    if roster and roster['version'] == version:
+        return roster
+
+    with _rosters_lock:
+        roster = _rosters.get(year)
+        if roster and roster['version'] == version:
+            return roster
+        with open(path, 'r') as f:
+            data = json.load(f)
+        photos = [team_photo_url(member.get('img') or '', year) for member in data]
+        thumbnails = team_thumbnails(year, [photo for photo in photos if photo])
+
+        members = []
+        contacts = []
+        for member_id, (member, photo) in enumerate(zip(data, photos)):
+            position = member.get('Position') or ''
+            contact = {'email': member.get('Email') or ''}
+            if position in PUBLIC_MOBILE_POSITIONS and member.get('Mobile Number'):
+                contact['mobile'] = str(member['Mobile Number'])
+            contacts.append(contact)
+            thumbnail = thumbnails.get(photo)
+            members.append({
+                'id': member_id,
+                'name': member.get('Name') or '',
+                'position': position,
+                'domain': member.get('Domain') or '',
+                'field': member.get('Field') or '',
+                # The photo as the frontend serves it, and its thumbnail here
+                'img': photo,
+                'photo': thumbnail['src'] if thumbnail else None,
+                'media': {thumbnail['src']: {k: v for k, v in thumbnail.items() if k != 'src'}} if thumbnail else {},
+                'has_contact': bool(contact['email']),
+            })
+
+        # Positions without a group of their own get one, after the others
+        groups = [(title, positions) for title, positions in ROSTER_GROUPS]
+        grouped = {position for _, positions in ROSTER_GROUPS for position in positions}
+        for member in members:
+            if member['position'] not in grouped:
+                grouped.add(member['position'])
+                groups.append((member['position'], [member['position']]))
+
+        roster = {'version': version, 'members': members, 'contacts': contacts, 'groups': groups, 'responses': {}}
+        _rosters[year] = roster
+        return roster
+
+def roster_payload(year, roster, positions, domains):
+    members = [
+        member for member in roster['members']
+        if (not positions or member['position'] in positions) and (not domains or member['domain'] in domains)
+    ]
+    groups = []
+    for title, group_positions in roster['groups']:
+        group_members = [member for member in members if member['position'] in group_positions]
+        if group_members:
+            groups.append({'title': title, 'positions': group_positions, 'members': group_members})
+    return {'year': year, 'groups': groups}
+
+@app.route("/teams", methods=["GET"])
+def get_team_years():
+    try:
+        return jsonify({'years': roster_years()}), 200
+    except Exception as e:
+        app.logger.error(f"Teams error: {str(e)}")
+        return jsonify({'error': f'Error listing teams: {str(e)}'}), 500
+
+@app.route("/teams/<year>", methods=["GET"])
+def get_team(year):
+    # Members grouped by position, optionally only some positions or domains
+    # (comma separated)
+    try:
+        if year not in roster_years():
+            return jsonify({'error': 'Team not found'}), 404
+        roster = load_roster(year)
+        positions = tuple(sorted(p for p in request.args.get('position', '').split(',') if p))
+        domains = tuple(sorted(d for d in request.args.get('domain', '').split(',') if d))
+        responses = roster['responses']
+        cached = responses.get((positions, domains))
+        if cached is None:
+            if len(responses) >= MAX_CACHED_RESPONSES:
+                responses.clear()
+            cached = cached_body(roster_payload(year, roster, positions, domains))
+            responses[(positions, domains)] = cached
+        return cached_response(cached)
+    except Exception as e:
+        app.logger.error(f"Teams error: {str(e)}")
+        return jsonify({'error': f'Error loading team: {str(e)}'}), 500
+
+@app.route("/teams/<year>/members/<int:member_id>/contact", methods=["GET"])
+def get_team_member_contact(year, member_id):
+    try:
+        if year not in roster_years():
+            return jsonify({'error': 'Team not found'}), 404
+        contacts = load_roster(year)['contacts']
+        if member_id >= len(contacts) or not contacts[member_id]['email']:
+            return jsonify({'error': 'Contact not found'}), 404
+        return jsonify(contacts[member_id]), 200
+    except Exception as e:
+        app.logger.error(f"Teams error: {str(e)}")
+        return jsonify({'error': f'Error loading contact: {str(e)}'}), 500
+
+# Full-text search over titles, section headings and bodies and album
+# descriptions. Each process keeps its own index, built by the first search.
+# Writes update it item by item through a directory listener; writes made by
+# other processes are found by comparing directory versions and merged in
+# the same way, only re-tokenizing the items whose text changed.
+search_index = search.SearchIndex()
+# Directory version each collection's part of the index reflects
+_search_versions = {}
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+def search_fields(item):
+    fields = [('title', item.get('title') or ''), ('description', item.get('description') or '')]
+    for section in item.get('sections') or []:
+        fields.append(('heading', section.get('heading') or ''))
+        fields.append(('body', section.get('body') or ''))
+    return [field for field in fields if field[1]]
+
+def sync_search_index(name):
+    # Callers hold search_index.lock
+    spec = COLLECTIONS[name]
+    entry = _directory_entry(spec['dir_file'])
+    if _search_versions.get(name) == entry['version']:
+        return
+    items = {item[spec['number']]: item for item in entry['directory'][spec['key']]}
+    for number in search_index.numbers(name) - items.keys():
+        search_index.remove((name, number))
+    for number, item in items.items():
+        search_index.add((name, number), search_fields(item))
+    _search_versions[name] = entry['version']
+
+@directory_listener
+def update_search_index(dir_file, old_version, new_version, upserted, removed):
+    name = collection_name(dir_file)
+    number_key = COLLECTIONS[name]['number']
+    with search_index.lock:
+        # An index that missed an earlier write catches up on the next search
+        if _search_versions.get(name) != old_version:
+            return
+        for item in upserted:
+            search_index.add((name, item[number_key]), search_fields(item))
+        for item in removed:
+            search_index.remove((name, item[number_key]))
+        _search_versions[name] = new_version
+
+def search_result(name, number, score, query):
+    spec = COLLECTIONS[name]
+    item = find_in_directory(spec['dir_file'], spec['key'], spec['number'], number) or {}
+    date_field = next((field for field in spec['fields'] if field.endswith('_date')), None)
+    return {
+        'collection': name,
+        'item_number': number,
+        'title': item.get('title'),
+        'date': item.get(date_field),
+        'cover_image': item.get('cover_image'),
+        'score': round(score, 4),
+        'snippet': search.snippet(search_fields(item), query),
+    }
+
+@app.route("/search", methods=["GET"])
+def search_items():
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Missing search query'}), 400
+        names = request.args.get('collection')
+        names = [name for name in names.split(',') if name] if names else list(COLLECTIONS)
+        unknown = set(names) - set(COLLECTIONS)
+        if unknown:
+            return jsonify({'error': f"Unknown collections: {', '.join(sorted(unknown))}"}), 400
+        limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), MAX_SEARCH_PAGE_SIZE)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+
+        with search_index.lock:
+            for name in names:
+                sync_search_index(name)
+            matches = search_index.search(query, set(names))
+
+        page = matches[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(matches) else None
+        return jsonify({
+            'query': query,
+            'total': len(matches),
+            'results': [search_result(name, number, score, query) for score, (name, number) in page],
+            'next_offset': next_offset,
+        }), 200
+    except Exception as e:
+        app.logger.error(f"Search error: {str(e)}")
+        return jsonify({'error': f'Error searching: {str(e)}'}), 500
+
+# Static export. publish_collection() writes a collection's public read
+# responses as files under PUBLISH_FOLDER, byte for byte what the get_*
+# routes return, each with .gz and .br forms next to it, so a front server
+# can answer reads without Python (see README):
+#   <collection>/v<version>/<variant>.json   listings, one folder per version
+#   <collection>/current -> v<version>
+#   <collection>/items/<number>.json         items, rewritten when they change
+#   home_feed.json
+# With PAC_STATIC_EXPORT=1 every upload and delete republishes its collection
+# on a background thread; `flask --app server publish` does it by hand.
+PUBLISH_FOLDER = 'static/api'
+STATIC_EXPORT = os.environ.get('PAC_STATIC_EXPORT') == '1'
+PUBLISH_KEEP_VERSIONS = 3
+# File name, limit and summary flag of each published listing
+PUBLISH_VARIANTS = [
+    ('full', None, False),
+    ('summary', None, True),
+    ('limit3', 3, False),
+    ('summary.limit3', 3, True),
+]
+
+def write_bytes_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_published(path, body):
+    # The body plus the .gz and .br files nginx's gzip_static and brotli_static look for
+    write_bytes_atomic(path, body)
+    write_bytes_atomic(path + '.gz', _compress(body, 'gzip'))
+    if brotli:
+        write_bytes_atomic(path + '.br', _compress(body, 'br'))
+
+def remove_published(path):
+    for suffix in ('', '.gz', '.br'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def published_version(name):
+    try:
+        return int(os.readlink(static_file_path(f'{PUBLISH_FOLDER}/{name}/current')).lstrip('v'))
+    except (OSError, ValueError):
+        return None
+
+def publish_collection(name, force=False):
+    # Publishes the collection as of now. Returns the version published, or
+    # None if it already was.
+    spec = COLLECTIONS[name]
+    folder = static_file_path(f'{PUBLISH_FOLDER}/{name}')
+    items_folder = os.path.join(folder, 'items')
+    os.makedirs(items_folder, exist_ok=True)
+    with directory_lock(os.path.join(folder, 'publish')):
+        published = published_version(name)
+        # Serialized under the directory lock, so the files all show the same version
+        with directory_lock(spec['dir_file']):
+            directory = load_directory(spec['dir_file'])
+            log = directory.get(CHANGE_LOG_KEY) or empty_change_log()
+            version = log['version']
+            if published == version and not force:
+                return None
+            listings = {
+                file_name: app.json.dumps(
+                    list_items(spec['dir_file'], spec['key'], spec['number'], limit, None, None, summary)
+                ).encode('utf-8')
+                for file_name, limit, summary in PUBLISH_VARIANTS
+            }
+            # Only the items that changed since the last publish, when the change log tells
+            if published is not None and not force and change_log_reaches(log, published):
+                changed, deleted = changes_after(name, directory, published)
+            else:
+                changed = directory[spec['key']]
+                numbers = {item[spec['number']] for item in changed}
+                deleted = [
+                    filename[:-len('.json')] for filename in os.listdir(items_folder)
+                    if filename.endswith('.json') and filename[:-len('.json')] not in numbers
+                ]
+            items = {item[spec['number']]: app.json.dumps(item).encode('utf-8') for item in changed}
+
+        # The version folder is filled before it is renamed into place
+        staging = tempfile.mkdtemp(dir=folder, prefix='.tmp-')
+        for file_name, body in listings.items():
+            write_published(os.path.join(staging, f'{file_name}.json'), body)
+        version_folder = os.path.join(folder, f'v{version}')
+        if os.path.exists(version_folder):
+            shutil.rmtree(version_folder)
+        os.rename(staging, version_folder)
+        for number, body in items.items():
+            write_published(os.path.join(items_folder, f'{number}.json'), body)
+        for number in deleted:
+            remove_published(os.path.join(items_folder, f'{number}.json'))
+
+        link = os.path.join(folder, f'.tmp-current-{uuid.uuid4().hex}')
+        os.symlink(f'v{version}', link)
+        os.replace(link, os.path.join(folder, 'current'))
+
+        # Older versions stay a while for clients that fetched them by version
+        versions = sorted(
+            int(entry.name[1:]) for entry in os.scandir(folder)
+            if entry.is_dir() and entry.name.startswith('v') and entry.name[1:].isdigit()
+        )
+        for old_version in versions[:-PUBLISH_KEEP_VERSIONS]:
+            if old_version != version:
+                shutil.rmtree(os.path.join(folder, f'v{old_version}'), ignore_errors=True)
+    return version
+
+def publish_home_feed():
+    path = static_file_path(f'{PUBLISH_FOLDER}/home_feed.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with directory_lock(path):
+        write_published(path, home_feed_body(HOME_FEED_SIZE)['identity'])
+
+_publish_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='publish')
+_publish_pending = set()
+_publish_lock = threading.Lock()
+
+def _run_publish(name):
+    with _publish_lock:
+        _publish_pending.discard(name)
+    try:
+        publish_collection(name)
+        publish_home_feed()
+    except Exception as e:
+        app.logger.error(f"Publish error: {str(e)}")
+
+@directory_listener
+def schedule_publish(dir_file, old_version, new_version, upserted, removed):
+    # A write made while its collection is waiting to be published is
+    # covered by that publish
+    if not STATIC_EXPORT:
+        return
+    name = collection_name(dir_file)
+    with _publish_lock:
+        if name in _publish_pending:
+            return
+        _publish_pending.add(name)
+    _publish_executor.submit(_run_publish, name)
+
+# Deletes only touch the directories. The collector diffs the directories
+# against the upload folders and the media store, deletes files nothing refers
+# to in batches, and expires old job records and abandoned uploads. It runs on
+# a background thread of the server every GC_INTERVAL seconds, and from
+# `flask --app server gc`.
+def reconcile_media_refs(dry_run=False):
+    # Recounts the references from the directories, repairing MEDIA_REFS_FILE
+    # if it drifted (say after a directory.json was edited by hand). Returns
+    # every URL referred to and the number of counts that were wrong.
+    with ExitStack() as stack:
+        for dir_file in DIRECTORY_FILES:
+            stack.enter_context(directory_lock(dir_file))
+        items = [
+            item for spec in COLLECTIONS.values()
+            for item in load_directory(spec['dir_file'])[spec['key']]
+        ]
+        referenced = {url for item in items for url in image_urls(item)}
+        counts = media_ref_counts(items)
+        with directory_lock(MEDIA_REFS_FILE):
+            refs = load_media_refs()
+            wrong = sum(refs.get(url) != counts.get(url) for url in refs.keys() | counts.keys())
+            if wrong and not dry_run:
+                write_json_atomic(MEDIA_REFS_FILE, dict(counts))
+    return referenced, wrong
+
+def _unreferenced_files(referenced, cutoff):
+    # (path, size) of the files in the upload folders and the media store
+    # that no item refers to, directly or as a derivative, and that were last
+    # modified before cutoff
+    keep = set()
+    for url in referenced:
+        path = static_file_path(url)
+        keep.add(path)
+        keep.update(images.derivative_paths(path))
+
+    paths = []
+    for spec in COLLECTIONS.values():
+        folder = os.path.join(app.root_path, spec['folder'])
+        paths.extend(
+            entry.path for entry in os.scandir(folder)
+            if entry.is_file() and not entry.name.startswith('directory.json')
+        )
+    for root, _, filenames in os.walk(os.path.join(app.root_path, MEDIA_FOLDER)):
+        paths.extend(os.path.join(root, filename) for filename in filenames)
+
+    files = []
+    for path in paths:
+        if path in keep:
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if st.st_mtime < cutoff:
+            files.append((path, st.st_size))
+    return files
+
+def _remove_unreferenced(files, cutoff):
+    # Deletes in batches with a pause in between, so a large sweep doesn't
+    # hog the disk. Each file is checked again under the refs lock, since a
+    # reused blob is touched (see _reuse_media).
+    removed = 0
+    reclaimed = 0
+    for start in range(0, len(files), GC_BATCH_SIZE):
+        if start:
+            time.sleep(GC_BATCH_PAUSE)
+        with directory_lock(MEDIA_REFS_FILE):
+            for path, size in files[start:start + GC_BATCH_SIZE]:
+                try:
+                    if os.stat(path).st_mtime >= cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                reclaimed += size
+    return removed, reclaimed
+
+def _expire_jobs_and_uploads(now, dry_run):
+    jobs = 0
+    for entry in os.scandir(JOBS_FOLDER):
+        if entry.stat().st_mtime < now - JOB_RETENTION:
+            if not dry_run:
+                # Staging folders only outlive their job when a worker died
+                if entry.is_dir():
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.remove(entry.path)
+            jobs += entry.name.endswith('.json')
+
+    uploads = 0
+    for entry in os.scandir(UPLOADS_FOLDER):
+        # The part file changes with every chunk
+        if entry.name.endswith('.part') and entry.stat().st_mtime < now - UPLOAD_RETENTION:
+            if not dry_run:
+                discard_upload(entry.name[:-len('.part')])
+            uploads += 1
+    return jobs, uploads
+
+def collect_garbage(grace=GC_GRACE_PERIOD, dry_run=False):
+    now = time.time()
+    cutoff = now - grace
+    referenced, refs_fixed = reconcile_media_refs(dry_run)
+    files = _unreferenced_files(referenced, cutoff)
+    if dry_run:
+        removed, reclaimed = len(files), sum(size for _, size in files)
+    else:
+        removed, reclaimed = _remove_unreferenced(files, cutoff)
+    jobs, uploads = _expire_jobs_and_uploads(now, dry_run)
+    return {
+        'files': removed,
+        'bytes': reclaimed,
+        'refs_fixed': refs_fixed,
+        'jobs': jobs,
+        'uploads': uploads,
+    }
+
+def _gc_loop():
+    while True:
+        time.sleep(GC_INTERVAL)
+        with open(GC_LOCK_FILE, 'a') as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another worker process is sweeping
+                    continue
+            try:
+                report = collect_garbage()
+                app.logger.info(f"Garbage collection: {report}")
+            except Exception as e:
+                app.logger.error(f"Garbage collection error: {str(e)}")
+
+_gc_thread = None
+_gc_thread_lock = threading.Lock()
+
+@app.before_request
+def start_gc_sweeper():
+    # Started by the first request, so CLI commands don't get one
+    global _gc_thread
+    if _gc_thread is None and GC_INTERVAL > 0:
+        with _gc_thread_lock:
+            if _gc_thread is None:
+                _gc_thread = threading.Thread(target=_gc_loop, name='gc-sweeper', daemon=True)
+                _gc_thread.start()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Routes are labelled by their rule, so /get_pac_times/<issue_number> is one series
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_DURATION.observe(time.perf_counter() - g.request_start, request.method, route)
+        REQUESTS.inc(request.method, route, str(response.status_code))
+    return response
+
+def directory_stats(name):
+    # Item and photo counts, computed once per directory version
+    spec = COLLECTIONS[name]
+    entry = _directory_entry(spec['dir_file'])
+    stats = entry.get('stats')
+    if stats is None:
+        items = entry['directory'][spec['key']]
+        stats = {'items': len(items), 'photos': sum(len(item.get('photos') or []) for item in items)}
+        entry['stats'] = stats
+    return stats
+
+metrics.Gauge('pac_directory_items', 'Items per collection', ['collection'], lambda: {
+    (name,): directory_stats(name)['items'] for name in COLLECTIONS
+})
+metrics.Gauge('pac_directory_photos', 'Album photos per collection', ['collection'], lambda: {
+    (name,): directory_stats(name)['photos'] for name in COLLECTIONS
+})
+metrics.Gauge('pac_directory_file_bytes', 'Size of each directory.json', ['collection'], lambda: {
+    (name,): os.path.getsize(spec['dir_file']) for name, spec in COLLECTIONS.items()
+    if os.path.exists(spec['dir_file'])
+})
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    # Prometheus text format. Values are per worker process.
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('import-sqlite')
+def import_sqlite_command():
+    """Load every directory.json into the SQLite database (replaces its contents)."""
+    for dir_file in DIRECTORY_FILES:
+        with open(dir_file, 'r') as f:
+            directory = json.load(f)
+        count = sqlite_store.import_directory(get_db(), collection_name(dir_file), directory)
+        click.echo(f"{dir_file}: imported {count} items")
+
+@app.cli.command('bulk-import')
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+def bulk_import_command(archive):
+    """Import a zip archive with a manifest.json (same format as /bulk_import)."""
+    with zipfile.ZipFile(archive) as zf:
+        results = import_archive(zf)
+    for result in results:
+        status = 'ok' if result['success'] else f"failed: {result['error']}"
+        click.echo(f"{result['collection']} #{result['item_number']}: {status}")
+    click.echo(f"Imported {sum(result['success'] for result in results)} of {len(results)} items")
+
+def needs_media(item):
+    # Images outside the upload folders never get media
+    media = item.get('media') or {}
+    return any(
+        image_source_path(url) and not images.current_placeholder(media.get(url)) for url in image_urls(item)
+    )
+
+@app.cli.command('backfill-media')
+@click.option('--batch-size', default=50, show_default=True, help='Items per directory write.')
+def backfill_media_command(batch_size):
+    """Generate derivatives, placeholders and colors for images that lack them."""
+    if not images.available():
+        raise click.ClickException('Pillow is not installed')
+    for name, spec in COLLECTIONS.items():
+        items = [item for item in load_directory(spec['dir_file'])[spec['key']] if needs_media(item)]
+        updated = 0
+        for start in range(0, len(items), batch_size):
+            stored = items[start:start + batch_size]
+            # Copies, the cached items are shared
+            batch = [dict(item) for item in stored]
+            add_image_media(spec['dir_file'], spec['key'], spec['number'], batch)
+            # Items whose images all failed again are not rewritten
+            changed = [item for item, old in zip(batch, stored) if item.get('media') != (old.get('media') or {})]
+            if changed:
+                update_directory_many(spec['dir_file'], spec['key'], changed, spec['number'])
+            updated += len(changed)
+        left = sum(needs_media(item) for item in load_directory(spec['dir_file'])[spec['key']])
+        click.echo(f"{name}: updated {updated} items, {left} left with images that could not be read")
+
+@app.cli.command('gc')
+@click.option('--grace', default=GC_GRACE_PERIOD, show_default=True,
+              help='Keep files modified within this many seconds.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+def gc_command(grace, dry_run):
+    """Delete files no item refers to, old job records and abandoned uploads."""
+    report = collect_garbage(grace, dry_run)
+    verb = 'Would remove' if dry_run else 'Removed'
+    click.echo(
+        f"{verb} {report['files']} files ({report['bytes']} bytes), "
+        f"{report['jobs']} job records and {report['uploads']} uploads"
+    )
+    if report['refs_fixed']:
+        click.echo(f"Corrected {report['refs_fixed']} reference counts")
+
+@app.cli.command('publish')
+@click.option('--force', is_flag=True, help='Rewrite every file, even if the version was published.')
+def publish_command(force):
+    """Write the read API responses as static files under static/api."""
+    for name in COLLECTIONS:
+        version = publish_collection(name, force)
+        click.echo(f"{name}: {'already published' if version is None else f'published version {version}'}")
+    publish_home_feed()
+
+@app.cli.command('team-thumbnails')
+def team_thumbnails_command():
+    """Generate the thumbnails of every team photo ahead of the first request."""
+    if not images.available():
+        raise click.ClickException('Pillow is not installed')
+    for year in roster_years():
+        photos = [member['img'] for member in load_roster(year)['members'] if member['img']]
+        make_team_thumbnails(year, photos)
+        with _rosters_lock:
+            _rosters.pop(year, None)
+        members = load_roster(year)['members']
+        click.echo(f"{year}: {sum(bool(member['photo']) for member in members)} of {len(members)} photos")
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,420 @@
+"""SQLite storage engine for the PAC Times, events, reading circle and gallery
+collections. Items are read back in the same shape as directory.json."""
+import json
+import sqlite3
+
+# Per-collection layout: item table, directory key, number field, and the
+# item fields stored in their own columns. Anything else goes to `extra`.
+COLLECTIONS = {
+    'pac_times': {
+        'table': 'issues',
+        'key': 'issues',
+        'number': 'issue_number',
+        'columns': ['title', 'issue_date', 'upload_date', 'cover_image'],
+        'sections': True,
+    },
+    'pac_events': {
+        'table': 'events',
+        'key': 'events',
+        'number': 'event_number',
+        'columns': ['title', 'event_date', 'upload_date', 'cover_image', 'image_gallery_album_id'],
+        'sections': True,
+    },
+    'reading_circle': {
+        'table': 'reading_circle_events',
+        'key': 'events',
+        'number': 'event_number',
+        'columns': ['title', 'event_date', 'upload_date', 'cover_image', 'image_gallery_album_id'],
+        'sections': True,
+    },
+    'photo_gallery': {
+        'table': 'albums',
+        'key': 'albums',
+        'number': 'album_number',
+        'columns': ['title', 'album_date', 'description', 'upload_date', 'cover_image'],
+        'sections': False,
+    },
+}
+
+SECTION_COLUMNS = ['heading', 'body', 'image']
+
+
+def _create_schema(conn):
+    for spec in COLLECTIONS.values():
+        columns = ''.join(f'{column} TEXT, ' for column in spec['columns'])
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {spec['table']} ("
+            f"{spec['number']} TEXT PRIMARY KEY, sort_key INTEGER NOT NULL, {columns}"
+            "has_sections INTEGER NOT NULL DEFAULT 0, extra TEXT)"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {spec['table']}_sort_key ON {spec['table']} (sort_key)"
+        )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sections ("
+        "collection TEXT NOT NULL, item_number TEXT NOT NULL, position INTEGER NOT NULL, "
+        "heading TEXT, body TEXT, image TEXT, extra TEXT, "
+        "PRIMARY KEY (collection, item_number, position))"
+    )
+    # Each photo's entry of its album's media map is kept in its row, so
+    # photo edits don't rewrite the whole map
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS photos ("
+        "album_number TEXT NOT NULL, position INTEGER NOT NULL, path TEXT NOT NULL, media TEXT, "
+        "PRIMARY KEY (album_number, position))"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS photos_path ON photos (path)")
+    if not _has_column(conn, 'photos', 'media'):
+        _move_photo_media(conn)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS collection_versions ("
+        "collection TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+    )
+    # Change log: the version each item was last written or deleted at, and
+    # per collection the newest version whose tombstones were dropped
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS changes ("
+        "collection TEXT NOT NULL, item_number TEXT NOT NULL, version INTEGER NOT NULL, "
+        "deleted INTEGER NOT NULL, PRIMARY KEY (collection, item_number))"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS change_floors ("
+        "collection TEXT PRIMARY KEY, floor INTEGER NOT NULL)"
+    )
+
+
+def _has_column(conn, table, column):
+    return any(row['name'] == column for row in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def _split_album_media(album):
+    # The album's media map without the photos' entries, which are kept in
+    # their rows. The cover's entry stays, even if it is a photo as well.
+    media = album.get('media')
+    if not media:
+        return media
+    photos = set(album.get('photos') or [])
+    return {url: info for url, info in media.items() if url not in photos or url == album.get('cover_image')}
+
+
+def _media_json(media, path):
+    return json.dumps(media[path]) if media and path in media else None
+
+
+def _move_photo_media(conn):
+    # Databases from before the media column kept every photo's entry in its
+    # album's extra
+    spec = COLLECTIONS['photo_gallery']
+    with write_transaction(conn):
+        if _has_column(conn, 'photos', 'media'):
+            return
+        conn.execute('ALTER TABLE photos ADD COLUMN media TEXT')
+        for row in conn.execute(
+            f"SELECT {spec['number']} AS number, cover_image, extra FROM {spec['table']} WHERE extra IS NOT NULL"
+        ).fetchall():
+            extra = json.loads(row['extra'])
+            if not extra.get('media'):
+                continue
+            paths = [photo['path'] for photo in conn.execute(
+                'SELECT path FROM photos WHERE album_number = ?', (row['number'],)
+            )]
+            conn.executemany(
+                'UPDATE photos SET media = ? WHERE album_number = ? AND path = ?',
+                [(_media_json(extra['media'], path), row['number'], path) for path in set(paths)],
+            )
+            extra['media'] = _split_album_media({**extra, 'photos': paths, 'cover_image': row['cover_image']})
+            conn.execute(
+                f"UPDATE {spec['table']} SET extra = ? WHERE {spec['number']} = ?",
+                (json.dumps(extra), row['number']),
+            )
+
+
+def connect(path):
+    # Autocommit mode, transactions are opened explicitly with BEGIN
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers keep going while a writer commits
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    _create_schema(conn)
+    return conn
+
+
+class _transaction:
+    def __init__(self, conn, mode=''):
+        self.conn = conn
+        self.mode = mode
+
+    def __enter__(self):
+        self.conn.execute(f'BEGIN {self.mode}')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+def write_transaction(conn):
+    # IMMEDIATE takes the write lock up front, so concurrent writers queue
+    # instead of failing halfway through with SQLITE_BUSY
+    return _transaction(conn, 'IMMEDIATE')
+
+
+def collection_version(conn, collection):
+    row = conn.execute(
+        'SELECT version FROM collection_versions WHERE collection = ?', (collection,)
+    ).fetchone()
+    return row['version'] if row else 0
+
+
+def _bump_version(conn, collection):
+    conn.execute(
+        'INSERT INTO collection_versions (collection, version) VALUES (?, 1) '
+        'ON CONFLICT(collection) DO UPDATE SET version = version + 1',
+        (collection,),
+    )
+    return collection_version(conn, collection)
+
+
+def _set_floor(conn, collection, floor):
+    conn.execute(
+        'INSERT INTO change_floors (collection, floor) VALUES (?, ?) '
+        'ON CONFLICT(collection) DO UPDATE SET floor = MAX(floor, excluded.floor)',
+        (collection, floor),
+    )
+
+
+def _log_changes(conn, collection, numbers, version, deleted):
+    conn.executemany(
+        'INSERT INTO changes (collection, item_number, version, deleted) VALUES (?, ?, ?, ?) '
+        'ON CONFLICT(collection, item_number) DO UPDATE SET version = excluded.version, deleted = excluded.deleted',
+        [(collection, number, version, int(deleted)) for number in numbers],
+    )
+
+
+def _change_log(conn, collection, version):
+    # Same shape as the change_log of a directory.json
+    row = conn.execute('SELECT floor FROM change_floors WHERE collection = ?', (collection,)).fetchone()
+    log = {'version': version, 'floor': row['floor'] if row else 0, 'items': {}, 'deleted': {}}
+    for row in conn.execute(
+        'SELECT item_number, version, deleted FROM changes WHERE collection = ?', (collection,)
+    ):
+        log['deleted' if row['deleted'] else 'items'][row['item_number']] = row['version']
+    return log
+
+
+def _row_to_item(spec, row, sections, photos, photo_media):
+    item = {spec['number']: row[spec['number']]}
+    for column in spec['columns']:
+        item[column] = row[column]
+    if spec['sections'] and row['has_sections']:
+        item['sections'] = sections.get(row[spec['number']], [])
+    if not spec['sections']:
+        item['photos'] = photos.get(row[spec['number']], [])
+    if row['extra']:
+        item.update(json.loads(row['extra']))
+    if photo_media.get(row[spec['number']]):
+        item['media'] = {**item.get('media', {}), **photo_media[row[spec['number']]]}
+    return item
+
+
+def load_collection(conn, collection):
+    # Returns (version, directory), read from a single snapshot
+    spec = COLLECTIONS[collection]
+    with _transaction(conn):
+        version = collection_version(conn, collection)
+        change_log = _change_log(conn, collection, version)
+        rows = conn.execute(f"SELECT * FROM {spec['table']} ORDER BY sort_key").fetchall()
+
+        sections = {}
+        photos = {}
+        photo_media = {}
+        if spec['sections']:
+            for row in conn.execute(
+                'SELECT * FROM sections WHERE collection = ? ORDER BY item_number, position',
+                (collection,),
+            ):
+                section = {column: row[column] for column in SECTION_COLUMNS}
+                if row['extra']:
+                    section.update(json.loads(row['extra']))
+                sections.setdefault(row['item_number'], []).append(section)
+        else:
+            for row in conn.execute('SELECT * FROM photos ORDER BY album_number, position'):
+                photos.setdefault(row['album_number'], []).append(row['path'])
+                if row['media']:
+                    photo_media.setdefault(row['album_number'], {})[row['path']] = json.loads(row['media'])
+
+    items = [_row_to_item(spec, row, sections, photos, photo_media) for row in rows]
+    return version, {spec['key']: items, 'change_log': change_log}
+
+
+def _extra(data, known):
+    extra = {k: v for k, v in data.items() if k not in known}
+    return json.dumps(extra) if extra else None
+
+
+def _write_item(conn, collection, item):
+    spec = COLLECTIONS[collection]
+    number = item[spec['number']]
+    columns = spec['columns']
+    known = {spec['number'], 'sections', 'photos', *columns}
+    media = item.get('media')
+    if not spec['sections'] and media:
+        item = {**item, 'media': _split_album_media(item)}
+
+    # Keep the first upload date when an item is re-uploaded
+    updates = ', '.join(
+        f'{column} = COALESCE({spec["table"]}.{column}, excluded.{column})'
+        if column == 'upload_date' else f'{column} = excluded.{column}'
+        for column in [*columns, 'sort_key', 'has_sections', 'extra']
+    )
+    conn.execute(
+        f"INSERT INTO {spec['table']} ({spec['number']}, sort_key, {', '.join(columns)}, has_sections, extra) "
+        f"VALUES ({', '.join('?' * (len(columns) + 4))}) "
+        f"ON CONFLICT({spec['number']}) DO UPDATE SET {updates}",
+        (number, int(number), *(item.get(column) for column in columns),
+         int('sections' in item), _extra(item, known)),
+    )
+
+    if spec['sections']:
+        conn.execute(
+            'DELETE FROM sections WHERE collection = ? AND item_number = ?', (collection, number)
+        )
+        conn.executemany(
+            'INSERT INTO sections (collection, item_number, position, heading, body, image, extra) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (collection, number, position,
+                 *(section.get(column) for column in SECTION_COLUMNS),
+                 _extra(section, SECTION_COLUMNS))
+                for position, section in enumerate(item.get('sections') or [])
+            ],
+        )
+    else:
+        conn.execute('DELETE FROM photos WHERE album_number = ?', (number,))
+        conn.executemany(
+            'INSERT INTO photos (album_number, position, path, media) VALUES (?, ?, ?, ?)',
+            [(number, position, path, _media_json(media, path))
+             for position, path in enumerate(item.get('photos') or [])],
+        )
+
+
+def _delete_item(conn, collection, number):
+    spec = COLLECTIONS[collection]
+    cursor = conn.execute(f"DELETE FROM {spec['table']} WHERE {spec['number']} = ?", (number,))
+    if spec['sections']:
+        conn.execute(
+            'DELETE FROM sections WHERE collection = ? AND item_number = ?', (collection, number)
+        )
+    else:
+        conn.execute('DELETE FROM photos WHERE album_number = ?', (number,))
+    return cursor.rowcount > 0
+
+
+def upsert_items(conn, collection, items):
+    spec = COLLECTIONS[collection]
+    with write_transaction(conn):
+        for item in items:
+            _write_item(conn, collection, item)
+        version = _bump_version(conn, collection)
+        _log_changes(conn, collection, [item[spec['number']] for item in items], version, deleted=False)
+
+
+def delete_item(conn, collection, number, max_tombstones):
+    # Keeps the newest max_tombstones tombstones of the collection
+    with write_transaction(conn):
+        deleted = _delete_item(conn, collection, number)
+        if deleted:
+            version = _bump_version(conn, collection)
+            _log_changes(conn, collection, [number], version, deleted=True)
+            dropped = conn.execute(
+                'SELECT item_number, version FROM changes WHERE collection = ? AND deleted = 1 '
+                'ORDER BY version DESC LIMIT -1 OFFSET ?',
+                (collection, max_tombstones),
+            ).fetchall()
+            if dropped:
+                conn.executemany(
+                    'DELETE FROM changes WHERE collection = ? AND item_number = ?',
+                    [(collection, row['item_number']) for row in dropped],
+                )
+                _set_floor(conn, collection, max(row['version'] for row in dropped))
+    return deleted
+
+
+# Album photo edits touch only the photo rows they change. Positions only
+# need to sort, so removals leave gaps and appends go after the last one.
+def _album_urls(conn, number, paths):
+    # (those of paths that are photos of the album, the album's cover)
+    placeholders = ', '.join('?' * len(paths))
+    found = {row['path'] for row in conn.execute(
+        f'SELECT DISTINCT path FROM photos WHERE album_number = ? AND path IN ({placeholders})',
+        (number, *paths),
+    )}
+    row = conn.execute('SELECT cover_image FROM albums WHERE album_number = ?', (number,)).fetchone()
+    return found, row['cover_image'] if row else None
+
+
+def _album_written(conn, number):
+    version = _bump_version(conn, 'photo_gallery')
+    _log_changes(conn, 'photo_gallery', [number], version, deleted=False)
+
+
+def append_photos(conn, number, paths, media):
+    # Appends the paths with their entries of media. Returns the images the
+    # album gained and lost, like the other photo edits.
+    with write_transaction(conn):
+        found, cover = _album_urls(conn, number, paths)
+        row = conn.execute(
+            'SELECT MAX(position) AS last FROM photos WHERE album_number = ?', (number,)
+        ).fetchone()
+        start = -1 if row['last'] is None else row['last']
+        conn.executemany(
+            'INSERT INTO photos (album_number, position, path, media) VALUES (?, ?, ?, ?)',
+            [(number, start + offset, path, _media_json(media, path)) for offset, path in enumerate(paths, 1)],
+        )
+        _album_written(conn, number)
+    return [path for path in dict.fromkeys(paths) if path not in found and path != cover], []
+
+
+def remove_photos(conn, number, paths):
+    # Removes every occurrence of the paths
+    with write_transaction(conn):
+        found, cover = _album_urls(conn, number, paths)
+        conn.executemany(
+            'DELETE FROM photos WHERE album_number = ? AND path = ?', [(number, path) for path in found]
+        )
+        _album_written(conn, number)
+    return [], [path for path in found if path != cover]
+
+
+def reorder_photos(conn, number, paths):
+    # paths is a permutation of the album's photos. The album keeps its
+    # positions and only those now holding another photo are rewritten.
+    with write_transaction(conn):
+        rows = conn.execute(
+            'SELECT position, path, media FROM photos WHERE album_number = ? ORDER BY position', (number,)
+        ).fetchall()
+        media = {row['path']: row['media'] for row in rows}
+        conn.executemany(
+            'UPDATE photos SET path = ?, media = ? WHERE album_number = ? AND position = ?',
+            [(path, media[path], number, row['position']) for row, path in zip(rows, paths) if row['path'] != path],
+        )
+        _album_written(conn, number)
+    return [], []
+
+
+def import_directory(conn, collection, directory):
+    # Replaces the whole collection with the contents of a directory.json
+    spec = COLLECTIONS[collection]
+    items = directory.get(spec['key'], [])
+    with write_transaction(conn):
+        conn.execute(f"DELETE FROM {spec['table']}")
+        if spec['sections']:
+            conn.execute('DELETE FROM sections WHERE collection = ?', (collection,))
+        else:
+            conn.execute('DELETE FROM photos')
+        for item in items:
+            _write_item(conn, collection, item)
+        # Clients synced to any earlier version start over from a snapshot
+        conn.execute('DELETE FROM changes WHERE collection = ?', (collection,))
+        _set_floor(conn, collection, _bump_version(conn, collection))
+    return len(items)
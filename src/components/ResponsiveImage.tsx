@@ -0,0 +1,89 @@
+import { useState } from 'react';
+
+const backend_url = import.meta.env.VITE_BACKEND_URL;
+
+export interface ImageMedia {
+  width: number;
+  height: number;
+  srcset: string;
+  webp_srcset: string;
+  placeholder?: string;
+  color?: string;
+}
+
+interface ResponsiveImageProps {
+  src: string;
+  media?: Record<string, ImageMedia>;
+  sizes?: string;
+  alt: string;
+  className?: string;
+}
+
+// Prefix every candidate URL of a srcset with the backend URL
+const withBackend = (srcset: string) =>
+  srcset.split(', ').map((candidate) => `${backend_url}${candidate}`).join(', ');
+
+// Placeholders are a tiny pixel grid, base64 encoded as its width, height
+// and RGB bytes. Each is drawn on a canvas once and used as a background the
+// browser scales up, smoothed.
+const placeholderUrls = new Map<string, string>();
+
+const placeholderUrl = (placeholder: string) => {
+  // Placeholders from before were data URIs already
+  if (placeholder.startsWith('data:')) {
+    return placeholder;
+  }
+  let url = placeholderUrls.get(placeholder);
+  if (url === undefined) {
+    const bytes = Uint8Array.from(atob(placeholder), (c) => c.charCodeAt(0));
+    const [width, height] = bytes;
+    const pixels = new Uint8ClampedArray(width * height * 4);
+    for (let i = 0; i < width * height; i++) {
+      pixels.set(bytes.subarray(2 + i * 3, 5 + i * 3), i * 4);
+      pixels[i * 4 + 3] = 255;
+    }
+    const canvas = document.createElement('canvas');
+    canvas.width = width;
+    canvas.height = height;
+    canvas.getContext('2d')?.putImageData(new ImageData(pixels, width, height), 0, 0);
+    url = canvas.toDataURL();
+    placeholderUrls.set(placeholder, url);
+  }
+  return url;
+};
+
+export function ResponsiveImage({ src, media, sizes = '100vw', alt, className = '' }: ResponsiveImageProps) {
+  const [loaded, setLoaded] = useState(false);
+  const info = media?.[src];
+
+  // Images uploaded before derivatives were generated only have the original
+  if (!info) {
+    return <img src={`${backend_url}${src}`} alt={alt} className={className} />;
+  }
+
+  // Until the image has loaded, show its dominant color and blurred placeholder
+  const placeholderStyle = loaded ? undefined : {
+    backgroundColor: info.color,
+    backgroundImage: info.placeholder ? `url(${placeholderUrl(info.placeholder)})` : undefined,
+    backgroundSize: 'cover',
+    backgroundPosition: 'center',
+  };
+
+  return (
+    <picture className="contents">
+      <source type="image/webp" srcSet={withBackend(info.webp_srcset)} sizes={sizes} />
+      <img
+        src={`${backend_url}${src}`}
+        srcSet={withBackend(info.srcset)}
+        sizes={sizes}
+        width={info.width}
+        height={info.height}
+        loading="lazy"
+        alt={alt}
+        className={className}
+        style={placeholderStyle}
+        onLoad={() => setLoaded(true)}
+      />
+    </picture>
+  );
+}
@@ -19,24 +19,16 @@ export function Home() {
   useEffect(() => {
     const fetchAllData = async () => {
       try {
-        const [eventsRes, readingRes, timesRes, albumsRes] = await Promise.all([
-          fetch(`${backend_url}/get_pac_events?limit=3`),
-          fetch(`${backend_url}/get_reading_circle?limit=3`),
-          fetch(`${backend_url}/get_pac_times?limit=3`),
-          fetch(`${backend_url}/get_photo_albums?limit=3`)
-        ]);
+        const response = await fetch(`${backend_url}/home_feed?limit=3`);
+        if (!response.ok) {
+          throw new Error('Failed to fetch home feed');
+        }
+        const feed = await response.json();
 
-        const [eventsData, readingData, timesData, albumsData] = await Promise.all([
-          eventsRes.json(),
-          readingRes.json(),
-          timesRes.json(),
-          albumsRes.json()
-        ]);
-
-        setRecentEvents(eventsData.events);
-        setRecentReadingCircles(readingData.events);
-        setRecentPACTimes(timesData.issues);
-        setRecentAlbums(albumsData.albums);
+        setRecentEvents(feed.pac_events);
+        setRecentReadingCircles(feed.reading_circle);
+        setRecentPACTimes(feed.pac_times);
+        setRecentAlbums(feed.photo_gallery);
       } catch (err) {
         setError(err.message);
       } finally {
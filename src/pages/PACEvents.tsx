@@ -2,6 +2,7 @@ import { motion } from 'framer-motion';
 import { CalendarDays } from 'lucide-react';
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { subscribeToChanges } from '../utils/collectionSync';
 
 const backend_url = import.meta.env.VITE_BACKEND_URL;
 
@@ -14,7 +15,7 @@ export function PACEvents() {
   useEffect(() => {
     const fetchEvents = async () => {
       try {
-        const response = await fetch(`${backend_url}/get_pac_events`);
+        const response = await fetch(`${backend_url}/get_pac_events?view=summary`);
         if (!response.ok) {
           throw new Error('Failed to fetch events');
         }
@@ -28,6 +29,7 @@ export function PACEvents() {
     };
 
     fetchEvents();
+    return subscribeToChanges('pac_events', fetchEvents);
   }, []);
 
   const handleViewEvent = (eventNumber) => {
@@ -1,8 +1,9 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { motion } from 'framer-motion';
 import { Upload, Image, X, Plus, Eye, Trash2, ArrowLeft, Edit2 } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 import { compressImage } from '../utils/imageCompression';
+import { createCollectionSync, subscribeToChanges } from '../utils/collectionSync';
 import { ImagePreview } from '../components/ImagePreview';
 
 const backend_url = import.meta.env.VITE_BACKEND_URL;
@@ -43,17 +44,19 @@ export default function PACEventsAdmin() {
 
   useEffect(() => {
     fetchExistingEvents();
+    return subscribeToChanges('pac_events', fetchExistingEvents);
   }, []);
 
   useEffect(() => {
     setSectionQualities(new Array(numSections).fill(80));
   }, [numSections]);
 
+  // Refreshes only fetch what changed since the last sync
+  const eventsSync = useRef(createCollectionSync('pac_events', 'event_number'));
+
   const fetchExistingEvents = async () => {
     try {
-      const response = await fetch(`${backend_url}/get_pac_events`);
-      const data = await response.json();
-      setExistingEvents(data.events);
+      setExistingEvents(await eventsSync.current.sync());
     } catch (error) {
       console.error('Error fetching events:', error);
     }
@@ -38,18 +38,14 @@ export function PACEventsPage() {
   useEffect(() => {
     const fetchEvent = async () => {
       try {
-        const response = await fetch(`${backend_url}/get_pac_events`);
+        const response = await fetch(`${backend_url}/get_pac_event/${eventNumber}`);
+        if (response.status === 404) {
+          throw new Error(`Event #${eventNumber} not found`);
+        }
         if (!response.ok) {
           throw new Error('Failed to fetch PAC Events');
         }
-        const data = await response.json();
-        const foundEvent = data.events.find(
-          (e: Event) => e.event_number === eventNumber
-        );
-        if (!foundEvent) {
-          throw new Error(`Event #${eventNumber} not found`);
-        }
-        setEvent(foundEvent);
+        setEvent(await response.json());
       } catch (err: any) {
         setError(err.message);
       } finally {
@@ -2,6 +2,7 @@ import { motion } from 'framer-motion';
 import { BookOpen } from 'lucide-react';
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { subscribeToChanges } from '../utils/collectionSync';
 
 const backend_url = import.meta.env.VITE_BACKEND_URL;
 
@@ -14,7 +15,7 @@ export function PACReadingCircle() {
   useEffect(() => {
     const fetchEvents = async () => {
       try {
-        const response = await fetch(`${backend_url}/get_reading_circle`);
+        const response = await fetch(`${backend_url}/get_reading_circle?view=summary`);
         if (!response.ok) {
           throw new Error('Failed to fetch reading circle events');
         }
@@ -28,6 +29,7 @@ export function PACReadingCircle() {
     };
 
     fetchEvents();
+    return subscribeToChanges('reading_circle', fetchEvents);
   }, []);
 
   const handleViewEvent = (eventNumber) => {
@@ -2,6 +2,8 @@ import { motion } from 'framer-motion';
 import { BookOpen } from 'lucide-react';
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
+import { ResponsiveImage } from '../components/ResponsiveImage';
+import { subscribeToChanges } from '../utils/collectionSync';
 
 const backend_url = import.meta.env.VITE_BACKEND_URL;
 
@@ -14,7 +16,7 @@ export function PACTimes() {
   useEffect(() => {
     const fetchIssues = async () => {
       try {
-        const response = await fetch(`${backend_url}/get_pac_times`);
+        const response = await fetch(`${backend_url}/get_pac_times?view=summary`);
         if (!response.ok) {
           throw new Error('Failed to fetch issues');
         }
@@ -28,6 +30,7 @@ export function PACTimes() {
     };
 
     fetchIssues();
+    return subscribeToChanges('pac_times', fetchIssues);
   }, []);
 
   const handleReadIssue = (issueNumber) => {
@@ -73,8 +76,10 @@ export function PACTimes() {
               transition={{ delay: index * 0.1 }}
               className="bg-slate-800/50 backdrop-blur-md rounded-lg overflow-hidden"
             >
-              <img
-                src={`${backend_url}${issue.cover_image}`}
+              <ResponsiveImage
+                src={issue.cover_image}
+                media={issue.media}
+                sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                 alt={issue.title}
                 className="w-full h-48 object-cover"
               />
@@ -1,8 +1,9 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { motion } from 'framer-motion';
 import { Upload, Image, X, Plus, Eye, Trash2, ArrowLeft, Edit2 } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 import { compressImage } from '../utils/imageCompression';
+import { createCollectionSync, subscribeToChanges } from '../utils/collectionSync';
 import { ImagePreview } from '../components/ImagePreview';
 
 const backend_url = import.meta.env.VITE_BACKEND_URL;
@@ -42,17 +43,19 @@ export function PACTimesAdmin() {
 
   useEffect(() => {
     fetchExistingIssues();
+    return subscribeToChanges('pac_times', fetchExistingIssues);
   }, []);
 
   useEffect(() => {
     setSectionQualities(new Array(numSections).fill(80));
   }, [numSections]);
 
+  // Refreshes only fetch what changed since the last sync
+  const issuesSync = useRef(createCollectionSync('pac_times', 'issue_number'));
+
   const fetchExistingIssues = async () => {
     try {
-      const response = await fetch(`${backend_url}/get_pac_times`);
-      const data = await response.json();
-      setExistingIssues(data.issues);
+      setExistingIssues(await issuesSync.current.sync());
     } catch (error) {
       console.error('Error fetching issues:', error);
     }
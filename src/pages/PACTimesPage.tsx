@@ -13,18 +13,14 @@ export function PACTimesPage() {
   useEffect(() => {
     const fetchIssue = async () => {
       try {
-        const response = await fetch(`${backend_url}/get_pac_times`);
+        const response = await fetch(`${backend_url}/get_pac_times/${issueNumber}`);
+        if (response.status === 404) {
+          throw new Error('Issue not found');
+        }
         if (!response.ok) {
           throw new Error('Failed to fetch issue');
         }
-        const data = await response.json();
-        const foundIssue = data.issues.find(
-          (i: any) => i.issue_number === issueNumber
-        );
-        if (!foundIssue) {
-          throw new Error('Issue not found');
-        }
-        setIssue(foundIssue);
+        setIssue(await response.json());
       } catch (err: any) {
         setError(err.message);
       } finally {
@@ -2,6 +2,8 @@ import { motion } from 'framer-motion';
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Camera } from 'lucide-react';
+import { ImageMedia, ResponsiveImage } from '../components/ResponsiveImage';
+import { subscribeToChanges } from '../utils/collectionSync';
 
 const backend_url = import.meta.env.VITE_BACKEND_URL;
 
@@ -11,6 +13,7 @@ interface Album {
   album_date: string;
   cover_image: string;
   description: string;
+  media?: Record<string, ImageMedia>;
 }
 
 export function PhotoGallery() {
@@ -22,7 +25,7 @@ export function PhotoGallery() {
   useEffect(() => {
     const fetchAlbums = async () => {
       try {
-        const response = await fetch(`${backend_url}/get_photo_albums`);
+        const response = await fetch(`${backend_url}/get_photo_albums?view=summary`);
         if (!response.ok) {
           throw new Error('Failed to fetch albums');
         }
@@ -36,6 +39,7 @@ export function PhotoGallery() {
     };
 
     fetchAlbums();
+    return subscribeToChanges('photo_gallery', fetchAlbums);
   }, []);
 
   if (loading) {
@@ -78,8 +82,10 @@ export function PhotoGallery() {
               className="bg-slate-800/50 backdrop-blur-md rounded-lg overflow-hidden flex flex-col"
             >
               <div className="h-48 overflow-hidden">
-                <img
-                  src={`${backend_url}${album.cover_image}`}
+                <ResponsiveImage
+                  src={album.cover_image}
+                  media={album.media}
+                  sizes="(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                   alt={album.title}
                   className="w-full h-full object-cover hover:scale-105 transition-transform duration-300"
                 />
@@ -1,8 +1,11 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { motion } from 'framer-motion';
 import { Upload, Image, X, Plus, Eye, Trash2, ArrowLeft, Edit2 } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 import { compressImage } from '../utils/imageCompression';
+import { createCollectionSync, subscribeToChanges } from '../utils/collectionSync';
+import { submitUploadJob } from '../utils/uploadJobs';
+import { uploadResumable } from '../utils/resumableUpload';
 import { ImagePreview } from '../components/ImagePreview';
 
 const backend_url = import.meta.env.VITE_BACKEND_URL;
@@ -35,13 +38,15 @@ export function PhotoGalleryAdmin() {
 
   useEffect(() => {
     fetchExistingAlbums();
+    return subscribeToChanges('photo_gallery', fetchExistingAlbums);
   }, []);
 
+  // Refreshes only fetch what changed since the last sync
+  const albumsSync = useRef(createCollectionSync('photo_gallery', 'album_number'));
+
   const fetchExistingAlbums = async () => {
     try {
-      const response = await fetch(`${backend_url}/get_photo_albums`);
-      const data = await response.json();
-      setExistingAlbums(data.albums);
+      setExistingAlbums(await albumsSync.current.sync());
     } catch (error) {
       console.error('Error fetching albums:', error);
     }
@@ -126,30 +131,40 @@ export function PhotoGalleryAdmin() {
         formData.append('cover_image', coverImage);
       }
 
+      // Each new photo is sent on its own through a resumable upload
+      const photosForm = editingAlbum ? new FormData() : formData;
+      for (const [index, photo] of photos.entries()) {
+        photosForm.append(`photo_${index}_upload_id`, await uploadResumable(photo));
+      }
+
       if (editingAlbum) {
+        // The stored photos are kept; only the ones removed or added here
+        // are sent, so edits made meanwhile elsewhere are not undone
         formData.append('is_edit', 'true');
         formData.append('old_cover_image', editingAlbum.cover_image);
+        formData.append('keep_photos', 'true');
       }
 
-      // Add new photos
-      photos.forEach((photo, index) => {
-        formData.append(`photo_${index}`, photo);
-      });
-
-      // Add existing photos
-      existingPhotos.forEach(photo => {
-        formData.append('existing_photos[]', photo);
-      });
-
-      const response = await fetch(backend_url + '/upload_photo_album', {
-        method: 'POST',
-        body: formData,
-      });
+      // Albums can be large, so they are processed as a background job
+      await submitUploadJob('/upload_photo_album', formData);
 
-      const data = await response.json();
-      
-      if (!response.ok) {
-        throw new Error(data.error || 'Upload failed');
+      if (editingAlbum) {
+        const kept = new Set(existingPhotos);
+        const removed = (editingAlbum.photos || []).filter((photo: string) => !kept.has(photo));
+        if (removed.length > 0) {
+          const response = await fetch(`${backend_url}/photo_albums/${albumNumber}/photos`, {
+            method: 'DELETE',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ photos: removed }),
+          });
+          if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error);
+          }
+        }
+        if (photos.length > 0) {
+          await submitUploadJob(`/photo_albums/${albumNumber}/photos`, photosForm);
+        }
       }
 
       alert('Upload successful!');
@@ -1,6 +1,8 @@
 import { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
 import { motion } from 'framer-motion';
+import { Download } from 'lucide-react';
+import { ImageMedia, ResponsiveImage } from '../components/ResponsiveImage';
 
 const backend_url = import.meta.env.VITE_BACKEND_URL;
 
@@ -10,6 +12,7 @@ interface Album {
   album_date: string;
   description: string;
   photos: string[];
+  media?: Record<string, ImageMedia>;
 }
 
 export function PhotoGalleryAlbum() {
@@ -22,18 +25,14 @@ export function PhotoGalleryAlbum() {
   useEffect(() => {
     const fetchAlbum = async () => {
       try {
-        const response = await fetch(`${backend_url}/get_photo_albums`);
-        if (!response.ok) {
-          throw new Error('Failed to fetch albums');
-        }
-        const data = await response.json();
-        const foundAlbum = data.albums.find(
-          (a: Album) => a.album_number === albumNumber
-        );
-        if (!foundAlbum) {
+        const response = await fetch(`${backend_url}/get_photo_album/${albumNumber}`);
+        if (response.status === 404) {
           throw new Error(`Album #${albumNumber} not found`);
         }
-        setAlbum(foundAlbum);
+        if (!response.ok) {
+          throw new Error('Failed to fetch album');
+        }
+        setAlbum(await response.json());
       } catch (err: any) {
         setError(err.message);
       } finally {
@@ -83,6 +82,15 @@ export function PhotoGalleryAlbum() {
               {album.description && (
                 <p className="text-gray-300 mt-4 max-w-3xl">{album.description}</p>
               )}
+              {album.photos.length > 0 && (
+                <a
+                  href={`${backend_url}/download_photo_album/${album.album_number}`}
+                  className="inline-flex items-center gap-2 mt-4 px-4 py-2 bg-purple-600 hover:bg-purple-700 rounded-lg transition-colors"
+                >
+                  <Download className="w-4 h-4" />
+                  Download album
+                </a>
+              )}
             </div>
           </div>
 
@@ -97,8 +105,10 @@ export function PhotoGalleryAlbum() {
                 className="aspect-square cursor-pointer"
                 onClick={() => setSelectedPhoto(photo)}
               >
-                <img
-                  src={`${backend_url}${photo}`}
+                <ResponsiveImage
+                  src={photo}
+                  media={album.media}
+                  sizes="(min-width: 1024px) 25vw, (min-width: 768px) 33vw, 50vw"
                   alt={`Photo ${index + 1}`}
                   className="w-full h-full object-cover rounded-lg"
                 />
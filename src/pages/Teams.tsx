@@ -1,9 +1,10 @@
-import teamdata2425 from '../../TeamsData2024-25.json'
-import teamdata2526 from '../../TeamsData2025-26.json'
 import { motion, useInView } from 'framer-motion';
 import { Users, BookUser, ChevronDown } from 'lucide-react';
 import { useState, useEffect, useRef } from 'react';
 import { TeamBackground } from '../components/TeamBackground'
+import { ResponsiveImage, ImageMedia } from '../components/ResponsiveImage';
+
+const backend_url = import.meta.env.VITE_BACKEND_URL;
 
 // Custom hook to get number of cards per row based on container width
 function useCardsPerRow() {
@@ -29,32 +30,56 @@ function useCardsPerRow() {
   return { containerRef, cardsPerRow };
 }
 
-function TeamSection({ title, positions, teamData, selectedYear }: { title: string, positions: string | string[], teamData: any[], selectedYear: string }) {
+interface TeamMember {
+  id: number;
+  name: string;
+  position: string;
+  domain: string;
+  field: string;
+  img: string;
+  photo: string | null;
+  media: Record<string, ImageMedia>;
+  has_contact: boolean;
+}
+
+interface TeamGroup {
+  title: string;
+  positions: string[];
+  members: TeamMember[];
+}
+
+interface Contact {
+  email: string;
+  mobile?: string;
+}
+
+function TeamSection({ title, members, selectedYear }: { title: string, members: TeamMember[], selectedYear: string }) {
+  const [contacts, setContacts] = useState<Record<number, Contact>>({});
   const [visibleContacts, setVisibleContacts] = useState<number[]>([]);
   const { containerRef, cardsPerRow } = useCardsPerRow();
 
-  const toggleContact = (index: number) => {
+  // Contacts are only sent when asked for
+  const toggleContact = async (id: number) => {
+    if (!contacts[id]) {
+      try {
+        const response = await fetch(`${backend_url}/teams/${selectedYear}/members/${id}/contact`);
+        if (!response.ok) {
+          throw new Error('Failed to fetch contact');
+        }
+        const contact = await response.json();
+        setContacts(prev => ({ ...prev, [id]: contact }));
+      } catch (err) {
+        console.error(err);
+        return;
+      }
+    }
     setVisibleContacts(prev =>
-      prev.includes(index)
-        ? prev.filter(i => i !== index)
-        : [...prev, index]
+      prev.includes(id)
+        ? prev.filter(i => i !== id)
+        : [...prev, id]
     );
   };
 
-  // Generate image path based on selected year and member img path
-  const getImagePath = (memberImg: string, year: string) => {
-    // If the image path already contains a year-specific folder, use it as is
-    if (memberImg.includes('team-photos-')) {
-      return memberImg;
-    }
-    // If it's using the old /team-photos/ path, replace it with year-specific folder
-    if (memberImg.startsWith('/team-photos/')) {
-      return memberImg.replace('/team-photos/', `/team-photos-${year}/`);
-    }
-    // If it's just a filename, prepend the year-specific folder
-    return `/team-photos-${year}/${memberImg}`;
-  };
-
   return (
     <>
       {title && (
@@ -70,48 +95,54 @@ function TeamSection({ title, positions, teamData, selectedYear }: { title: stri
       )}
       <div className="flex justify-center">
         <div ref={containerRef} className="flex flex-wrap gap-8 justify-center">
-          {teamData.filter((member) =>
-            typeof positions === 'string'
-              ? member.Position === positions
-              : positions.includes(member.Position)
-          ).map((member, index) => {
+          {members.map((member, index) => {
             // Calculate position in current row for stagger effect
             const rowPosition = index % cardsPerRow * 0.1;
 
             return (
               <motion.div
-                key={index}
+                key={member.id}
                 initial={{ opacity: 0, y: 20 }}
                 whileInView={{ opacity: 1, y: 0 }}
                 viewport={{ once: true, amount: 0.3 }}
                 transition={{ duration: 0.8, delay: rowPosition }}
                 className="relative aspect-[3/4] rounded-lg overflow-hidden w-[400px] group hover:bg-slate-800/50 transition-colors"
               >
-                <img
-                  src={getImagePath(member.img, selectedYear)}
-                  alt={member.Name}
-                  className="w-full h-full object-cover"
-                />
+                {member.photo ? (
+                  <ResponsiveImage
+                    src={member.photo}
+                    media={member.media}
+                    sizes="400px"
+                    alt={member.name}
+                    className="w-full h-full object-cover"
+                  />
+                ) : (
+                  <img
+                    src={member.img}
+                    alt={member.name}
+                    className="w-full h-full object-cover"
+                  />
+                )}
                 <div className="absolute bottom-0 left-0 right-0 p-4 bg-gradient-to-t from-black/90 from-10% via-black/65 via-65% to-black/1 pt-2">
                   <div className="flex justify-between items-start">
                     <div>
-                      <h3 className="text-xl font-semibold text-white mb-0.5">{member.Name}</h3>
-                      <p className="text-gray-200 text-sm">{member.Field} {member.Position}</p>
+                      <h3 className="text-xl font-semibold text-white mb-0.5">{member.name}</h3>
+                      <p className="text-gray-200 text-sm">{member.field} {member.position}</p>
                     </div>
-                    {member.Email && (
+                    {member.has_contact && (
                       <button
-                        onClick={() => toggleContact(index)}
+                        onClick={() => toggleContact(member.id)}
                         className="p-2 rounded-full mt-3"
                       >
                         <BookUser className="w-5 h-5 text-zinc-500 hover:text-zinc-100 transition-colors" />
                       </button>
                     )}
                   </div>
-                  <div className={`overflow-hidden transition-all duration-300 ${visibleContacts.includes(index) ? 'max-h-20 mt-2' : 'max-h-0'
+                  <div className={`overflow-hidden transition-all duration-300 ${visibleContacts.includes(member.id) ? 'max-h-20 mt-2' : 'max-h-0'
                     }`}>
-                    <p className="text-gray-300 text-sm">{member.Email}</p>
-                    {['Overall Coordinator', 'CTM'].includes(member.Position) && member['Mobile Number'] && (
-                      <p className="text-gray-300 text-sm">{member['Mobile Number']}</p>
+                    <p className="text-gray-300 text-sm">{contacts[member.id]?.email}</p>
+                    {contacts[member.id]?.mobile && (
+                      <p className="text-gray-300 text-sm">{contacts[member.id].mobile}</p>
                     )}
                   </div>
                 </div>
@@ -125,15 +156,51 @@ function TeamSection({ title, positions, teamData, selectedYear }: { title: stri
 }
 
 export function Teams() {
-  const [selectedYear, setSelectedYear] = useState('2025-26');
+  const [years, setYears] = useState<string[]>([]);
+  const [selectedYear, setSelectedYear] = useState('');
+  const [groups, setGroups] = useState<TeamGroup[]>([]);
   const [isDropdownOpen, setIsDropdownOpen] = useState(false);
 
-  const yearOptions = [
-    { value: '2025-26', label: '2025-26', data: teamdata2526 },
-    { value: '2024-25', label: '2024-25', data: teamdata2425 }
-  ];
+  // The newest year is shown first
+  useEffect(() => {
+    const fetchYears = async () => {
+      try {
+        const response = await fetch(`${backend_url}/teams`);
+        if (!response.ok) {
+          throw new Error('Failed to fetch teams');
+        }
+        const data = await response.json();
+        setYears(data.years);
+        setSelectedYear(data.years[0] || '');
+      } catch (err) {
+        console.error(err);
+      }
+    };
+
+    fetchYears();
+  }, []);
+
+  useEffect(() => {
+    if (!selectedYear) {
+      return;
+    }
+    const fetchTeam = async () => {
+      try {
+        const response = await fetch(`${backend_url}/teams/${selectedYear}`);
+        if (!response.ok) {
+          throw new Error('Failed to fetch team');
+        }
+        const data = await response.json();
+        setGroups(data.groups);
+      } catch (err) {
+        console.error(err);
+      }
+    };
+
+    fetchTeam();
+  }, [selectedYear]);
 
-  const currentTeamData = yearOptions.find(option => option.value === selectedYear)?.data || teamdata2526;
+  const yearOptions = years.map((year) => ({ value: year, label: year }));
 
   return (
     <div className="relative">
@@ -211,15 +278,9 @@ export function Teams() {
             </motion.div>
 
             <div className="space-y-16">
-              <TeamSection positions={['Faculty President', 'Overall Coordinator']} title="" teamData={currentTeamData} selectedYear={selectedYear} />
-              {selectedYear === '2024-25' && (
-                <>
-                  <TeamSection positions="Panel Member" title="Panel Members" teamData={currentTeamData} selectedYear={selectedYear} />
-                  <TeamSection positions="CTM" title="CTMs" teamData={currentTeamData} selectedYear={selectedYear} />
-                </>
-              )}
-              <TeamSection positions="Coordinator" title="Coordinators" teamData={currentTeamData} selectedYear={selectedYear} />
-              <TeamSection positions="Executive" title="Executives" teamData={currentTeamData} selectedYear={selectedYear} />
+              {groups.map((group) => (
+                <TeamSection key={`${selectedYear}-${group.title}`} title={group.title} members={group.members} selectedYear={selectedYear} />
+              ))}
             </div>
           </div>
         </div>
@@ -0,0 +1,47 @@
+const backend_url = import.meta.env.VITE_BACKEND_URL;
+
+// Keeps a local copy of a collection in step with the server through
+// /changes: the first sync gets a snapshot, later ones only the items
+// written and the numbers deleted since the version already held.
+export const createCollectionSync = (collection: string, numberKey: string) => {
+  let version = 0;
+  let items = new Map<string, any>();
+
+  const sync = async (): Promise<any[]> => {
+    const response = await fetch(`${backend_url}/changes?collection=${collection}&since=${version}`);
+    const data = await response.json();
+    if (!response.ok) {
+      throw new Error(data.error || 'Failed to fetch changes');
+    }
+    if (data.snapshot) {
+      items = new Map();
+    }
+    for (const number of data.deleted) {
+      items.delete(number);
+    }
+    for (const item of data.upserts) {
+      items.set(item[numberKey], item);
+    }
+    version = data.version;
+    // Same order as the directory: ascending item number
+    return [...items.values()].sort((a, b) => parseInt(a[numberKey]) - parseInt(b[numberKey]));
+  };
+
+  return { sync };
+};
+
+// Calls onChange whenever an item of the collection is written or deleted
+// on the server, as pushed through /events. Servers without the asgi.py
+// stream answer 204 and the EventSource closes without retrying. Returns a
+// function closing the stream, for useEffect cleanups.
+export const subscribeToChanges = (collection: string, onChange: () => void) => {
+  const source = new EventSource(`${backend_url}/events`);
+  const handle = (event: MessageEvent) => {
+    if (JSON.parse(event.data).collection === collection) {
+      onChange();
+    }
+  };
+  source.addEventListener('change', handle);
+  source.addEventListener('reset', handle);
+  return () => source.close();
+};
@@ -0,0 +1,63 @@
+const backend_url = import.meta.env.VITE_BACKEND_URL;
+
+const CHUNK_SIZE = 2 * 1024 * 1024;
+const MAX_RETRIES = 5;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Asks the server how many bytes of an upload it already has
+const fetchOffset = async (uploadId: string): Promise<number> => {
+  const response = await fetch(`${backend_url}/uploads/${uploadId}`, { method: 'HEAD' });
+  if (!response.ok) {
+    throw new Error('Upload not found');
+  }
+  return Number(response.headers.get('Upload-Offset'));
+};
+
+// Sends a file through /uploads in chunks, resuming from the server's
+// offset after a failed chunk. Resolves with the upload id, which upload
+// forms take as `<field>_upload_id` in place of the file itself.
+export const uploadResumable = async (
+  file: File,
+  onProgress?: (sent: number, total: number) => void
+): Promise<string> => {
+  const response = await fetch(`${backend_url}/uploads`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ filename: file.name, size: file.size }),
+  });
+  const data = await response.json();
+  if (!response.ok) {
+    throw new Error(data.error || 'Upload failed');
+  }
+
+  const uploadId: string = data.upload_id;
+  let offset = 0;
+  let retries = 0;
+  while (offset < file.size) {
+    try {
+      const chunkResponse = await fetch(`${backend_url}/uploads/${uploadId}`, {
+        method: 'PATCH',
+        headers: {
+          'Content-Type': 'application/offset+octet-stream',
+          'Upload-Offset': String(offset),
+        },
+        body: file.slice(offset, offset + CHUNK_SIZE),
+      });
+      if (chunkResponse.status >= 400 && chunkResponse.status !== 409) {
+        const error = await chunkResponse.json();
+        throw new Error(error.error || 'Upload failed');
+      }
+      offset = Number(chunkResponse.headers.get('Upload-Offset'));
+      retries = 0;
+      onProgress?.(offset, file.size);
+    } catch (err) {
+      if (++retries > MAX_RETRIES) {
+        throw err;
+      }
+      await sleep(1000 * retries);
+      offset = await fetchOffset(uploadId);
+    }
+  }
+  return uploadId;
+};
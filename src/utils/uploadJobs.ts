@@ -0,0 +1,37 @@
+const backend_url = import.meta.env.VITE_BACKEND_URL;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Posts an upload as a background job and polls /jobs/<id> until it
+// finishes. Resolves with the upload result, rejects with its error.
+export const submitUploadJob = async (
+  path: string,
+  formData: FormData,
+  onProgress?: (saved: number, total: number) => void
+): Promise<any> => {
+  formData.append('async', 'true');
+  const response = await fetch(backend_url + path, {
+    method: 'POST',
+    body: formData,
+  });
+  const data = await response.json();
+  if (!response.ok) {
+    throw new Error(data.error || 'Upload failed');
+  }
+
+  while (true) {
+    await sleep(1000);
+    const jobResponse = await fetch(`${backend_url}/jobs/${data.job_id}`);
+    const job = await jobResponse.json();
+    if (!jobResponse.ok) {
+      throw new Error(job.error || 'Upload failed');
+    }
+    onProgress?.(job.files_saved, job.files_total);
+    if (job.status === 'done') {
+      return job.result;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.result?.error || job.error || 'Upload failed');
+    }
+  }
+};
@@ -0,0 +1,78 @@
+"""Shared fixtures. server.py creates its folders relative to the working
+directory when it is imported, so the tests import it from a scratch folder
+and resolve URLs against that folder too."""
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='pac-tests-')
+
+os.environ['PAC_GC_INTERVAL'] = '0'
+os.chdir(WORKDIR)
+sys.path.insert(0, ROOT)
+
+import server  # noqa: E402
+
+server.app.root_path = WORKDIR
+
+
+def image(name='photo.jpg', data=b'\xff\xd8not really a jpeg'):
+    return (io.BytesIO(data + name.encode()), name)
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+@pytest.fixture
+def upload_album(client):
+    # Creates an album with the given number of photos, returns it as stored
+    def upload(album_number, photos=2, **fields):
+        data = {'album_number': album_number, 'title': f'Album {album_number}', 'cover_image': image('cover.jpg')}
+        for index in range(photos):
+            data[f'photo_{index}'] = image(f'{album_number}-{index}.jpg')
+        data.update(fields)
+        response = client.post('/upload_photo_album', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        return client.get(f'/get_photo_album/{album_number}').get_json()
+    return upload
+
+
+# Upload, item and delete routes and the number field of each collection
+ROUTES = {
+    'pac_times': ('/upload_pac_times', '/get_pac_times', '/delete_pac_times', 'issue_number'),
+    'pac_events': ('/upload_pac_event', '/get_pac_event', '/delete_pac_event', 'event_number'),
+    'reading_circle': ('/upload_reading_circle', '/get_reading_circle', '/delete_reading_circle', 'event_number'),
+    'photo_gallery': ('/upload_photo_album', '/get_photo_album', '/delete_photo_album', 'album_number'),
+}
+
+
+@pytest.fixture
+def upload_item(client):
+    # Creates or edits an item of any collection, returns it as stored
+    def upload(collection, number, title=None, **fields):
+        upload_route, item_route, _, number_key = ROUTES[collection]
+        data = {number_key: number, 'title': title or f'Item {number}', 'cover_image': image('cover.jpg')}
+        data.update(fields)
+        response = client.post(upload_route, data=data, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        return client.get(f'{item_route}/{number}').get_json()
+    return upload
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def engine(request, tmp_path):
+    # Runs a test against each storage engine, SQLite with a fresh database
+    server.app.config['STORAGE_ENGINE'] = request.param
+    server.app.config['DATABASE'] = str(tmp_path / 'pac.sqlite3')
+    server._db_local.conn = None
+    server._directory_cache.clear()
+    yield request.param
+    server.app.config['STORAGE_ENGINE'] = 'json'
+    server._db_local.conn = None
+    server._directory_cache.clear()
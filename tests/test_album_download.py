@@ -0,0 +1,57 @@
+import io
+import os
+import zipfile
+
+import server
+from conftest import WORKDIR
+
+
+def test_download_zips_photos_in_album_order(client, upload_album):
+    album = upload_album('101', photos=3)
+
+    response = client.get('/download_photo_album/101')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.namelist() == ['Album_101/1.jpg', 'Album_101/2.jpg', 'Album_101/3.jpg']
+    for info, url in zip(archive.infolist(), album['photos']):
+        assert info.compress_type == zipfile.ZIP_STORED
+        with open(server.static_file_path(url), 'rb') as f:
+            assert archive.read(info) == f.read()
+
+
+def test_download_answers_conditional_requests(client, upload_album):
+    upload_album('102')
+    etag = client.get('/download_photo_album/102').headers['ETag']
+
+    assert client.get('/download_photo_album/102', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/download_photo_album/999').status_code == 404
+
+
+def test_existing_photos_outside_static_are_rejected(client, upload_album):
+    upload_album('103')
+
+    response = client.post('/upload_photo_album', data={
+        'album_number': '103', 'title': 'Album 103', 'is_edit': 'true',
+        'existing_photos[]': ['/static/../../../../etc/hostname'],
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert client.get('/get_photo_album/103').get_json()['photos']
+
+
+def test_download_skips_photos_outside_static(client, upload_album):
+    album = upload_album('104', photos=1)
+    secret = os.path.join(WORKDIR, 'secret.txt')
+    with open(secret, 'w') as f:
+        f.write('secret')
+    # Stored before paths were checked
+    server.update_directory(server.PHOTO_GALLERY_DIR_FILE, 'albums', {
+        **album, 'photos': [*album['photos'], '/static/../secret.txt', '/etc/hostname'],
+    }, 'album_number')
+
+    archive = zipfile.ZipFile(io.BytesIO(client.get('/download_photo_album/104').data))
+
+    assert len(archive.namelist()) == 1
+    assert b'secret' not in b''.join(archive.read(name) for name in archive.namelist())
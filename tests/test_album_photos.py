@@ -0,0 +1,167 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+import server
+import sqlite_store
+from conftest import image
+
+
+def real_image(name):
+    Image = pytest.importorskip('PIL.Image')
+    data = io.BytesIO()
+    Image.new('RGB', (40, 30), (200, 30, 30)).save(data, 'PNG' if name.endswith('.png') else 'JPEG')
+    data.seek(0)
+    return (data, name)
+
+
+def get_album(client, album_number):
+    return client.get(f'/get_photo_album/{album_number}').get_json()
+
+
+def refs():
+    return server.load_media_refs()
+
+
+def test_append_adds_photos_after_the_stored_ones(client, upload_album, engine):
+    album = upload_album('201')
+    since = client.get('/changes?collection=photo_gallery&since=0').get_json()['version']
+    before = refs()
+
+    response = client.post('/photo_albums/201/photos', data={
+        'photo_0': image('new-0.jpg'), 'photo_1': image('new-1.jpg'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    added = response.get_json()['photos']
+    assert get_album(client, '201')['photos'] == [*album['photos'], *added]
+    assert all(refs().get(url) == before.get(url, 0) + 1 for url in added)
+    changes = client.get(f'/changes?collection=photo_gallery&since={since}').get_json()
+    assert [item['album_number'] for item in changes['upserts']] == ['201']
+
+
+def test_append_rejects_invalid_files_and_unknown_albums(client, upload_album, engine):
+    upload_album('202')
+
+    invalid = client.post('/photo_albums/202/photos', data={'photo_0': image('x.gif')}, content_type='multipart/form-data')
+    missing = client.post('/photo_albums/999/photos', data={'photo_0': image('x.jpg')}, content_type='multipart/form-data')
+
+    assert invalid.status_code == 400
+    assert missing.status_code == 404
+
+
+def test_remove_drops_photos_and_releases_them(client, upload_album, engine):
+    album = upload_album('203', photos=3)
+    removed = album['photos'][1]
+    before = refs()
+
+    response = client.delete('/photo_albums/203/photos', json={'photos': [removed]})
+
+    assert response.status_code == 200
+    assert get_album(client, '203')['photos'] == [album['photos'][0], album['photos'][2]]
+    assert refs().get(removed, 0) == before[removed] - 1
+    # Retrying is harmless
+    assert client.delete('/photo_albums/203/photos', json={'photos': [removed]}).status_code == 200
+    assert client.delete('/photo_albums/203/photos', json={'paths': []}).status_code == 400
+
+
+def test_reorder_only_accepts_the_stored_photos(client, upload_album, engine):
+    album = upload_album('204', photos=3)
+    order = album['photos'][::-1]
+
+    assert client.patch('/photo_albums/204/photos', json={'photos': order[:-1]}).status_code == 409
+    assert client.patch('/photo_albums/204/photos', json={'photos': order}).status_code == 200
+
+    server._directory_cache.clear()
+    assert get_album(client, '204')['photos'] == order
+
+
+def test_metadata_edit_keeps_photos_edited_meanwhile(client, upload_album, engine):
+    album = upload_album('205')
+    added = client.post('/photo_albums/205/photos', data={'photo_0': image('late.jpg')},
+                        content_type='multipart/form-data').get_json()['photos']
+
+    response = client.post('/upload_photo_album', data={
+        'album_number': '205', 'title': 'Renamed', 'is_edit': 'true', 'keep_photos': 'true',
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    edited = get_album(client, '205')
+    assert edited['title'] == 'Renamed'
+    assert edited['photos'] == [*album['photos'], *added]
+
+
+def test_media_follows_photo_edits(client, engine):
+    client.post('/upload_photo_album', data={
+        'album_number': '206', 'title': 'Media', 'cover_image': real_image('cover.jpg'), 'photo_0': real_image('a.jpg'),
+    }, content_type='multipart/form-data')
+    added = client.post('/photo_albums/206/photos', data={'photo_0': real_image('b.png')},
+                        content_type='multipart/form-data').get_json()['photos']
+    album = get_album(client, '206')
+    if not album.get('media'):
+        pytest.skip('images are not processed without Pillow')
+    assert set(album['media']) == {album['cover_image'], *album['photos']}
+
+    client.delete('/photo_albums/206/photos', json={'photos': added})
+    server._directory_cache.clear()
+
+    album = get_album(client, '206')
+    assert set(album['media']) == {album['cover_image'], *album['photos']}
+
+
+def test_sqlite_photo_edits_only_write_their_rows(client, upload_album, engine):
+    if engine != 'sqlite':
+        pytest.skip('SQLite only')
+    album = upload_album('207', photos=3)
+    statements = []
+    server.get_db().set_trace_callback(statements.append)
+    try:
+        client.post('/photo_albums/207/photos', data={'photo_0': image('one-more.jpg')}, content_type='multipart/form-data')
+        client.delete('/photo_albums/207/photos', json={'photos': [album['photos'][0]]})
+    finally:
+        server.get_db().set_trace_callback(None)
+
+    writes = [statement for statement in statements if statement.lstrip().upper().startswith(('INSERT', 'UPDATE', 'DELETE'))]
+    assert not any('albums' in statement for statement in writes)
+    assert sum('INTO photos' in statement for statement in writes) == 1
+    assert sum('DELETE FROM photos' in statement for statement in writes) == 1
+
+
+def test_sqlite_moves_photo_media_out_of_album_extra(tmp_path):
+    # A database from before photo rows had their own media column
+    path = str(tmp_path / 'old.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.execute(
+        'CREATE TABLE albums (album_number TEXT PRIMARY KEY, sort_key INTEGER NOT NULL, title TEXT, '
+        'album_date TEXT, description TEXT, upload_date TEXT, cover_image TEXT, '
+        'has_sections INTEGER NOT NULL DEFAULT 0, extra TEXT)'
+    )
+    conn.execute(
+        'CREATE TABLE photos (album_number TEXT NOT NULL, position INTEGER NOT NULL, path TEXT NOT NULL, '
+        'PRIMARY KEY (album_number, position))'
+    )
+    media = {'/c.jpg': {'width': 1}, '/p.jpg': {'width': 2}}
+    conn.execute("INSERT INTO albums VALUES ('1', 1, 't', '', '', '', '/c.jpg', 0, ?)", (json.dumps({'media': media}),))
+    conn.execute("INSERT INTO photos VALUES ('1', 0, '/p.jpg')")
+    conn.commit()
+    conn.close()
+
+    conn = sqlite_store.connect(path)
+    _, directory = sqlite_store.load_collection(conn, 'photo_gallery')
+
+    assert directory['albums'][0]['media'] == media
+    assert json.loads(conn.execute('SELECT extra FROM albums').fetchone()['extra']) == {'media': {'/c.jpg': {'width': 1}}}
+    assert json.loads(conn.execute('SELECT media FROM photos').fetchone()['media']) == {'width': 2}
+
+
+def test_summaries_only_carry_the_cover_media(client, engine):
+    client.post('/upload_photo_album', data={
+        'album_number': '208', 'title': 'Summary', 'cover_image': real_image('cover.jpg'), 'photo_0': real_image('a.jpg'),
+    }, content_type='multipart/form-data')
+
+    albums = client.get('/get_photo_albums?view=summary').get_json()['albums']
+
+    album = next(album for album in albums if album['album_number'] == '208')
+    assert list(album['media']) == [album['cover_image']]
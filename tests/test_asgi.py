@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+import asgi
+import server
+
+
+def call(method, path, parts, headers=()):
+    # Sends the body in the given parts, as a chunked request arrives, and
+    # returns (status, headers, body)
+    messages = [
+        {'type': 'http.request', 'body': part, 'more_body': index < len(parts) - 1}
+        for index, part in enumerate(parts)
+    ]
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': b'',
+        'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1),
+        'headers': [(b'transfer-encoding', b'chunked'), *headers],
+    }
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app(scope, receive, send))
+    start = sent[0]
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return start['status'], dict(start['headers']), body
+
+
+def test_chunked_body_reaches_the_handler():
+    body = json.dumps({'filename': 'photo.jpg', 'size': 10}).encode()
+
+    status, _, response = call('POST', '/uploads', [body[:5], body[5:]], [(b'content-type', b'application/json')])
+
+    assert status == 201
+    assert json.loads(response)['offset'] == 0
+
+
+def test_chunked_upload_chunk_is_streamed_to_the_part_file(client):
+    upload_id = client.post('/uploads', json={'filename': 'photo.jpg', 'size': 10}).get_json()['upload_id']
+
+    status, headers, _ = call('PATCH', f'/uploads/{upload_id}', [b'01234', b'567', b'89'], [(b'upload-offset', b'0')])
+
+    assert status == 204
+    assert headers[b'upload-offset'] == b'10'
+    with open(server.upload_part_file(upload_id), 'rb') as f:
+        assert f.read() == b'0123456789'
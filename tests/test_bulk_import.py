@@ -0,0 +1,75 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from conftest import image
+
+
+def archive(manifest, files=()):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as zf:
+        zf.writestr('manifest.json', json.dumps(manifest))
+        for name in files:
+            zf.writestr(name, image(name)[0].read())
+    data.seek(0)
+    return (data, 'archive.zip')
+
+
+def bulk_import(client, manifest, files=()):
+    return client.post('/bulk_import', data={'archive': archive(manifest, files)}, content_type='multipart/form-data')
+
+
+def test_server_paths_are_normalized_and_must_exist(client, upload_album):
+    photo = upload_album('401', photos=1)['photos'][0]
+    folder, name = photo.rsplit('/', 1)
+    albums = [
+        {'album_number': '402', 'title': 'Kept', 'photos': [f'{folder}/./{name}']},
+        {'album_number': '403', 'title': 'Escapes', 'photos': ['/static/../secret.jpg']},
+        {'album_number': '404', 'title': 'Missing', 'photos': [f'{folder}/missing.jpg']},
+    ]
+
+    response = bulk_import(client, {'photo_gallery': albums})
+
+    results = response.get_json()['results']
+    assert [result['success'] for result in results] == [True, False, False]
+    assert all(result['error'].startswith('Invalid server path') for result in results[1:])
+    assert client.get('/get_photo_album/402').get_json()['photos'] == [photo]
+    assert client.get('/get_photo_album/403').status_code == 404
+
+
+def test_bad_items_fail_alone(client):
+    issues = [
+        {'issue_number': '411', 'title': 'Good', 'cover_image': 'cover.jpg'},
+        {'issue_number': '412a', 'title': 'Bad number', 'cover_image': 'cover.jpg'},
+        {'issue_number': '413', 'title': 'Bad sections', 'sections': 'text'},
+        'not an item',
+    ]
+    albums = [{'album_number': '414', 'title': 'Bad photos', 'photos': 'abc.jpg'}]
+
+    response = bulk_import(client, {'pac_times': issues, 'photo_gallery': albums}, ['cover.jpg'])
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['success'] for result in results] == [True, False, False, False, False]
+    assert [result['error'] for result in results[1:]] == [
+        'Invalid issue_number: 412a',
+        'sections must be a list of objects',
+        'Item must be an object',
+        'photos must be a list of file names',
+    ]
+    assert client.get('/get_pac_times/411').status_code == 200
+    assert client.get('/get_photo_album/414').status_code == 404
+
+
+@pytest.mark.parametrize('manifest', [
+    [{'issue_number': '421', 'title': 'In a list'}],
+    {'pac_times': {'issue_number': '421', 'title': 'Not a list'}},
+])
+def test_malformed_manifests_are_rejected(client, manifest):
+    response = bulk_import(client, manifest)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert client.get('/get_pac_times/421').status_code == 404
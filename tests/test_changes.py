@@ -0,0 +1,46 @@
+import server
+
+
+def changes(client, since, collection='pac_events'):
+    response = client.get(f'/changes?collection={collection}&since={since}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_changes_since_a_version(client, upload_item, engine):
+    upload_item('pac_events', '791')
+    upload_item('pac_events', '792')
+    version = changes(client, 0)['version']
+
+    upload_item('pac_events', '792', 'Edited', is_edit='true')
+    upload_item('pac_events', '793')
+    client.delete('/delete_pac_event/791')
+
+    delta = changes(client, version)
+    assert delta['snapshot'] is False
+    assert delta['version'] == version + 3
+    assert [(item['event_number'], item['title']) for item in delta['upserts']] == [('792', 'Edited'), ('793', 'Item 793')]
+    assert delta['deleted'] == ['791']
+    assert changes(client, delta['version'])['upserts'] == []
+
+
+def test_snapshot_when_the_floor_passed_the_version(client, upload_item, engine, monkeypatch):
+    monkeypatch.setattr(server, 'CHANGE_LOG_TOMBSTONES', 1)
+    for number in ('794', '795', '796'):
+        upload_item('pac_events', number)
+    version = changes(client, 0)['version']
+    for number in ('794', '795'):
+        client.delete(f'/delete_pac_event/{number}')
+
+    delta = changes(client, version)
+
+    assert delta['snapshot'] is True
+    numbers = [item['event_number'] for item in delta['upserts']]
+    assert '796' in numbers and '794' not in numbers and '795' not in numbers
+    assert delta['deleted'] == []
+    # Versions the server never reached also get a snapshot
+    assert changes(client, delta['version'] + 10)['snapshot'] is True
+
+
+def test_unknown_collections_are_rejected(client):
+    assert client.get('/changes?collection=nope').status_code == 400
@@ -0,0 +1,64 @@
+import multiprocessing
+import threading
+
+import pytest
+
+import server
+
+WRITERS = 4
+ITEMS_PER_WRITER = 10
+
+
+def write_issues(first):
+    for number in range(first, first + ITEMS_PER_WRITER):
+        server.update_directory(server.PAC_TIMES_DIR_FILE, 'issues', {
+            'issue_number': str(number), 'title': f'Issue {number}', 'issue_date': '',
+            'upload_date': '2024-01-01 00:00:00', 'cover_image': None, 'sections': [],
+        }, 'issue_number')
+
+
+def write_issues_in_child(first):
+    # A forked process must not share its parent's SQLite connection
+    server._db_local.conn = None
+    write_issues(first)
+
+
+def stored_numbers(start, end):
+    server._directory_cache.clear()
+    numbers = {issue['issue_number'] for issue in server.load_directory(server.PAC_TIMES_DIR_FILE)['issues']}
+    return {str(number) for number in range(start, end)} - numbers
+
+
+def pac_times_version():
+    return server.current_event_versions()['pac_times']
+
+
+def test_threads_keep_every_item(engine):
+    version = pac_times_version()
+    threads = [threading.Thread(target=write_issues, args=(2000 + i * ITEMS_PER_WRITER,)) for i in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stored_numbers(2000, 2000 + WRITERS * ITEMS_PER_WRITER) == set()
+    # Every write got its own change log version
+    assert pac_times_version() == version + WRITERS * ITEMS_PER_WRITER
+
+
+def test_processes_keep_every_item(engine):
+    if not server.fcntl or 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip('needs fcntl and fork')
+    version = pac_times_version()
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=write_issues_in_child, args=(2100 + i * ITEMS_PER_WRITER,)) for i in range(WRITERS)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+
+    assert [process.exitcode for process in processes] == [0] * WRITERS
+    assert stored_numbers(2100, 2100 + WRITERS * ITEMS_PER_WRITER) == set()
+    assert pac_times_version() == version + WRITERS * ITEMS_PER_WRITER
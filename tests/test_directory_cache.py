@@ -0,0 +1,40 @@
+import json
+import os
+
+import server
+
+
+def test_reads_are_served_from_the_cache(client, upload_item, monkeypatch):
+    upload_item('pac_times', '701')
+    client.get('/get_pac_times')
+    reads = []
+    read_directory = server._read_directory
+    monkeypatch.setattr(server, '_read_directory', lambda dir_file: reads.append(dir_file) or read_directory(dir_file))
+
+    for _ in range(3):
+        assert client.get('/get_pac_times').status_code == 200
+        assert client.get('/get_pac_times/701').status_code == 200
+
+    assert reads == []
+
+
+def test_external_rewrite_is_picked_up(client, upload_item):
+    upload_item('pac_times', '702', 'Cached')
+    assert client.get('/get_pac_times/702').get_json()['title'] == 'Cached'
+
+    # Edited in place by hand, the inode stays the same
+    path = server.PAC_TIMES_DIR_FILE
+    with open(path, 'r') as f:
+        directory = json.load(f)
+    for issue in directory['issues']:
+        if issue['issue_number'] == '702':
+            issue['title'] = 'Edited'
+    st = os.stat(path)
+    with open(path, 'w') as f:
+        json.dump(directory, f, indent=2)
+    # Coarse file system clocks could otherwise leave the mtime unchanged
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    assert client.get('/get_pac_times/702').get_json()['title'] == 'Edited'
+    listing = client.get('/get_pac_times').get_json()
+    assert next(issue for issue in listing['issues'] if issue['issue_number'] == '702')['title'] == 'Edited'
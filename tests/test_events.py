@@ -0,0 +1,81 @@
+import json
+import time
+
+import server
+
+
+def frames(backlog):
+    # (event, data) of each frame
+    parsed = []
+    for frame in backlog:
+        fields = dict(line.split(': ', 1) for line in frame.decode('utf-8').strip().split('\n'))
+        parsed.append((fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+def event_id(backlog):
+    return backlog[-1].decode('utf-8').split('\n', 1)[0][len('id: '):]
+
+
+def test_wsgi_servers_refuse_the_stream(client):
+    response = client.get('/events')
+
+    assert response.status_code == 204
+    assert not response.data
+
+
+def test_new_clients_get_the_current_versions(client, upload_item, engine):
+    upload_item('pac_times', '601')
+
+    [(event, data)] = frames(server.event_backlog(''))
+
+    assert event == 'ready'
+    assert data['versions'] == server.current_event_versions()
+
+
+def test_reconnecting_clients_get_what_they_missed(client, upload_item, engine):
+    upload_item('pac_times', '602')
+    last_event_id = event_id(server.event_backlog(''))
+    upload_item('pac_times', '603')
+    upload_item('pac_events', '604')
+    client.delete('/delete_pac_times/602')
+
+    backlog = server.event_backlog(last_event_id)
+
+    assert [(event, data['collection'], data['item_number'], data['deleted']) for event, data in frames(backlog)] == [
+        ('change', 'pac_times', '603', False),
+        ('change', 'pac_times', '602', True),
+        ('change', 'pac_events', '604', False),
+    ]
+    # Nothing is left to send from the last id
+    assert server.event_backlog(event_id(backlog)) == []
+
+
+def test_clients_past_the_floor_get_a_reset(client, upload_item, engine, monkeypatch):
+    monkeypatch.setattr(server, 'CHANGE_LOG_TOMBSTONES', 1)
+    for number in ('605', '606', '607'):
+        upload_item('pac_times', number)
+    last_event_id = event_id(server.event_backlog(''))
+    for number in ('605', '606', '607'):
+        client.delete(f'/delete_pac_times/{number}')
+
+    [(event, data)] = frames(server.event_backlog(last_event_id))
+
+    assert event == 'reset'
+    assert data == {'collection': 'pac_times', 'version': server.current_event_versions()['pac_times']}
+
+
+def test_broker_pushes_local_writes(client, upload_item):
+    received = []
+    server.event_broker.subscribe(received.append)
+    try:
+        upload_item('reading_circle', '608')
+        deadline = time.monotonic() + 5
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        server.event_broker.unsubscribe(received.append)
+
+    assert [(event, data['collection'], data['item_number']) for event, data in frames(received)] == [
+        ('change', 'reading_circle', '608'),
+    ]
@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+import pytest
+
+import server
+
+HOUR = 60 * 60
+
+
+def media_file(name, age=0):
+    path = os.path.join(server.MEDIA_FOLDER, 'gc', name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(name.encode())
+    when = time.time() - age
+    os.utime(path, (when, when))
+    return path
+
+
+@pytest.fixture
+def files(upload_item):
+    # An old and a new file nothing refers to, and an old one an item uses
+    item = upload_item('pac_times', '761')
+    referenced = server.static_file_path(item['cover_image'])
+    when = time.time() - 2 * HOUR
+    os.utime(referenced, (when, when))
+    return media_file('old.jpg', 2 * HOUR), media_file('new.jpg'), referenced
+
+
+def test_dry_run_only_reports(files):
+    old, new, referenced = files
+
+    report = server.collect_garbage(dry_run=True)
+
+    assert report['files'] >= 1
+    assert report['bytes'] >= os.path.getsize(old)
+    assert all(os.path.exists(path) for path in files)
+
+
+def test_unreferenced_files_past_the_grace_period_are_removed(files):
+    old, new, referenced = files
+
+    report = server.collect_garbage()
+
+    assert report['files'] >= 1
+    assert not os.path.exists(old)
+    # Still within the grace period, it may belong to an upload in progress
+    assert os.path.exists(new)
+    assert os.path.exists(referenced)
+
+
+def test_grace_period_is_configurable(files):
+    _, new, _ = files
+
+    result = server.app.test_cli_runner().invoke(args=['gc', '--grace', '0', '--dry-run'])
+
+    assert result.output.startswith('Would remove ')
+    assert os.path.exists(new)
+    report = server.collect_garbage(grace=0, dry_run=True)
+    assert report['files'] >= 2
+
+
+def test_drifted_reference_counts_are_repaired(upload_item):
+    url = upload_item('pac_times', '762')['cover_image']
+    refs = server.load_media_refs()
+    server.write_json_atomic(server.MEDIA_REFS_FILE, {**refs, url: refs[url] + 5})
+
+    assert server.collect_garbage(dry_run=True)['refs_fixed'] >= 1
+    assert server.load_media_refs()[url] == refs[url] + 5
+
+    server.collect_garbage()
+
+    with open(server.MEDIA_REFS_FILE) as f:
+        assert json.load(f)[url] < refs[url] + 5
+    assert server.collect_garbage(dry_run=True)['refs_fixed'] == 0
@@ -0,0 +1,35 @@
+import server
+
+
+def feed_numbers(client, limit=3):
+    feed = client.get(f'/home_feed?limit={limit}').get_json()
+    return [event['event_number'] for event in feed['reading_circle']]
+
+
+def test_feed_shows_the_newest_summaries(client, upload_item, engine):
+    # Newer than anything else the tests upload to reading_circle
+    for number in ('9101', '9102', '9103', '9104'):
+        upload_item('reading_circle', number, section_0_heading='Heading', section_0_body='Body')
+
+    feed = client.get('/home_feed').get_json()
+
+    assert set(feed) == set(server.COLLECTIONS)
+    assert [event['event_number'] for event in feed['reading_circle']] == ['9104', '9103', '9102']
+    assert all('sections' not in event for event in feed['reading_circle'])
+    assert feed_numbers(client, limit=1) == ['9104']
+
+
+def test_feed_follows_deletes_and_edits(client, upload_item, engine):
+    for number in ('9101', '9102', '9103', '9104'):
+        upload_item('reading_circle', number)
+    assert feed_numbers(client) == ['9104', '9103', '9102']
+
+    client.delete('/delete_reading_circle/9104')
+    upload_item('reading_circle', '9102', 'Renamed', is_edit='true')
+
+    # Updated by the writes, not rebuilt from the directory
+    section = server._home_feed['reading_circle']
+    assert section['version'] == server._directory_version(server.READING_CIRCLE_DIR_FILE)
+    assert feed_numbers(client) == ['9103', '9102', '9101']
+    feed = client.get('/home_feed').get_json()
+    assert feed['reading_circle'][1]['title'] == 'Renamed'
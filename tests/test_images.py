@@ -0,0 +1,78 @@
+import base64
+import io
+import os
+
+import pytest
+
+import images
+import server
+from conftest import WORKDIR
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def test_placeholder_is_a_tiny_rgb_grid():
+    image = Image.new('RGB', (400, 300), (10, 120, 230))
+
+    described = images.describe(image)
+
+    grid = base64.b64decode(described['placeholder'])
+    width, height = grid[0], grid[1]
+    assert (width, height) == (5, 4)
+    assert len(grid) == 2 + width * height * 3
+    assert tuple(grid[2:5]) == (10, 120, 230)
+    assert len(described['placeholder']) < 100
+    assert described['color'] == '#0a78e6'
+
+
+def test_data_uri_placeholders_are_not_current():
+    assert images.current_placeholder(images.describe(Image.new('RGB', (8, 8))))
+    assert not images.current_placeholder({'placeholder': 'data:image/jpeg;base64,AAAA'})
+    assert not images.current_placeholder({})
+
+
+def test_derivatives_are_only_made_under_upload_folders(client, upload_album):
+    album = upload_album('301', photos=0)
+    outside = os.path.join(WORKDIR, 'static', 'other')
+    os.makedirs(outside, exist_ok=True)
+    Image.new('RGB', (800, 600)).save(os.path.join(outside, 'x.jpg'))
+    Image.new('RGB', (800, 600)).save(os.path.join(WORKDIR, 'y.jpg'))
+
+    item = {**album, 'photos': ['/static/other/x.jpg', '/static/../y.jpg']}
+    server.add_image_media(server.PHOTO_GALLERY_DIR_FILE, 'albums', 'album_number', [item])
+
+    assert not set(item['photos']) & set(item['media'])
+    assert os.listdir(outside) == ['x.jpg']
+    assert not os.path.exists(os.path.join(WORKDIR, 'y.webp'))
+
+
+def gallery_version():
+    return server.current_event_versions()['photo_gallery']
+
+
+def test_backfill_only_writes_items_whose_media_changed(client, upload_album):
+    runner = server.app.test_cli_runner()
+    # Fake JPEG bytes: their derivatives fail on every run
+    upload_album('302', photos=1)
+    real = io.BytesIO()
+    Image.new('RGB', (800, 600), (200, 30, 30)).save(real, 'JPEG')
+    real.seek(0)
+    client.post('/upload_photo_album', data={
+        'album_number': '303', 'title': 'Real', 'cover_image': (real, 'cover.jpg'),
+    }, content_type='multipart/form-data')
+    # Media lost, say by a hand edit of directory.json
+    with server.directory_lock(server.PHOTO_GALLERY_DIR_FILE):
+        directory = server.load_directory(server.PHOTO_GALLERY_DIR_FILE)
+        albums = [{**album, 'media': {}} if album['album_number'] == '303' else album for album in directory['albums']]
+        server.save_directory(server.PHOTO_GALLERY_DIR_FILE, {**directory, 'albums': albums})
+    version = gallery_version()
+
+    runner.invoke(args=['backfill-media'])
+
+    assert gallery_version() == version + 1
+    album = client.get('/get_photo_album/303').get_json()
+    assert images.current_placeholder(album['media'][album['cover_image']])
+
+    runner.invoke(args=['backfill-media'])
+
+    assert gallery_version() == version + 1
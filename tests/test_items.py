@@ -0,0 +1,52 @@
+import pytest
+
+import server
+from conftest import ROUTES
+
+
+@pytest.mark.parametrize('collection', list(ROUTES))
+def test_items_are_served_by_number(client, upload_item, engine, collection):
+    _, item_route, delete_route, number_key = ROUTES[collection]
+    upload_item(collection, '501', 'First')
+    upload_item(collection, '502', 'Second')
+
+    response = client.get(f'{item_route}/502')
+
+    assert response.status_code == 200
+    assert response.get_json()[number_key] == '502'
+    assert response.get_json()['title'] == 'Second'
+    assert client.get(f'{item_route}/999').status_code == 404
+
+    client.delete(f'{delete_route}/502')
+    assert client.get(f'{item_route}/502').status_code == 404
+
+
+@pytest.mark.parametrize('collection', list(ROUTES))
+def test_item_lookup_after_an_update(client, upload_item, engine, collection):
+    _, item_route, _, _ = ROUTES[collection]
+    upload_item(collection, '503', 'Before')
+    before = client.get(f'{item_route}/503')
+
+    upload_item(collection, '503', 'After', is_edit='true')
+    after = client.get(f'{item_route}/503')
+
+    assert after.get_json()['title'] == 'After'
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert client.get(f'{item_route}/503', headers={'If-None-Match': before.headers['ETag']}).status_code == 200
+
+
+def test_write_during_a_lookup_is_not_cached_under_its_version(client, upload_item, engine, monkeypatch):
+    upload_item('pac_times', '504', 'Before')
+    directory_response = server.directory_response
+
+    def write_first(*args, **kwargs):
+        # Another request writes between the lookup and the response
+        monkeypatch.setattr(server, 'directory_response', directory_response)
+        client.post('/upload_pac_times', data={'issue_number': '504', 'title': 'After', 'is_edit': 'true'},
+                    content_type='multipart/form-data')
+        return directory_response(*args, **kwargs)
+
+    monkeypatch.setattr(server, 'directory_response', write_first)
+    client.get('/get_pac_times/504')
+
+    assert client.get('/get_pac_times/504').get_json()['title'] == 'After'
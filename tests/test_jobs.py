@@ -0,0 +1,59 @@
+import threading
+import time
+
+import server
+from conftest import image
+
+
+def wait_for_job(client, job_id, statuses=('done', 'failed')):
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f'/jobs/{job_id}').get_json()
+        if job['status'] in statuses or time.monotonic() > deadline:
+            return job
+        time.sleep(0.01)
+
+
+def test_async_upload_runs_as_a_job(client, monkeypatch):
+    release = threading.Event()
+    update_directory = server.update_directory
+
+    def blocked(*args):
+        release.wait(10)
+        update_directory(*args)
+
+    monkeypatch.setattr(server, 'update_directory', blocked)
+    response = client.post('/upload_pac_times', data={
+        'issue_number': '731', 'title': 'Queued', 'cover_image': image('cover.jpg'), 'async': 'true',
+        'section_0_heading': 'One', 'section_0_body': 'Body', 'section_0_image': image('one.jpg'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    pending = client.get(f'/jobs/{job_id}').get_json()
+    assert pending['status'] in ('queued', 'running')
+    assert pending['files_total'] == 2
+    assert client.get('/get_pac_times/731').status_code == 404
+
+    release.set()
+    job = wait_for_job(client, job_id)
+
+    assert job['status'] == 'done'
+    assert job['files_saved'] == 2
+    assert job['result']['issue_number'] == '731'
+    assert client.get('/get_pac_times/731').get_json()['title'] == 'Queued'
+
+
+def test_failed_jobs_report_their_error(client):
+    response = client.post('/upload_pac_times', data={
+        'issue_number': '732', 'title': 'No cover', 'async': 'true',
+    }, content_type='multipart/form-data')
+
+    job = wait_for_job(client, response.get_json()['job_id'])
+
+    assert job['status'] == 'failed'
+    assert job['result']['error'] == 'No cover image provided'
+
+
+def test_unknown_jobs_are_not_found(client):
+    assert client.get('/jobs/nope').status_code == 404
@@ -0,0 +1,52 @@
+import pytest
+
+NUMBERS = ['9001', '9002', '9003', '9004', '9005']
+
+
+@pytest.fixture
+def events(upload_item, engine):
+    # Newer than anything else the tests upload to pac_events
+    for number in NUMBERS:
+        upload_item('pac_events', number, f'Event {number}', section_0_heading='Heading', section_0_body='Body')
+
+
+def numbers(listing):
+    return [event['event_number'] for event in listing['events']]
+
+
+def test_pages_run_newest_first(client, events):
+    first = client.get('/get_pac_events?limit=2').get_json()
+    second = client.get(f"/get_pac_events?limit=2&after={first['next_after']}").get_json()
+
+    assert numbers(first) == ['9005', '9004']
+    assert first['next_after'] == '9004'
+    assert numbers(second) == ['9003', '9002']
+    assert 'change_log' not in first
+
+
+def test_last_page_has_no_next(client, events):
+    last = client.get('/get_pac_events?after=9002').get_json()
+
+    assert numbers(last)[:1] == ['9001']
+    assert last['next_after'] is None
+
+
+def test_full_listing_keeps_directory_order(client, events):
+    listing = client.get('/get_pac_events').get_json()
+
+    assert numbers(listing)[-5:] == NUMBERS
+    assert 'next_after' not in listing
+    assert all(event['sections'] for event in listing['events'][-5:])
+
+
+def test_fields_are_projected(client, events):
+    listing = client.get('/get_pac_events?limit=1&fields=title,event_date').get_json()
+
+    assert listing['events'] == [{'event_number': '9005', 'title': 'Event 9005', 'event_date': ''}]
+
+
+def test_summaries_leave_out_sections(client, events):
+    listing = client.get('/get_pac_events?limit=3&view=summary').get_json()
+
+    assert numbers(listing) == ['9005', '9004', '9003']
+    assert all('sections' not in event and event['title'] for event in listing['events'])
@@ -0,0 +1,55 @@
+import hashlib
+import io
+import os
+
+import server
+
+COVER = b'\xff\xd8shared cover bytes'
+
+
+def upload(data, name):
+    return (io.BytesIO(data), name)
+
+
+def refs(url):
+    return server.load_media_refs().get(url, 0)
+
+
+def test_identical_uploads_are_stored_once(client, upload_item, engine):
+    first = upload_item('pac_events', '751', cover_image=upload(COVER, 'a.jpg'))
+    url = first['cover_image']
+    count = refs(url)
+
+    # Same bytes under another name, and other bytes
+    second = upload_item('pac_events', '752', cover_image=upload(COVER, 'copy.jpeg'))
+    third = upload_item('pac_events', '753', cover_image=upload(COVER + b'!', 'a.jpg'))
+
+    digest = hashlib.sha256(COVER).hexdigest()
+    assert url == f'/{server.MEDIA_FOLDER}/{digest[:2]}/{digest}.jpg'
+    assert second['cover_image'] == url
+    assert third['cover_image'] != url
+    assert refs(url) == count + 1
+    with open(server.static_file_path(url), 'rb') as f:
+        assert f.read() == COVER
+    assert not [name for name in os.listdir(server.MEDIA_FOLDER) if name.startswith('.tmp-')]
+
+
+def test_references_follow_edits_and_deletes(client, upload_item, engine):
+    data = b'\xff\xd8counted cover'
+    item = upload_item('pac_events', '754', cover_image=upload(data, 'cover.jpg'),
+                       section_0_heading='Same image', section_0_body='', section_0_image=upload(data, 'cover.jpg'))
+    url = item['cover_image']
+    assert item['sections'][0]['image'] == url
+    count = refs(url)
+
+    # An item counts once per blob, however often it shows it
+    upload_item('pac_events', '755', cover_image=upload(data, 'cover.jpg'))
+    assert refs(url) == count + 1
+
+    upload_item('pac_events', '755', cover_image=upload(b'\xff\xd8another cover', 'new.jpg'), is_edit='true')
+    assert refs(url) == count
+
+    client.delete('/delete_pac_event/754')
+    assert refs(url) == count - 1
+    # The file stays until the garbage collector finds it unreferenced
+    assert os.path.exists(server.static_file_path(url))
@@ -0,0 +1,64 @@
+import re
+
+import metrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? (\S+)$')
+
+
+def samples(text):
+    # {(name, labels): value} of the sample lines
+    values = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels = match.group(1), match.group(2) or ''
+        values[(name, labels)] = float(match.group(5))
+    return values
+
+
+def test_metrics_are_in_the_prometheus_text_format(client, upload_item):
+    upload_item('pac_events', '781')
+    client.get('/get_pac_event/781')
+    client.get('/get_pac_event/999')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert text.endswith('\n')
+    assert '# TYPE pac_http_requests_total counter' in text
+    assert '# TYPE pac_http_request_duration_seconds histogram' in text
+    assert '# TYPE pac_directory_items gauge' in text
+    values = samples(text)
+    route = 'route="/get_pac_event/<event_number>"'
+    assert values[('pac_http_requests_total', f'{{method="GET",{route},status="200"}}')] >= 1
+    assert values[('pac_http_requests_total', f'{{method="GET",{route},status="404"}}')] >= 1
+    assert values[('pac_directory_items', '{collection="pac_events"}')] >= 1
+
+
+def test_histograms_are_cumulative(client):
+    client.get('/get_reading_circle')
+
+    values = samples(client.get('/metrics').get_data(as_text=True))
+
+    labels = 'method="GET",route="/get_reading_circle"'
+    buckets = [
+        value for (name, sample_labels), value in values.items()
+        if name == 'pac_http_request_duration_seconds_bucket' and sample_labels.startswith('{' + labels)
+    ]
+    assert buckets == sorted(buckets)
+    assert values[('pac_http_request_duration_seconds_bucket', f'{{{labels},le="+Inf"}}')] == \
+        values[('pac_http_request_duration_seconds_count', f'{{{labels}}}')]
+    assert values[('pac_http_request_duration_seconds_sum', f'{{{labels}}}')] > 0
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter('pac_test_escaped_total', 'Escaping test', ['value'])
+    counter.inc('a "quoted" \\ value\n')
+
+    assert 'pac_test_escaped_total{value="a \\"quoted\\" \\\\ value\\n"} 1' in counter.render()
+    metrics._registry.remove(counter)
@@ -0,0 +1,70 @@
+import gzip
+import os
+
+import server
+
+
+def published(*parts):
+    return server.static_file_path('/'.join([server.PUBLISH_FOLDER, *parts]))
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_published_files_match_the_api(client, upload_item):
+    upload_item('pac_times', '801', section_0_heading='Heading', section_0_body='Body')
+    upload_item('pac_times', '802')
+
+    version = server.publish_collection('pac_times')
+
+    assert version == client.get('/changes?collection=pac_times&since=0').get_json()['version']
+    assert os.readlink(published('pac_times', 'current')) == f'v{version}'
+    for file_name, query in [('full', ''), ('summary', '?view=summary'), ('limit3', '?limit=3'),
+                             ('summary.limit3', '?limit=3&view=summary')]:
+        path = published('pac_times', 'current', f'{file_name}.json')
+        assert read(path) == client.get(f'/get_pac_times{query}').data
+        assert gzip.decompress(read(path + '.gz')) == read(path)
+        assert os.path.exists(path + '.br') == bool(server.brotli)
+    assert read(published('pac_times', 'items', '801.json')) == client.get('/get_pac_times/801').data
+    # Nothing changed since
+    assert server.publish_collection('pac_times') is None
+
+
+def test_republishing_follows_edits_and_deletes(client, upload_item):
+    upload_item('pac_times', '803')
+    upload_item('pac_times', '804')
+    first = server.publish_collection('pac_times', force=True)
+
+    upload_item('pac_times', '803', 'Edited', is_edit='true')
+    client.delete('/delete_pac_times/804')
+    for number in ('805', '806', '807'):
+        upload_item('pac_times', number)
+    version = server.publish_collection('pac_times')
+
+    assert read(published('pac_times', 'items', '803.json')) == client.get('/get_pac_times/803').data
+    assert not os.path.exists(published('pac_times', 'items', '804.json'))
+    assert not os.path.exists(published('pac_times', 'items', '804.json.gz'))
+    assert os.readlink(published('pac_times', 'current')) == f'v{version}'
+    versions = [name for name in os.listdir(published('pac_times')) if name.startswith('v')]
+    assert f'v{first}' in versions and len(versions) <= server.PUBLISH_KEEP_VERSIONS
+
+
+def test_home_feed_is_published(client, upload_item):
+    upload_item('pac_events', '808')
+
+    server.publish_home_feed()
+
+    assert read(published('home_feed.json')) == client.get('/home_feed').data
+
+
+def test_static_export_republishes_after_writes(client, upload_item, monkeypatch):
+    monkeypatch.setattr(server, 'STATIC_EXPORT', True)
+
+    upload_item('reading_circle', '809')
+    # The publish queue runs one job at a time, in order
+    server._publish_executor.submit(lambda: None).result()
+
+    assert read(published('reading_circle', 'items', '809.json')) == client.get('/get_reading_circle/809').data
+    assert read(published('home_feed.json')) == client.get('/home_feed').data
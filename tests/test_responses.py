@@ -0,0 +1,73 @@
+import gzip
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def listing(upload_item):
+    # Big enough to be compressed
+    for number in ('711', '712', '713'):
+        upload_item('reading_circle', number, 'A reading circle title ' * 20)
+    return '/get_reading_circle'
+
+
+def decode(response):
+    encoding = response.headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        return gzip.decompress(response.data)
+    if encoding == 'br':
+        return server.brotli.decompress(response.data)
+    return response.data
+
+
+@pytest.mark.parametrize('encoding', ['identity', 'gzip', 'br'])
+def test_each_encoding_has_its_own_etag(client, listing, encoding):
+    if encoding == 'br' and not server.brotli:
+        pytest.skip('brotli is not installed')
+    headers = {'Accept-Encoding': encoding}
+    identity = client.get(listing, headers={'Accept-Encoding': 'identity'})
+
+    response = client.get(listing, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.headers.get('Content-Encoding') == (None if encoding == 'identity' else encoding)
+    assert decode(response) == identity.data
+    etag = response.headers['ETag']
+    if encoding == 'identity':
+        assert etag == identity.headers['ETag']
+    else:
+        assert etag == identity.headers['ETag'][:-1] + f'-{encoding}"'
+
+    cached = client.get(listing, headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert not cached.data
+    assert cached.headers['ETag'] == etag
+    assert cached.headers['Vary'] == 'Accept-Encoding'
+
+
+def test_etag_of_another_encoding_does_not_match(client, listing):
+    compressed = client.get(listing, headers={'Accept-Encoding': 'gzip'})
+
+    response = client.get(listing, headers={'Accept-Encoding': 'identity', 'If-None-Match': compressed.headers['ETag']})
+
+    assert response.status_code == 200
+
+
+def test_etag_changes_with_the_directory(client, listing, upload_item):
+    etag = client.get(listing).headers['ETag']
+
+    upload_item('reading_circle', '714')
+
+    assert client.get(listing, headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_small_bodies_are_not_compressed(client, upload_item):
+    upload_item('reading_circle', '715', 'Short')
+
+    response = client.get('/get_reading_circle/715', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Vary'] == 'Accept-Encoding'
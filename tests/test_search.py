@@ -0,0 +1,59 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def items(upload_item, engine):
+    upload_item('pac_times', '771', 'Quillwort survey', section_0_heading='Field notes', section_0_body='Ferns by the lake')
+    upload_item('pac_events', '772', 'Monsoon walk', section_0_heading='Plants',
+                section_0_body='We found quillwort growing by the pond, among other quillwort relatives')
+    upload_item('photo_gallery', '773', 'Lake photos', description='A quillwort close-up')
+
+
+def search(client, query, **params):
+    response = client.get('/search', query_string={'q': query, **params})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def keys(results):
+    return [(result['collection'], result['item_number']) for result in results['results']]
+
+
+def test_title_matches_rank_first(client, items):
+    results = search(client, 'quillwort')
+
+    assert keys(results)[0] == ('pac_times', '771')
+    assert sorted(keys(results)[1:]) == [('pac_events', '772'), ('photo_gallery', '773')]
+    assert results['total'] == 3
+    assert results['results'][0]['score'] > results['results'][1]['score']
+    snippets = {result['item_number']: result['snippet'] for result in results['results']}
+    assert 'quillwort growing' in snippets['772']
+
+
+def test_every_term_must_match(client, items):
+    assert keys(search(client, 'quillwort pond')) == [('pac_events', '772')]
+    assert sorted(keys(search(client, 'quillwort', collection='photo_gallery,pac_events'))) == [
+        ('pac_events', '772'), ('photo_gallery', '773'),
+    ]
+    assert search(client, 'quillwort', limit=1)['next_offset'] == 1
+
+
+def test_edits_and_deletes_update_the_index(client, upload_item, items):
+    search(client, 'quillwort')
+
+    upload_item('pac_times', '771', 'Moss survey', is_edit='true',
+                section_0_heading='Field notes', section_0_body='Mosses by the lake')
+    client.delete('/delete_photo_album/773')
+
+    # Updated by the writes themselves, not rebuilt by the next search
+    for name in ('pac_times', 'photo_gallery'):
+        assert server._search_versions[name] == server._directory_version(server.COLLECTIONS[name]['dir_file'])
+    assert keys(search(client, 'quillwort')) == [('pac_events', '772')]
+    assert keys(search(client, 'moss')) == [('pac_times', '771')]
+
+
+def test_bad_queries_are_rejected(client):
+    assert client.get('/search?q=').status_code == 400
+    assert client.get('/search?q=x&collection=nope').status_code == 400
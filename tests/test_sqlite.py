@@ -0,0 +1,65 @@
+import pytest
+
+import server
+from conftest import ROUTES, image
+
+
+@pytest.fixture
+def use_sqlite(tmp_path):
+    # Switches to a fresh database; returns a function dropping the
+    # connection and cache, as a restarted worker would have them
+    def reconnect():
+        server._db_local.conn = None
+        server._directory_cache.clear()
+
+    def switch():
+        server.app.config['STORAGE_ENGINE'] = 'sqlite'
+        server.app.config['DATABASE'] = str(tmp_path / 'pac.sqlite3')
+        reconnect()
+    yield switch, reconnect
+    server.app.config['STORAGE_ENGINE'] = 'json'
+    reconnect()
+
+
+def test_items_round_trip(client, upload_item, upload_album, use_sqlite):
+    switch, reconnect = use_sqlite
+    switch()
+    issue = upload_item('pac_times', '721', 'Stored', issue_date='2024-01-01',
+                        section_0_heading='One', section_0_body='First', section_0_image=image('one.jpg'),
+                        section_1_heading='Two', section_1_body='Second')
+    album = upload_album('722', photos=3, description='Three photos')
+
+    reconnect()
+
+    assert client.get('/get_pac_times/721').get_json() == issue
+    assert client.get('/get_photo_album/722').get_json() == album
+    assert [section['heading'] for section in issue['sections']] == ['One', 'Two']
+    assert issue['sections'][0]['image'] and issue['sections'][1]['image'] is None
+
+    client.delete('/delete_pac_times/721')
+    reconnect()
+    assert client.get('/get_pac_times/721').status_code == 404
+    assert client.get('/get_photo_album/722').status_code == 200
+
+
+def test_import_copies_every_collection(client, upload_item, use_sqlite):
+    switch, _ = use_sqlite
+    for collection in ROUTES:
+        upload_item(collection, '723', section_0_heading='Heading', section_0_body='Body')
+    upload_item('pac_times', '724')
+    listings = {route: client.get(route).get_json() for route in (
+        '/get_pac_times', '/get_pac_events', '/get_reading_circle', '/get_photo_albums',
+    )}
+    json_version = client.get('/changes?collection=pac_times&since=0').get_json()['version']
+
+    switch()
+    result = server.app.test_cli_runner().invoke(args=['import-sqlite'])
+
+    assert result.exit_code == 0, result.output
+    assert f'{server.PAC_TIMES_DIR_FILE}: imported {len(listings["/get_pac_times"]["issues"])} items' in result.output
+    for route, listing in listings.items():
+        imported = client.get(route).get_json()
+        listing.pop('change_log', None)
+        assert imported == listing
+    # Clients synced against the JSON files start over
+    assert client.get(f'/changes?collection=pac_times&since={json_version}').get_json()['snapshot'] is True
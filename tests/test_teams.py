@@ -0,0 +1,86 @@
+import json
+import os
+import time
+
+import pytest
+
+import server
+from conftest import WORKDIR
+
+MEMBERS = [
+    {'Name': 'Asha', 'Position': 'Overall Coordinator', 'Domain': 'Tech', 'Field': 'CS', 'Email': 'asha@example.com',
+     'Mobile Number': 9876543210, 'Entry Number': '2021CS1', 'Hostel': 'Aravali', 'img': 'asha.jpg'},
+    {'Name': 'Ben', 'Position': 'Executive', 'Domain': 'Design', 'Email': 'ben@example.com',
+     'Mobile Number': 9123456780, 'img': '/team-photos/ben.jpg'},
+    {'Name': 'Chen', 'Position': 'Mentor', 'Domain': 'Tech', 'img': ''},
+]
+
+
+def add_roster(year, members=MEMBERS):
+    with open(os.path.join(WORKDIR, f'TeamsData{year}.json'), 'w') as f:
+        json.dump(members, f)
+
+
+def test_roster_is_grouped_without_contacts(client):
+    add_roster('2090-91')
+
+    response = client.get('/teams/2090-91')
+
+    assert response.status_code == 200
+    assert '2090-91' in client.get('/teams').get_json()['years']
+    roster = response.get_json()
+    assert [(group['title'], [member['name'] for member in group['members']]) for group in roster['groups']] == [
+        ('', ['Asha']), ('Executives', ['Ben']), ('Mentor', ['Chen']),
+    ]
+    assert [member['img'] for group in roster['groups'] for member in group['members']] == [
+        '/team-photos-2090-91/asha.jpg', '/team-photos-2090-91/ben.jpg', '',
+    ]
+    for private in (b'example.com', b'98765', b'2021CS1', b'Aravali'):
+        assert private not in response.data
+    assert client.get('/teams/2090-91', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_roster_filters_and_contacts(client):
+    add_roster('2091-92')
+
+    tech = client.get('/teams/2091-92?domain=Tech').get_json()
+    executives = client.get('/teams/2091-92?position=Executive,Mentor&domain=Design').get_json()
+
+    assert [member['name'] for group in tech['groups'] for member in group['members']] == ['Asha', 'Chen']
+    assert [member['name'] for group in executives['groups'] for member in group['members']] == ['Ben']
+    assert client.get('/teams/2091-92/members/0/contact').get_json() == {
+        'email': 'asha@example.com', 'mobile': '9876543210',
+    }
+    assert client.get('/teams/2091-92/members/1/contact').get_json() == {'email': 'ben@example.com'}
+    assert client.get('/teams/2091-92/members/2/contact').status_code == 404
+    assert client.get('/teams/1999-00').status_code == 404
+
+
+def test_thumbnails_are_generated_in_the_background(client, monkeypatch):
+    Image = pytest.importorskip('PIL.Image')
+    add_roster('2092-93')
+    folder = os.path.join(WORKDIR, 'public', 'team-photos-2092-93')
+    os.makedirs(folder, exist_ok=True)
+    Image.new('RGB', (1200, 900), (20, 40, 60)).save(os.path.join(folder, 'asha.jpg'))
+    with open(os.path.join(folder, 'ben.jpg'), 'wb') as f:
+        f.write(b'not an image')
+    generated = []
+    make_team_thumbnails = server.make_team_thumbnails
+    monkeypatch.setattr(server, 'make_team_thumbnails', lambda *args: generated.append(args) or make_team_thumbnails(*args))
+
+    def members():
+        roster = client.get('/teams/2092-93').get_json()
+        return {member['name']: member for group in roster['groups'] for member in group['members']}
+
+    # Answered at once with the original photos
+    assert members()['Asha']['photo'] is None
+    deadline = time.monotonic() + 60
+    while members()['Asha']['photo'] is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    asha = members()['Asha']
+    assert asha['photo'] in asha['media']
+    assert os.path.exists(server.static_file_path(asha['photo']))
+    # A photo that can't be read keeps its original and isn't retried
+    assert members()['Ben']['photo'] is None
+    assert len(generated) == 1
@@ -0,0 +1,70 @@
+import hashlib
+
+import server
+
+DATA = b'\xff\xd8resumable upload bytes'
+
+
+def create(client, **fields):
+    response = client.post('/uploads', json={'filename': 'cover.jpg', 'size': len(DATA), **fields})
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+
+def send(client, upload_id, offset, chunk):
+    return client.patch(f'/uploads/{upload_id}', data=chunk, headers={'Upload-Offset': str(offset)})
+
+
+def test_chunks_resume_from_the_stored_offset(client):
+    upload_id = create(client, sha256=hashlib.sha256(DATA).hexdigest())
+
+    assert send(client, upload_id, 0, DATA[:8]).headers['Upload-Offset'] == '8'
+    head = client.head(f'/uploads/{upload_id}')
+    assert head.headers['Upload-Offset'] == '8'
+    assert head.headers['Upload-Length'] == str(len(DATA))
+
+    # A chunk sent again after a dropped response
+    mismatch = send(client, upload_id, 0, DATA[:8])
+    assert mismatch.status_code == 409
+    assert mismatch.headers['Upload-Offset'] == '8'
+
+    assert send(client, upload_id, 8, DATA[8:]).status_code == 204
+    assert client.get(f'/uploads/{upload_id}').get_json()['complete'] is True
+
+    response = client.post('/upload_pac_times', data={
+        'issue_number': '741', 'title': 'Resumed', 'cover_image_upload_id': upload_id,
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    cover = client.get('/get_pac_times/741').get_json()['cover_image']
+    with open(server.static_file_path(cover), 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_checksum_mismatch_starts_over(client):
+    upload_id = create(client, sha256=hashlib.sha256(b'other bytes').hexdigest())
+
+    response = send(client, upload_id, 0, DATA)
+
+    assert response.status_code == 422
+    assert response.headers['Upload-Offset'] == '0'
+    assert client.head(f'/uploads/{upload_id}').headers['Upload-Offset'] == '0'
+    assert client.get(f'/uploads/{upload_id}').get_json()['complete'] is False
+
+
+def test_chunks_past_the_declared_size_are_refused(client):
+    upload_id = create(client)
+
+    assert send(client, upload_id, 0, DATA + b'more').status_code == 413
+    assert client.head(f'/uploads/{upload_id}').headers['Upload-Offset'] == '0'
+
+
+def test_incomplete_uploads_cannot_be_used(client):
+    upload_id = create(client)
+    send(client, upload_id, 0, DATA[:4])
+
+    response = client.post('/upload_pac_times', data={
+        'issue_number': '742', 'title': 'Early', 'cover_image_upload_id': upload_id,
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert client.head('/uploads/unknown').status_code == 404